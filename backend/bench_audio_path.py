@@ -0,0 +1,158 @@
+"""
+Benchmark: temp-file audio path vs in-memory audio path for transcribe_audio
+Run: python bench_audio_path.py [--runs 20] [--json]
+
+Only the decode stage is timed (upload bytes -> 16kHz float32 array), so no
+ASR model is needed. Requires ffmpeg on PATH for the WebM cases.
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import tempfile
+import time
+import wave
+
+import numpy as np
+from pydub import AudioSegment
+
+from utils import audio_io
+
+SAMPLE_RATE = 16000
+DURATIONS_SEC = [1, 5, 15]
+
+
+def make_wav(duration_sec):
+    """Deterministic speech-like signal: a few harmonics with a syllable envelope"""
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 560)))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+    pcm = (0.25 * voice * envelope * 32767 / 2).astype("<i2")
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def make_webm(wav_bytes):
+    """Encode the WAV fixture as WebM/Opus, like MediaRecorder produces"""
+    proc = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+         "-c:a", "libopus", "-f", "webm", "pipe:1"],
+        input=wav_bytes, capture_output=True,
+    )
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def whisper_load_audio(path):
+    """Same ffmpeg call as whisper.load_audio (used if whisper isn't installed)"""
+    try:
+        import whisper
+        return whisper.load_audio(path)
+    except ImportError:
+        out = subprocess.run(
+            ["ffmpeg", "-nostdin", "-threads", "0", "-i", path, "-f", "s16le",
+             "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-"],
+            capture_output=True, check=True,
+        ).stdout
+        return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def legacy_path(raw_bytes, is_wav_format):
+    """The previous transcribe_audio flow: temp files + pydub + whisper.load_audio"""
+    if is_wav_format:
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+            temp_wav.write(raw_bytes)
+            temp_wav_path = temp_wav.name
+        audio = AudioSegment.from_wav(io.BytesIO(raw_bytes))
+        _ = audio.rms
+    else:
+        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as temp_input:
+            temp_input.write(raw_bytes)
+            temp_input_path = temp_input.name
+        try:
+            audio = AudioSegment.from_file(temp_input_path)
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+                temp_wav_path = temp_wav.name
+            audio = audio.set_frame_rate(SAMPLE_RATE).set_channels(1)
+            audio.export(temp_wav_path, format="wav")
+            _ = audio.rms
+        finally:
+            os.unlink(temp_input_path)
+    try:
+        return whisper_load_audio(temp_wav_path)
+    finally:
+        os.unlink(temp_wav_path)
+
+
+def in_memory_path(raw_bytes, is_wav_format):
+    """The current transcribe_audio flow"""
+    audio = audio_io.load_audio(io.BytesIO(raw_bytes).getbuffer(), is_wav_format=is_wav_format)
+    _ = audio_io.rms_int16(audio)
+    return audio
+
+
+def time_it(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(float(np.mean(timings)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    args = parser.parse_args()
+
+    results = []
+    for duration in DURATIONS_SEC:
+        wav_bytes = make_wav(duration)
+        cases = [("wav", wav_bytes, True)]
+        webm_bytes = make_webm(wav_bytes)
+        if webm_bytes:
+            cases.append(("webm", webm_bytes, False))
+
+        for fmt, raw, is_wav_format in cases:
+            legacy = time_it(lambda: legacy_path(raw, is_wav_format), args.runs)
+            memory = time_it(lambda: in_memory_path(raw, is_wav_format), args.runs)
+            results.append({
+                "format": fmt,
+                "duration_sec": duration,
+                "bytes": len(raw),
+                "temp_file": legacy,
+                "in_memory": memory,
+                "speedup_p50": round(legacy["p50_ms"] / max(memory["p50_ms"], 1e-6), 1),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("=" * 80)
+    print("Audio decode path: temp-file vs in-memory")
+    print("=" * 80)
+    print(f"{'format':6s} {'dur':>4s} {'bytes':>8s} {'temp p50':>10s} {'mem p50':>10s} {'temp p95':>10s} {'mem p95':>10s} {'speedup':>8s}")
+    for r in results:
+        print(f"{r['format']:6s} {r['duration_sec']:>3d}s {r['bytes']:>8d} "
+              f"{r['temp_file']['p50_ms']:>8.2f}ms {r['in_memory']['p50_ms']:>8.2f}ms "
+              f"{r['temp_file']['p95_ms']:>8.2f}ms {r['in_memory']['p95_ms']:>8.2f}ms "
+              f"{r['speedup_p50']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
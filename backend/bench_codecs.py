@@ -0,0 +1,158 @@
+"""
+Benchmark: uplink bandwidth and server decode cost per audio_chunk codec
+Run: python bench_codecs.py [--runs 20] [--json]
+
+For each codec the same deterministic speech-like clip is encoded once and
+decoded --runs times the way the socket path does it (to 16kHz int16 PCM).
+Reported per codec and clip length:
+
+    bytes/s     payload size per second of audio (what the client uploads)
+    kbps        the same in kilobits per second
+    vs_pcm16    payload size relative to 16-bit WAV
+    decode_ms   median decode time for the clip
+    us_per_s    decode microseconds per second of audio
+    snr_db      signal-to-noise ratio of the decoded audio (lossy codecs)
+
+wav_json_list is the old socket payload (a JSON list of byte values). Raw
+Opus needs opuslib; webm_opus (MediaRecorder's format, decoded by ffmpeg)
+needs ffmpeg on PATH. Rows whose dependency is missing are skipped.
+"""
+
+import argparse
+import json
+import statistics
+import struct
+import subprocess
+import time
+
+import numpy as np
+
+from utils import audio_codecs, audio_io
+
+SAMPLE_RATE = 16000
+DURATIONS_SEC = [1, 5, 15]
+OPUS_FRAME_SAMPLES = 320  # 20 ms, what WebCodecs / MediaRecorder use
+
+
+def make_pcm(duration_sec):
+    """Deterministic speech-like signal: a few harmonics with a syllable envelope, plus light noise"""
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    voice = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate((140, 280, 420, 560)))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t))
+    noise = np.random.RandomState(duration_sec).randn(len(t)) * 0.01
+    return ((0.25 * voice * envelope + noise) * 32767 / 2).astype("<i2")
+
+
+def wav_bytes(pcm):
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI", b"RIFF", 36 + 2 * len(pcm), b"WAVE", b"fmt ", 16, 1, 1,
+        SAMPLE_RATE, 2 * SAMPLE_RATE, 2, 16, b"data", 2 * len(pcm),
+    )
+    return header + pcm.tobytes()
+
+
+def encode_opus(pcm):
+    """Raw Opus packets, length-prefixed as the socket protocol expects (None without opuslib)"""
+    if audio_codecs.opuslib is None:
+        return None
+    encoder = audio_codecs.opuslib.Encoder(SAMPLE_RATE, 1, "voip")
+    out = bytearray()
+    padded = np.concatenate([pcm, np.zeros(-len(pcm) % OPUS_FRAME_SAMPLES, dtype=pcm.dtype)])
+    for start in range(0, len(padded), OPUS_FRAME_SAMPLES):
+        packet = encoder.encode(padded[start:start + OPUS_FRAME_SAMPLES].tobytes(), OPUS_FRAME_SAMPLES)
+        out += struct.pack(">H", len(packet)) + packet
+    return bytes(out)
+
+
+def encode_webm(pcm):
+    """WebM/Opus as MediaRecorder produces it (None without ffmpeg/libopus)"""
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+             "-c:a", "libopus", "-b:a", "24k", "-f", "webm", "pipe:1"],
+            input=wav_bytes(pcm), capture_output=True,
+        )
+    except FileNotFoundError:
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def snr_db(reference, decoded):
+    n = min(len(reference), len(decoded))
+    if n == 0:
+        return None
+    ref = reference[:n].astype(np.float64)
+    err = ref - decoded[:n].astype(np.float64)
+    noise = np.sum(err * err)
+    return None if noise == 0 else round(10 * np.log10(np.sum(ref * ref) / noise), 1)
+
+
+def codec_cases(pcm):
+    """(name, payload, decode_fn) per codec; decode_fn(payload) -> int16 samples"""
+    wav = wav_bytes(pcm)
+    cases = [
+        ("wav_json_list", json.dumps({"audio": list(wav)}).encode(),
+         lambda p: np.frombuffer(bytes(json.loads(p)["audio"]), dtype="<i2", offset=44)),
+        ("wav_pcm16", wav, lambda p: (audio_io.decode_wav(p)[0] * 32768).astype(np.int16)),
+        ("mulaw", audio_codecs.encode_mulaw(pcm), audio_codecs.decode_mulaw),
+        ("ima_adpcm", audio_codecs.encode_ima_adpcm(pcm), audio_codecs.decode_ima_adpcm),
+    ]
+    opus = encode_opus(pcm)
+    if opus is not None:
+        cases.append(("opus", opus, lambda p: audio_codecs.ChunkDecoder("opus").decode(p)))
+    webm = encode_webm(pcm)
+    if webm is not None:
+        cases.append(("webm_opus", webm, lambda p: (audio_io.decode_with_ffmpeg(p) * 32768).astype(np.int16)))
+    return cases
+
+
+def bench(duration_sec, runs):
+    pcm = make_pcm(duration_sec)
+    results = []
+    for name, payload, decode in codec_cases(pcm):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            decoded = decode(payload)
+            timings.append((time.perf_counter() - start) * 1000)
+        decode_ms = statistics.median(timings)
+        results.append({
+            "codec": name,
+            "duration_sec": duration_sec,
+            "payload_bytes": len(payload),
+            "bytes_per_sec": round(len(payload) / duration_sec),
+            "kbps": round(len(payload) * 8 / duration_sec / 1000, 1),
+            "vs_pcm16": round(len(payload) / (2 * len(pcm) + 44), 3),
+            "decode_ms": round(decode_ms, 3),
+            "us_per_audio_sec": round(decode_ms * 1000 / duration_sec, 1),
+            "snr_db": snr_db(pcm, decoded),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    args = parser.parse_args()
+
+    results = [r for duration in DURATIONS_SEC for r in bench(duration, args.runs)]
+    if args.json:
+        print(json.dumps({"runs": args.runs, "results": results}, indent=2))
+        return
+
+    print("=" * 92)
+    print(f"audio_chunk codecs: uplink size and decode cost (median of {args.runs} runs)")
+    print("=" * 92)
+    print(f"{'codec':14s} {'audio':>6s} {'bytes/s':>9s} {'kbps':>7s} {'vs pcm16':>9s} "
+          f"{'decode':>10s} {'us/audio s':>11s} {'SNR dB':>7s}")
+    for r in results:
+        snr = "-" if r["snr_db"] is None else f"{r['snr_db']:.1f}"
+        print(f"{r['codec']:14s} {r['duration_sec']:>5d}s {r['bytes_per_sec']:>9d} {r['kbps']:>7.1f} "
+              f"{r['vs_pcm16']:>9.3f} {r['decode_ms']:>8.3f}ms {r['us_per_audio_sec']:>11.1f} {snr:>7s}")
+    if audio_codecs.opuslib is None:
+        print("\nℹ️ opus skipped: pip install opuslib (needs libopus)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: memory held by a long dictation, heap buffer vs on-disk spool
+Run: python bench_dictation.py [--minutes 30] [--json]
+
+Feeds --minutes of 16kHz PCM in one-second chunks, the way audio_chunk
+receives it, and transcribes it with a stub decoder (one segment per 7s of
+audio, no model) so only the audio handling is measured:
+
+    heap    chunks accumulated in a bytearray and decoded in one piece at
+            the end (what the buffered clip path does with a long recording)
+    spool   PcmSpool + DictationTranscriber: chunks appended to a
+            memory-mapped file, transcribed in 30s windows as they fill
+
+Reported per strategy: peak traced Python heap (tracemalloc), the heap
+still held at the end, wall time, and decode windows.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from utils.dictation import DictationTranscriber, PcmSpool
+
+SAMPLE_RATE = 16000
+SEGMENT_SEC = 7
+
+
+def stub_decode(audio, prompt):
+    """One segment per SEGMENT_SEC of audio"""
+    duration = len(audio) / SAMPLE_RATE
+    starts = np.arange(0, duration, SEGMENT_SEC)
+    return [(s, min(duration, s + SEGMENT_SEC), "lorem ipsum dolor sit amet") for s in starts]
+
+
+def run_heap(chunks):
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+    audio = np.frombuffer(buffer, dtype="<i2").astype(np.float32) / 32768.0
+    return len(stub_decode(audio, "")), 1
+
+
+def run_spool(chunks):
+    spool = PcmSpool()
+    dictation = DictationTranscriber(stub_decode, spool, sample_rate=SAMPLE_RATE)
+    segments = 0
+    for chunk in chunks:
+        spool.append(chunk)
+        if dictation.ready():
+            segments += len(dictation.process())
+    segments += len(dictation.process(final=True))
+    windows = dictation.windows
+    spool.close()
+    return segments, windows
+
+
+def bench(name, fn, minutes):
+    chunk = (np.random.RandomState(0).randn(SAMPLE_RATE) * 3000).astype("<i2").tobytes()
+    chunks = (chunk for _ in range(int(minutes * 60)))
+    tracemalloc.start()
+    start = time.perf_counter()
+    segments, windows = fn(chunks)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "strategy": name,
+        "minutes": minutes,
+        "peak_heap_mb": round(peak / 2**20, 2),
+        "final_heap_mb": round(current / 2**20, 2),
+        "wall_sec": round(elapsed, 2),
+        "windows": windows,
+        "segments": segments,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    args = parser.parse_args()
+
+    results = [
+        bench(name, fn, minutes)
+        for minutes in sorted({1, 5, args.minutes})
+        for name, fn in (("heap", run_heap), ("spool", run_spool))
+    ]
+    if args.json:
+        print(json.dumps({"results": results}, indent=2))
+        return
+
+    print("=" * 72)
+    print("Long-form dictation: Python heap held by the audio (stub decoder)")
+    print("=" * 72)
+    print(f"{'strategy':9s} {'audio':>7s} {'peak heap':>11s} {'final heap':>11s} {'wall':>8s} {'windows':>8s}")
+    for r in results:
+        print(f"{r['strategy']:9s} {r['minutes']:>5g}m {r['peak_heap_mb']:>9.2f}MB {r['final_heap_mb']:>9.2f}MB "
+              f"{r['wall_sec']:>7.2f}s {r['windows']:>8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark: intent fallback latency, legacy Ollama call vs OllamaClient
+Run: python bench_ollama.py [--runs 5] [--url http://localhost:11434] [--model gemma3:1b] [--json]
+
+Needs a running Ollama with the model pulled. Each utterance is sent --runs
+times (after one untimed warm-up call per path) through:
+
+    legacy  what detect_intent_ollama used to do: a new connection per call,
+            the ~40-line prompt with the utterance embedded twice,
+            stream=False, regex search for JSON in the reply
+    client  utils.ollama_client.OllamaClient: pooled keep-alive connection,
+            keep_alive, static system prompt, format=json + num_predict,
+            streamed and returned when the JSON object closes
+
+Reported per path: median time to first token (for legacy, the whole reply
+arrives at once) and median / p95 total latency, plus how many replies
+parsed to an intent.
+"""
+
+import argparse
+import json
+import re
+import statistics
+import time
+
+import requests
+
+from utils.ollama_client import OllamaClient, OllamaError
+
+UTTERANCES = [
+    "I'd like to book an appointment",
+    "put Dr. Smith as my doctor",
+    "can you clear the address field",
+    "take me back to the main page",
+    "schedule a checkup for next Monday at 2pm",
+]
+
+SYSTEM_PROMPT = None  # filled from the router in main(), so both paths ask the same thing
+
+
+def legacy_prompt(text):
+    return f"""You are a voice assistant for a medical appointment booking system.
+User said: "{text}"
+
+Available actions:
+- navigate_page: Go to a specific page (home, profile, appointments, etc.)
+- fill_field: Enter data in a form field
+- check_box: Select checkboxes
+- submit_form: Submit the current form
+- book_appointment: Confirm appointment booking
+- scroll_up/scroll_down: Scroll the page
+- clear_field: Clear a form field
+- refresh_page: Reload the page
+
+Extract the intent and entities from the user's command.
+
+Respond ONLY with valid JSON in this format:
+{{
+  "intent": "action_name",
+  "entities": {{"field": "name", "value": "John"}}
+}}
+
+Examples:
+User: "I want to make an appointment for next Monday"
+{{"intent": "fill_field", "entities": {{"field": "date", "value": "next Monday"}}}}
+
+User: "Put my name as Sarah Johnson"
+{{"intent": "fill_field", "entities": {{"field": "name", "value": "Sarah Johnson"}}}}
+
+User: "Go back to the main page"
+{{"intent": "navigate_page", "entities": {{"page": "home"}}}}
+
+Now analyze: "{text}"
+"""
+
+
+def call_legacy(url, model, text):
+    start = time.perf_counter()
+    response = requests.post(
+        f"{url}/api/generate",
+        json={"model": model, "prompt": legacy_prompt(text), "stream": False, "temperature": 0.1},
+        timeout=30,
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    intent = None
+    if response.ok:
+        match = re.search(r'\{.*\}', response.json().get("response", ""), re.DOTALL)
+        if match:
+            try:
+                intent = json.loads(match.group()).get("intent")
+            except ValueError:
+                pass
+    return {"ttft_ms": total_ms, "total_ms": total_ms, "intent": intent}
+
+
+def call_client(client, text):
+    try:
+        parsed, timings = client.generate_json(SYSTEM_PROMPT, f'User: "{text}"', timeout=30)
+        intent = parsed.get("intent")
+    except OllamaError as e:
+        return {"ttft_ms": None, "total_ms": None, "intent": None, "error": str(e)}
+    return {"ttft_ms": timings["ttft_ms"], "total_ms": timings["total_ms"], "intent": intent,
+            "early_exit": timings["early_exit"]}
+
+
+def summarize(name, samples):
+    ttft = [s["ttft_ms"] for s in samples if s["ttft_ms"] is not None]
+    total = sorted(s["total_ms"] for s in samples if s["total_ms"] is not None)
+    return {
+        "path": name,
+        "calls": len(samples),
+        "parsed": sum(1 for s in samples if s["intent"]),
+        "ttft_p50_ms": round(statistics.median(ttft), 1) if ttft else None,
+        "total_p50_ms": round(statistics.median(total), 1) if total else None,
+        "total_p95_ms": round(total[min(len(total) - 1, int(0.95 * len(total)))], 1) if total else None,
+        "early_exits": sum(1 for s in samples if s.get("early_exit")),
+    }
+
+
+def main():
+    global SYSTEM_PROMPT
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--url", default="http://localhost:11434")
+    parser.add_argument("--model", default="gemma3:1b")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    args = parser.parse_args()
+
+    try:
+        requests.get(f"{args.url}/api/tags", timeout=2).raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"⚠️ Ollama not reachable at {args.url} ({e}). Start it with: ollama serve")
+        return
+
+    # The router loads spaCy at import; only its prompt is needed here
+    from utils.enhanced_command_router import OLLAMA_SYSTEM_PROMPT
+    SYSTEM_PROMPT = OLLAMA_SYSTEM_PROMPT
+    client = OllamaClient(args.model, base_url=args.url)
+
+    call_legacy(args.url, args.model, UTTERANCES[0])
+    call_client(client, UTTERANCES[0])
+    legacy, pooled = [], []
+    for _ in range(args.runs):
+        for text in UTTERANCES:
+            legacy.append(call_legacy(args.url, args.model, text))
+            pooled.append(call_client(client, text))
+    results = [summarize("legacy", legacy), summarize("client", pooled)]
+
+    if args.json:
+        print(json.dumps({"model": args.model, "runs": args.runs, "results": results}, indent=2))
+        return
+
+    print("=" * 80)
+    print(f"Ollama intent fallback: {args.model}, {len(UTTERANCES)} utterances x {args.runs} runs")
+    print("=" * 80)
+    print(f"{'path':8s} {'calls':>6s} {'parsed':>7s} {'TTFT p50':>10s} {'total p50':>11s} {'total p95':>11s} {'early exit':>11s}")
+    for r in results:
+        fmt = lambda v: "-" if v is None else f"{v:.1f}ms"
+        print(f"{r['path']:8s} {r['calls']:>6d} {r['parsed']:>7d} {fmt(r['ttft_p50_ms']):>10s} "
+              f"{fmt(r['total_p50_ms']):>11s} {fmt(r['total_p95_ms']):>11s} {r['early_exits']:>11d}")
+
+
+if __name__ == "__main__":
+    main()
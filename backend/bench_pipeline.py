@@ -0,0 +1,266 @@
+"""
+Benchmark: per-stage timings of the transcription pipeline
+Run: python bench_pipeline.py [--runs 5] [--profile small-int8] [--no-model] [--json] [--output results.json]
+
+Generates deterministic fixtures (speech-like tones, silence, clipped and
+noisy input; WAV and WebM; 1s to 60s) and times each stage of the
+transcribe_audio path separately:
+
+    header_parse -> decode_resample -> silence_check (VAD) -> inference -> post_filter
+
+Reports p50/p95 per stage, real-time factor and peak RSS. The model is
+loaded from the ASR profile (ASR_PROFILE / --profile) exactly as demo.py
+does; --no-model skips the inference stage. WebM cases need ffmpeg on PATH.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+DURATIONS_SEC = [1, 5, 15, 30, 60]
+KINDS = ["speech", "silence", "clipped", "noisy"]
+FORMATS = ["wav", "webm"]
+STAGES = ["header_parse", "decode_resample", "silence_check", "inference", "post_filter"]
+SEED = 1234
+
+
+def make_signal(kind, duration_sec):
+    """Deterministic 16kHz float32 fixture of the given kind"""
+    rng = np.random.default_rng(SEED + duration_sec)
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    # Speech-like: a few harmonics of a wobbling pitch with a syllable envelope and pauses
+    pitch = 140 * (1 + 0.05 * np.sin(2 * np.pi * 0.7 * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 5))
+    envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t)) * (np.sin(2 * np.pi * 0.25 * t) > -0.6)
+    speech = 0.25 * voice * envelope
+
+    if kind == "speech":
+        audio = speech
+    elif kind == "silence":
+        audio = 0.0005 * rng.standard_normal(len(t))
+    elif kind == "clipped":
+        audio = np.clip(speech * 6, -1.0, 1.0)
+    elif kind == "noisy":
+        audio = speech + 0.08 * rng.standard_normal(len(t))  # roughly 5 dB SNR
+    else:
+        raise ValueError(f"Unknown fixture kind: {kind}")
+    return np.clip(audio, -1.0, 1.0).astype(np.float32)
+
+
+def encode_wav(audio):
+    pcm = (audio * 32767).astype("<i2")
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def encode_webm(wav_bytes):
+    """Encode a WAV fixture as WebM/Opus, like MediaRecorder produces (None without ffmpeg)"""
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-nostdin", "-loglevel", "error", "-f", "wav", "-i", "pipe:0",
+             "-c:a", "libopus", "-f", "webm", "pipe:1"],
+            input=wav_bytes, capture_output=True,
+        )
+    except FileNotFoundError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of finished children (ffmpeg), in MB"""
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return round(own / 1e6, 1), round(children / 1e6, 1)
+
+
+def summarize(timings):
+    if not timings:
+        return None
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "mean_ms": round(float(np.mean(timings)), 3),
+    }
+
+
+def run_pipeline(demo, raw, fmt, infer):
+    """
+    One pass through the transcribe_audio stages.
+
+    Returns:
+        (stage -> ms, text (None if inference didn't run), rejected)
+    """
+    from utils import audio_io, vad
+
+    timings = {}
+
+    start = time.perf_counter()
+    header = audio_io.parse_wav_header(raw) if fmt == "wav" else None
+    if fmt != "wav":
+        audio_io.is_wav(raw)  # the only header work the WebM path does
+    timings["header_parse"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if header is not None:
+        audio = audio_io.pcm_to_float32(raw, offset=header["data_offset"], length=header["data_length"],
+                                        bits=header["bits"], fmt=header["format"], channels=header["channels"])
+        audio = audio_io.resample_linear(audio, header["sample_rate"])
+    else:
+        audio = audio_io.decode_with_ffmpeg(raw)
+    timings["decode_resample"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    segments = vad.detect_speech_segments(
+        audio,
+        energy_threshold=demo.SILENCE_RMS_THRESHOLD,
+        hangover_ms=demo.VAD_HANGOVER_MS,
+        padding_ms=demo.VAD_PADDING_MS,
+    )
+    speech = vad.extract_speech(audio, segments) if segments else None
+    rejected = None
+    if not segments:
+        rejected = "vad_silence"
+    elif audio_io.duration_ms(speech) < demo.SILENCE_MIN_DURATION_MS:
+        rejected = "too_short"
+    timings["silence_check"] = (time.perf_counter() - start) * 1000
+
+    text = None
+    if rejected is None and infer is not None:
+        start = time.perf_counter()
+        output = infer(speech)
+        timings["inference"] = (time.perf_counter() - start) * 1000
+        text, rejected = output["text"], output["rejected"]
+
+        start = time.perf_counter()
+        if rejected is None and demo._is_likely_noise(text):
+            text, rejected = "", "noise_phrase"
+        timings["post_filter"] = (time.perf_counter() - start) * 1000
+    return timings, text, rejected
+
+
+def load_model(demo):
+    """Load the configured profile the same way the server does; returns infer(audio) -> dict"""
+    demo.load_asr()
+    demo.warmup_asr()
+    if demo.asr_worker_pool is not None:
+        return lambda audio: demo.asr_worker_pool.transcribe(audio, "en")
+    return lambda audio: demo._transcribe_batch([audio], "en")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", help="ASR profile from config/asr_profiles.py (default: ASR_PROFILE)")
+    parser.add_argument("--durations", default=",".join(str(d) for d in DURATIONS_SEC),
+                        help="comma-separated clip lengths in seconds")
+    parser.add_argument("--kinds", default=",".join(KINDS))
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--no-model", action="store_true", help="skip the inference and post-filter stages")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Measure every clip on its own: no cross-request batching, no transcript cache
+    if args.profile:
+        os.environ["ASR_PROFILE"] = args.profile
+    os.environ["ASR_BATCHING"] = "false"
+    os.environ["TRANSCRIPT_CACHE_MAX_BYTES"] = "0"
+    import demo
+
+    infer = None
+    load_sec = None
+    if not args.no_model:
+        start = time.perf_counter()
+        infer = load_model(demo)
+        load_sec = round(time.perf_counter() - start, 2)
+
+    cases = []
+    for duration in [int(d) for d in args.durations.split(",")]:
+        for kind in args.kinds.split(","):
+            wav_bytes = encode_wav(make_signal(kind, duration))
+            for fmt in args.formats.split(","):
+                raw = wav_bytes if fmt == "wav" else encode_webm(wav_bytes)
+                if raw is None:
+                    print(f"⚠️ Skipping {fmt} {kind} {duration}s (ffmpeg with libopus not available)", file=sys.stderr)
+                    continue
+
+                stage_timings = {stage: [] for stage in STAGES}
+                totals = []
+                text, rejected = None, None
+                for _ in range(args.runs):
+                    timings, text, rejected = run_pipeline(demo, raw, fmt, infer)
+                    for stage, ms in timings.items():
+                        stage_timings[stage].append(ms)
+                    totals.append(sum(timings.values()))
+
+                rss, children_rss = peak_rss_mb()
+                total = summarize(totals)
+                cases.append({
+                    "kind": kind,
+                    "format": fmt,
+                    "duration_sec": duration,
+                    "bytes": len(raw),
+                    "stages": {stage: summarize(ms) for stage, ms in stage_timings.items()},
+                    "total": total,
+                    "rtf_p50": round(total["p50_ms"] / 1000 / duration, 4),
+                    "rtf_p95": round(total["p95_ms"] / 1000 / duration, 4),
+                    "rejected": rejected,
+                    "text": text,
+                    "peak_rss_mb": rss,
+                    "peak_children_rss_mb": children_rss,
+                })
+
+    report = {
+        "profile": None if args.no_model else demo.asr_profile_name,
+        "asr_profile": None if args.no_model else demo.asr_profile,
+        "model_load_sec": load_sec,
+        "runs": args.runs,
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "cases": cases,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print("=" * 110)
+    print(f"Transcription pipeline per stage (p50 ms) - profile: {report['profile'] or 'none (--no-model)'}, {args.runs} run(s)")
+    print("=" * 110)
+    print(f"{'kind':8s} {'fmt':5s} {'dur':>4s} " + " ".join(f"{s[:12]:>12s}" for s in STAGES)
+          + f" {'total p95':>10s} {'RTF':>7s} {'RSS MB':>7s}  result")
+    for c in cases:
+        stages = " ".join(
+            f"{c['stages'][s]['p50_ms']:>12.2f}" if c["stages"][s] else f"{'-':>12s}" for s in STAGES
+        )
+        if c["rejected"]:
+            result = f"rejected: {c['rejected']}"
+        else:
+            result = "-" if c["text"] is None else repr(c["text"][:30])
+        print(f"{c['kind']:8s} {c['format']:5s} {c['duration_sec']:>3d}s {stages} "
+              f"{c['total']['p95_ms']:>10.2f} {c['rtf_p50']:>7.4f} {c['peak_rss_mb']:>7.1f}  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: session stores at 10k simulated sessions
+Run: python bench_session_store.py [--sessions 10000] [--touches 10] [--json]
+
+Compares the old dict-of-timestamps with a full scan per cleanup pass
+against InProcessSessionStore (min-heap expiry) and SqliteSessionStore
+(shared file, WAL). Timed phases:
+
+    create       one touch() per new session
+    activity     random touch() calls, as audio_chunk does on every chunk
+    get          one metadata lookup per session
+    sweep_idle   cleanup pass when nothing is due (the common case)
+    sweep_1pct   cleanup pass when 1% of sessions are due
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from utils.session_store import InProcessSessionStore, SqliteSessionStore
+
+TTL_SEC = 300
+
+
+class LegacyStore:
+    """The previous buffer_timestamps dict and cleanup_stale_buffers scan"""
+
+    backend = "legacy_dict_scan"
+
+    def __init__(self, ttl_sec):
+        self.ttl_sec = ttl_sec
+        self._timestamps = {}
+
+    def touch(self, sid, **meta):
+        self._timestamps[sid] = time.time()
+
+    def get(self, sid):
+        ts = self._timestamps.get(sid)
+        return None if ts is None else {"last_seen": ts}
+
+    def pop_expired(self, now=None):
+        now = time.time() if now is None else now
+        stale = [sid for sid, ts in self._timestamps.items() if now - ts > self.ttl_sec]
+        for sid in stale:
+            del self._timestamps[sid]
+        return stale
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run(store, sids, touches, seed):
+    rng = random.Random(seed)
+    results = {"backend": store.backend}
+
+    ms, _ = timed(lambda: [store.touch(sid, language="en-US") for sid in sids])
+    results["create"] = {"ms": round(ms, 2), "ops_per_sec": round(len(sids) / ms * 1000)}
+
+    activity = [rng.choice(sids) for _ in range(len(sids) * touches)]
+    ms, _ = timed(lambda: [store.touch(sid) for sid in activity])
+    results["activity"] = {"ms": round(ms, 2), "ops_per_sec": round(len(activity) / ms * 1000)}
+
+    ms, found = timed(lambda: [store.get(sid) for sid in sids])
+    results["get"] = {"ms": round(ms, 2), "ops_per_sec": round(len(sids) / ms * 1000)}
+
+    ms, expired = timed(lambda: store.pop_expired())
+    results["sweep_idle"] = {"ms": round(ms, 3), "expired": len(expired)}
+
+    # Sweep at the moment the oldest 1% of sessions fall due
+    deadlines = sorted(info["last_seen"] + TTL_SEC for info in found if info)
+    due_at = deadlines[len(deadlines) // 100]
+    ms, expired = timed(lambda: store.pop_expired(now=due_at + 1e-6))
+    results["sweep_1pct"] = {"ms": round(ms, 3), "expired": len(expired)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--touches", type=int, default=10, help="activity touches per session")
+    parser.add_argument("--json", action="store_true", help="print machine-readable JSON only")
+    args = parser.parse_args()
+
+    sids = [f"sid-{i:06d}" for i in range(args.sessions)]
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = [
+            LegacyStore(TTL_SEC),
+            InProcessSessionStore(TTL_SEC),
+            SqliteSessionStore(TTL_SEC, os.path.join(tmp, "sessions.db"), worker_id="bench"),
+        ]
+        results = [run(store, sids, args.touches, seed=7) for store in stores]
+
+    report = {"sessions": args.sessions, "activity_touches": args.sessions * args.touches, "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print("=" * 96)
+    print(f"Session stores: {args.sessions} sessions, {args.sessions * args.touches} activity touches")
+    print("=" * 96)
+    print(f"{'backend':18s} {'create/s':>10s} {'touch/s':>10s} {'get/s':>10s} {'sweep idle':>12s} {'sweep 1%':>12s} {'expired':>8s}")
+    for r in results:
+        print(f"{r['backend']:18s} {r['create']['ops_per_sec']:>10d} {r['activity']['ops_per_sec']:>10d} "
+              f"{r['get']['ops_per_sec']:>10d} {r['sweep_idle']['ms']:>10.3f}ms {r['sweep_1pct']['ms']:>10.3f}ms "
+              f"{r['sweep_1pct']['expired']:>8d}")
+
+
+if __name__ == "__main__":
+    main()
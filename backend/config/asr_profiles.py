@@ -0,0 +1,20 @@
+# config/asr_profiles.py
+
+# Named ASR model profiles. Pick one per host with ASR_PROFILE.
+#
+#   model:        faster-whisper / whisper model name
+#   compute_type: CTranslate2 compute type (ignored by the whisper package)
+#   beam_size:    decoder beam width (1 = greedy)
+#   cpu_threads:  threads per model instance (0 = library default)
+asrProfiles = {
+    # The original hard-coded configuration
+    "small-fp32": {"model": "small.en", "compute_type": "float32", "beam_size": 5, "cpu_threads": 0},
+    "small-int8": {"model": "small.en", "compute_type": "int8", "beam_size": 5, "cpu_threads": 0},
+    "small-int8-fp32": {"model": "small.en", "compute_type": "int8_float32", "beam_size": 5, "cpu_threads": 0},
+    "small-int8-greedy": {"model": "small.en", "compute_type": "int8", "beam_size": 1, "cpu_threads": 0},
+    "base-int8": {"model": "base.en", "compute_type": "int8", "beam_size": 5, "cpu_threads": 0},
+    "base-int8-greedy": {"model": "base.en", "compute_type": "int8", "beam_size": 1, "cpu_threads": 0},
+    "tiny-int8": {"model": "tiny.en", "compute_type": "int8", "beam_size": 5, "cpu_threads": 0},
+}
+
+DEFAULT_ASR_PROFILE = "small-fp32"
@@ -1,214 +1,691 @@
-import whisper
 import numpy as np
 import io
 import tempfile
 import os
 import time
 import threading
-from datetime import datetime
+from types import SimpleNamespace
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-from pydub import AudioSegment
+from config.asr_profiles import asrProfiles, DEFAULT_ASR_PROFILE
+from utils import audio_io, vad
+from utils.admission import COMMAND, DICTATION, AdmissionController, AdmissionRejected
+from utils.audio_codecs import DEFAULT_ADPCM_BLOCK_ALIGN, ChunkDecoder, available_codecs
+from utils.dictation import DictationTranscriber, PcmSpool
+from utils.asr_rejection import RejectionPolicy, consume_segments
+from utils.asr_service import AsrServiceClient, AsrServiceError, spawn_local_service
+from utils.asr_worker_pool import AsrWorkerPool
+from utils.inference_scheduler import InferenceScheduler
+from utils.ring_buffer import AudioRingBuffer
+from utils.session_jobs import SessionJobs
+from utils.session_store import create_session_store
+from utils.stream_decoder import StreamingDecoder
+from utils.startup import ComponentNotReady, ComponentRegistry
+from utils.streaming_transcriber import StreamingTranscriber
+from utils.transcript_cache import TranscriptCache, audio_fingerprint
 
-# Try to load faster-whisper if available, otherwise fall back to OpenAI/whisper
+# ASR model profile (see config/asr_profiles.py)
+ASR_PROFILE = os.getenv("ASR_PROFILE", DEFAULT_ASR_PROFILE)
+
+# ASR worker processes (set per deployment). 0 = load the model in this process.
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "0"))
+ASR_WORKER_CPU_THREADS = int(os.getenv("ASR_WORKER_CPU_THREADS", "0"))  # 0 = one thread per pinned core
+ASR_WORKER_PIN_CORES = os.getenv("ASR_WORKER_PIN_CORES", "true").lower() in ("1", "true", "yes")
+
+# Separate ASR service (utils/asr_service.py) on a Unix socket. Empty = inference in this process / pool.
+ASR_SERVICE_SOCKET = os.getenv("ASR_SERVICE_SOCKET", "")
+ASR_SERVICE_SPAWN = os.getenv("ASR_SERVICE_SPAWN", "false").lower() in ("1", "true", "yes")  # start it as a child
+ASR_SERVICE_ENGINE = os.getenv("ASR_SERVICE_ENGINE", "model")  # 'stub' = no model, for testing the stack
+ASR_SERVICE_TIMEOUT_SEC = float(os.getenv("ASR_SERVICE_TIMEOUT_SEC", "30"))  # per-request deadline
+ASR_SERVICE_START_TIMEOUT_SEC = float(os.getenv("ASR_SERVICE_START_TIMEOUT_SEC", "300"))
+
+def _load_fw_model(profile):
+    """Create a faster-whisper model for a profile"""
+    from faster_whisper import WhisperModel
+    return WhisperModel(
+        profile["model"],
+        device="cpu",
+        compute_type=profile["compute_type"],
+        cpu_threads=profile["cpu_threads"],
+    )
+
+def _select_asr_profile():
+    """Return the configured profile name"""
+    if ASR_PROFILE not in asrProfiles:
+        raise ValueError(f"Unknown ASR_PROFILE '{ASR_PROFILE}'. Available: {', '.join(asrProfiles)}")
+    return ASR_PROFILE
+
+# Model state is filled in by load_asr() on a background thread (see start_services)
+asr_profile_name = ASR_PROFILE
+asr_profile = asrProfiles.get(ASR_PROFILE)
 use_faster_whisper = False
 fw_model = None
-try:
-    from faster_whisper import WhisperModel
-    print("🔄 Loading faster-whisper model...")
-    # Use float32 on CPU for compatibility; change compute_type if you have GPU/quantized builds
-    fw_model = WhisperModel("small.en", device="cpu", compute_type="float32")
-    use_faster_whisper = True
-    print("✅ faster-whisper model loaded successfully!")
-except Exception as e:
-    print(f"ℹ️ faster-whisper not available or failed to load: {e}. Falling back to whisper package.")
-    print("🔄 Loading Whisper model...")
-    whisper_model = whisper.load_model("small.en","cpu")
-    print("✅ Whisper model loaded successfully!")
+whisper_model = None
+asr_worker_pool = None
+asr_service_client = None
+asr_service_proc = None
+inference_scheduler = None
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "*"}})  # Enable CORS for frontend requests
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# 'threading' by default; with the ASR service out of process the web tier can run on eventlet/gevent
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=os.getenv("SOCKETIO_ASYNC_MODE", "threading"))
 
 # Configuration
 AUDIO_BUFFER_THRESHOLD_BYTES = 80000  # ~5 seconds at 16kHz
 AUDIO_BUFFER_MAX_SIZE = 1000000  # 1MB max per chunk
-BUFFER_CLEANUP_INTERVAL_SEC = 60  # Check every minute
+BUFFER_CLEANUP_INTERVAL_SEC = 60  # Longest the cleanup thread sleeps between expiry checks
 BUFFER_STALE_TIMEOUT_SEC = 300  # 5 minutes
+# Session metadata store: 'memory' (this process) or 'sqlite' (shared by workers on this host)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "")
+# Per-session ring buffer: a flush always happens before one more max-size chunk could overflow it
+AUDIO_RING_CAPACITY_BYTES = AUDIO_BUFFER_THRESHOLD_BYTES + AUDIO_BUFFER_MAX_SIZE
 # Silence detection thresholds (tune to your microphone/environment)
 SILENCE_RMS_THRESHOLD = 300  # RMS below this is considered silence / too quiet
-SILENCE_MIN_DURATION_MS = 400  # Minimum duration to consider for transcription
+SILENCE_MIN_DURATION_MS = 400  # Minimum speech duration to consider for transcription
+VAD_HANGOVER_MS = 300  # Silence tolerated inside a speech segment (same as frontend VAD)
+VAD_PADDING_MS = 150  # Pre-roll kept before each detected speech segment
+# Batched inference: clips arriving within the window share one encoder/decoder pass
+ASR_BATCHING_ENABLED = os.getenv("ASR_BATCHING", "true").lower() in ("1", "true", "yes")
+ASR_BATCH_WINDOW_MS = int(os.getenv("ASR_BATCH_WINDOW_MS", "25"))
+ASR_BATCH_MAX_SIZE = int(os.getenv("ASR_BATCH_MAX_SIZE", "8"))
+# Admission control (utils/admission.py): concurrent inferences and who waits for a slot
+ASR_MAX_CONCURRENT = int(os.getenv("ASR_MAX_CONCURRENT", "0"))  # 0 = batch size with batching, else one per worker
+ASR_MAX_QUEUE = int(os.getenv("ASR_MAX_QUEUE", "32"))  # waiting requests beyond this get 503 / 'busy' at once
+ASR_MAX_QUEUE_PER_CLIENT = int(os.getenv("ASR_MAX_QUEUE_PER_CLIENT", "4"))
+ASR_COMMAND_MAX_SEC = float(os.getenv("ASR_COMMAND_MAX_SEC", "8"))  # speech up to this long is a command, longer is dictation
+ASR_COMMAND_MAX_WAIT_SEC = float(os.getenv("ASR_COMMAND_MAX_WAIT_SEC", "2"))
+ASR_DICTATION_MAX_WAIT_SEC = float(os.getenv("ASR_DICTATION_MAX_WAIT_SEC", "10"))
+# Streaming mode (audio_chunk with stream=True): sliding-window decode with partial hypotheses
+STREAM_STEP_MS = 500  # Re-decode after this much new audio
+STREAM_WINDOW_SEC = 15  # Force a commit when the uncommitted window grows past this
+STREAM_OVERLAP_MS = 200  # Audio kept before a commit point so cut words are re-heard
+STREAM_BEAM_SIZE = 1  # Greedy decoding keeps partials fast; finals are re-checked by agreement
 
-def transcribe_audio(audio_buffer, is_wav_format=False, language="en"):
+DICTATION_WINDOW_SEC = 30  # One model context per decode; segments cut by the edge are re-decoded
+DICTATION_PROMPT_CHARS = 200  # Committed text carried into the next window as the prompt
+DICTATION_MAX_SEC = float(os.getenv("DICTATION_MAX_SEC", "3600"))  # Spool cap per dictation
+DICTATION_SPOOL_DIR = os.getenv("DICTATION_SPOOL_DIR", "")  # Default: the system temp dir
+# Socket transcription jobs: per-session queue bound and overflow policy (merge | drop_oldest | reject)
+SESSION_QUEUE_MAX_PENDING = int(os.getenv("SESSION_QUEUE_MAX_PENDING", "2"))
+SESSION_QUEUE_OVERFLOW = os.getenv("SESSION_QUEUE_OVERFLOW", "merge")
+SESSION_MODES = ('actions', 'speculative')  # opt-in per session via the configure_session event
+# Startup: how long a request waits for a component that is still loading before giving up
+ASR_READY_TIMEOUT_SEC = float(os.getenv("ASR_READY_TIMEOUT_SEC", "5"))
+NLP_READY_TIMEOUT_SEC = float(os.getenv("NLP_READY_TIMEOUT_SEC", "5"))
+PARSE_BATCH_MAX_ITEMS = int(os.getenv("PARSE_BATCH_MAX_ITEMS", "10000"))
+PARSE_BATCH_SIZE = int(os.getenv("PARSE_BATCH_SIZE", "256"))  # nlp.pipe batch size (default and maximum per request)
+PARSE_BATCH_N_PROCESS = int(os.getenv("PARSE_BATCH_N_PROCESS", "1"))  # nlp.pipe worker processes (default and maximum)
+STARTUP_RETRY_AFTER_SEC = 5  # Retry-After sent with 503s while warming up
+# Transcript cache: repeated clips skip the model (0 disables; path enables on-disk persistence)
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", "")
+
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "2048"))  # 0 disables the intent cache
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", "")  # SQLite file for LLM results, kept across restarts
+INTENT_CACHE_TTL_SEC = float(os.getenv("INTENT_CACHE_TTL_SEC", str(30 * 86400)))
+INTENT_CACHE_NEGATIVE_TTL_SEC = float(os.getenv("INTENT_CACHE_NEGATIVE_TTL_SEC", "300"))  # 'unknown' results
+# Confidence-based rejection from the model's own scores (see utils/asr_rejection.py)
+ASR_REJECT_NO_SPEECH_PROB = float(os.getenv("ASR_REJECT_NO_SPEECH_PROB", "0.6"))  # with avg_logprob <= ASR_REJECT_LOGPROB
+ASR_REJECT_LOGPROB = float(os.getenv("ASR_REJECT_LOGPROB", "-1.0"))
+ASR_REJECT_COMPRESSION_RATIO = float(os.getenv("ASR_REJECT_COMPRESSION_RATIO", "2.4"))  # repetition loops
+ASR_REJECT_MIN_AVG_LOGPROB = float(os.getenv("ASR_REJECT_MIN_AVG_LOGPROB", "-2.0"))
+ASR_PROBE_NO_SPEECH_PROB = float(os.getenv("ASR_PROBE_NO_SPEECH_PROB", "0.8"))  # reject before beam search
+
+transcript_cache = (
+    TranscriptCache(TRANSCRIPT_CACHE_MAX_BYTES, persist_path=TRANSCRIPT_CACHE_PATH or None,
+                    per_request_fields=('queue_ms',))
+    if TRANSCRIPT_CACHE_MAX_BYTES > 0 else None
+)
+rejection_policy = RejectionPolicy(
+    no_speech_prob=ASR_REJECT_NO_SPEECH_PROB,
+    logprob=ASR_REJECT_LOGPROB,
+    compression_ratio=ASR_REJECT_COMPRESSION_RATIO,
+    min_avg_logprob=ASR_REJECT_MIN_AVG_LOGPROB,
+    probe_no_speech_prob=ASR_PROBE_NO_SPEECH_PROB,
+)
+rejection_counts = {}  # reason -> number of clips rejected for it
+admission = AdmissionController(
+    ASR_MAX_CONCURRENT or (ASR_BATCH_MAX_SIZE if ASR_BATCHING_ENABLED and ASR_WORKERS == 0 else max(ASR_WORKERS, 1)),
+    max_queue=ASR_MAX_QUEUE,
+    max_wait_sec={COMMAND: ASR_COMMAND_MAX_WAIT_SEC, DICTATION: ASR_DICTATION_MAX_WAIT_SEC},
+    max_queue_per_client=ASR_MAX_QUEUE_PER_CLIENT,
+)
+rejection_counts_lock = threading.Lock()
+
+def _get_whisper_model():
+    """Return the openai-whisper model, loading it lazily for the fallback path"""
+    global whisper_model
+    if whisper_model is None:
+        import whisper
+
+        print("🔄 Loading Whisper model for fallback...")
+        whisper_model = whisper.load_model(asr_profile["model"], "cpu")
+        print("✅ Whisper model loaded successfully (fallback).")
+    return whisper_model
+
+def _transcribe_batch_whisper(audios, language_short):
+    """Run the openai-whisper decode on a batch of 16kHz float32 arrays"""
+    import torch
+    import whisper
+
+    model = _get_whisper_model()
+    outputs = [None] * len(audios)
+    # pad_or_trim would silently drop everything past 30s: longer clips go
+    # through whisper.transcribe, which slides its window over the whole clip
+    short = [i for i, a in enumerate(audios) if len(a) <= whisper.audio.N_SAMPLES]
+    for i, audio_np in enumerate(audios):
+        if i not in short:
+            print(f"📜 Long clip ({len(audio_np) / 16000:.1f}s): windowed Whisper transcription")
+            result = whisper.transcribe(
+                model,
+                audio_np,
+                language=language_short,
+                fp16=False,
+                no_speech_threshold=rejection_policy.no_speech_prob,
+                logprob_threshold=rejection_policy.logprob,
+                compression_ratio_threshold=rejection_policy.compression_ratio,
+            )
+            kept, rejected = consume_segments((SimpleNamespace(**seg) for seg in result['segments']), rejection_policy)
+            outputs[i] = {'text': "".join([text for _, _, text in kept]).strip(), 'rejected': rejected}
+    if not short:
+        return outputs
+
+    # Whisper expects exactly 30s of 16kHz float32, just pad
+    padded = [whisper.pad_or_trim(audios[i]) for i in short]
+    print(f"🔢 Audio batch: {len(padded)} x {padded[0].shape}, dtype: {padded[0].dtype}")
+
+    print("🎵 Generating mel spectrograms...")
+    # Per-clip mels: log_mel_spectrogram normalizes against the max of its whole input
+    mel = torch.stack([whisper.log_mel_spectrogram(a) for a in padded]).to(model.device)
+
+    print("🤖 Running Whisper model...")
+    options = whisper.DecodingOptions(language=language_short, fp16=False)
+    results = whisper.decode(model, mel, options)
+    for i, result in zip(short, results):
+        rejected = rejection_policy.check(result.no_speech_prob, result.avg_logprob, result.compression_ratio)
+        outputs[i] = {'text': '' if rejected else result.text.strip(), 'rejected': rejected}
+    return outputs
+
+# Temperatures faster-whisper retries with when a decode fails its quality thresholds
+FW_FALLBACK_TEMPERATURES = (0.2, 0.4, 0.6, 0.8, 1.0)
+
+def _transcribe_clip_faster_whisper(audio_np, language_short, temperature=None):
+    """One clip through fw_model.transcribe, segments consumed through the rejection policy"""
+    options = {} if temperature is None else {'temperature': temperature}
+    segments, info = fw_model.transcribe(
+        audio_np,
+        beam_size=asr_profile["beam_size"],
+        language=language_short,
+        no_speech_threshold=rejection_policy.no_speech_prob,
+        log_prob_threshold=rejection_policy.logprob,
+        compression_ratio_threshold=rejection_policy.compression_ratio,
+        **options,
+    )
+    kept, rejected = consume_segments(segments, rejection_policy)
+    return {'text': "".join([text for _, _, text in kept]).strip(), 'rejected': rejected}
+
+def _transcribe_batch_faster_whisper(audios, language_short):
     """
-    Transcribe audio using Whisper model.
+    Transcribe a batch with faster-whisper.
+
+    Clips that fit in one 30s window are encoded together, then a single
+    decoder step reads each clip's no-speech probability; clips that are
+    conclusively silent are rejected there, and only the rest go through
+    beam search (in one CTranslate2 call). A clip whose beam result fails
+    the compression-ratio or log-prob threshold (and isn't silence) is
+    decoded again through fw_model.transcribe from the first fallback
+    temperature, as faster-whisper would. Longer clips go through
+    fw_model.transcribe so they keep its sliding-window segmentation, with
+    segments consumed lazily through the rejection policy.
+
+    Returns:
+        list of dicts: text and rejected (reason, or None if kept) per clip
+    """
+    import ctranslate2
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+    from faster_whisper.transcribe import get_compression_ratio
+
+    outputs = [None] * len(audios)
+    window_samples = fw_model.feature_extractor.n_samples
+    short = [i for i, a in enumerate(audios) if len(a) <= window_samples]
+
+    for i, audio_np in enumerate(audios):
+        if i not in short:
+            outputs[i] = _transcribe_clip_faster_whisper(audio_np, language_short)
+
+    if short:
+        tokenizer = Tokenizer(
+            fw_model.hf_tokenizer,
+            fw_model.model.is_multilingual,
+            task="transcribe",
+            language=language_short,
+        )
+        features = np.stack([pad_or_trim(fw_model.feature_extractor(audios[i])) for i in short])
+        prompt = list(fw_model.get_prompt(tokenizer, previous_tokens=[], without_timestamps=True))
+        encoder_output = fw_model.encode(features)
+
+        # Probe: one greedy token is enough to get the no-speech probability
+        probes = fw_model.model.generate(
+            encoder_output,
+            [prompt for _ in short],
+            beam_size=1,
+            max_length=len(prompt) + 1,
+            return_no_speech_prob=True,
+        )
+        speech = []  # (row in encoder_output, clip index, no_speech_prob)
+        for row, (i, probe) in enumerate(zip(short, probes)):
+            rejected = rejection_policy.check_probe(probe.no_speech_prob)
+            if rejected:
+                print(f"🔇 Rejected clip before beam search (no_speech_prob={probe.no_speech_prob:.2f})")
+                outputs[i] = {'text': '', 'rejected': rejected}
+            else:
+                speech.append((row, i, probe.no_speech_prob))
+
+        if speech:
+            if len(speech) < len(short):
+                rows = [row for row, _, _ in speech]
+                encoder_output = ctranslate2.StorageView.from_array(np.asarray(encoder_output)[rows])
+            results = fw_model.model.generate(
+                encoder_output,
+                [prompt for _ in speech],
+                beam_size=asr_profile["beam_size"],
+                max_length=fw_model.max_length,
+                return_scores=True,
+                suppress_blank=True,
+                suppress_tokens=[-1],
+            )
+            for (_, i, no_speech_prob), result in zip(speech, results):
+                tokens = result.sequences_ids[0]
+                text = tokenizer.decode(tokens).strip()
+                # Same recovery of the mean token log-prob as faster-whisper (length_penalty=1)
+                avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+                compression_ratio = get_compression_ratio(text)
+                silent = no_speech_prob > rejection_policy.no_speech_prob and avg_logprob < rejection_policy.logprob
+                if not silent and (compression_ratio > rejection_policy.compression_ratio
+                                   or avg_logprob < rejection_policy.logprob):
+                    print(f"🌡️ Retrying clip with temperature fallback "
+                          f"(avg_logprob={avg_logprob:.2f}, compression_ratio={compression_ratio:.2f})")
+                    outputs[i] = _transcribe_clip_faster_whisper(audios[i], language_short, FW_FALLBACK_TEMPERATURES)
+                    continue
+                rejected = rejection_policy.check(no_speech_prob, avg_logprob, compression_ratio)
+                outputs[i] = {'text': '' if rejected else text, 'rejected': rejected}
+
+    return outputs
+
+def _transcribe_batch(audios, language_short):
+    """Batch entry point used by the inference scheduler"""
+    if use_faster_whisper and fw_model is not None:
+        try:
+            print(f"⚡ Using faster-whisper for transcription ({len(audios)} clip(s), in-memory) ...")
+            return _transcribe_batch_faster_whisper(audios, language_short)
+        except Exception as e:
+            print(f"⚠️ faster-whisper transcription failed: {e}. Falling back to whisper package.")
+    return _transcribe_batch_whisper(audios, language_short)
+
+def _connect_asr_service():
+    """Connect to (and optionally spawn) the ASR service, then wait until it has loaded its model"""
+    global asr_profile_name, asr_profile, asr_service_client, asr_service_proc
+
+    if ASR_SERVICE_SPAWN:
+        import atexit
+
+        print(f"🔄 Starting local ASR service on {ASR_SERVICE_SOCKET} ({ASR_SERVICE_ENGINE})...")
+        asr_service_proc = spawn_local_service(
+            ASR_SERVICE_SOCKET,
+            ASR_PROFILE,
+            workers=ASR_WORKERS,
+            cpu_threads=ASR_WORKER_CPU_THREADS,
+            rejection=rejection_policy.to_dict(),
+            engine=ASR_SERVICE_ENGINE,
+            pin_cores=ASR_WORKER_PIN_CORES,
+        )
+        atexit.register(asr_service_proc.terminate)
+
+    asr_service_client = AsrServiceClient(ASR_SERVICE_SOCKET, default_timeout=ASR_SERVICE_TIMEOUT_SEC)
+    health = asr_service_client.wait_ready(timeout=ASR_SERVICE_START_TIMEOUT_SEC)
+    # The service picked the profile; report that one
+    asr_profile_name = health["profile"]
+    asr_profile = asrProfiles.get(asr_profile_name, asr_profile)
+    print(f"✅ ASR service ready at {ASR_SERVICE_SOCKET} (engine {health['engine']}, profile {asr_profile_name})")
+
+def load_asr():
+    """Select the profile and load the ASR model (or start the worker pool / connect to the ASR service)"""
+    global asr_profile_name, asr_profile
+    global use_faster_whisper, fw_model, whisper_model, asr_worker_pool, inference_scheduler
+
+    if ASR_SERVICE_SOCKET:
+        _connect_asr_service()
+        return
+
+    asr_profile_name = _select_asr_profile()
+    asr_profile = asrProfiles[asr_profile_name]
+    print(f"🎛️ ASR profile: {asr_profile_name} {asr_profile}")
+
+    if ASR_WORKERS > 0:
+        # Each worker owns its own model; this process only dispatches
+        print(f"🔄 Starting {ASR_WORKERS} ASR worker process(es)...")
+        asr_worker_pool = AsrWorkerPool(
+            ASR_WORKERS,
+            model_size=asr_profile["model"],
+            compute_type=asr_profile["compute_type"],
+            cpu_threads=ASR_WORKER_CPU_THREADS or asr_profile["cpu_threads"],
+            beam_size=asr_profile["beam_size"],
+            pin_cores=ASR_WORKER_PIN_CORES,
+            rejection=rejection_policy.to_dict(),
+        )
+        return
+
+    # Try to load faster-whisper if available, otherwise fall back to OpenAI/whisper
+    try:
+        print("🔄 Loading faster-whisper model...")
+        fw_model = _load_fw_model(asr_profile)
+        use_faster_whisper = True
+        print("✅ faster-whisper model loaded successfully!")
+    except Exception as e:
+        print(f"ℹ️ faster-whisper not available or failed to load: {e}. Falling back to whisper package.")
+        _get_whisper_model()
+
+    # Concurrent requests share one model; clips arriving within the window are decoded together.
+    # With a worker pool each worker takes one clip at a time instead.
+    if ASR_BATCHING_ENABLED:
+        inference_scheduler = InferenceScheduler(
+            _transcribe_batch, window_ms=ASR_BATCH_WINDOW_MS, max_batch_size=ASR_BATCH_MAX_SIZE
+        )
+
+def warmup_asr():
+    """Run a dummy clip through the model so the first real request doesn't pay for lazy init"""
+    t = np.arange(16000) / 16000
+    dummy = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    if asr_service_client is not None:
+        asr_service_client.transcribe(dummy, "en")
+    elif asr_worker_pool is not None:
+        # Roughly one job per worker; each waits until its worker has loaded the model
+        futures = [asr_worker_pool.submit(dummy, "en") for _ in asr_worker_pool.workers]
+        for future in futures:
+            future.result()
+    else:
+        _transcribe_batch([dummy], "en")
+
+def load_nlp():
+    """Import the command router, which loads the spaCy pipeline, and install the intent cache"""
+    import utils.enhanced_command_router as router  # loads spaCy at import
+    from utils.intent_cache import IntentCache
+    
+    cache = None
+    if INTENT_CACHE_MAX_ENTRIES > 0:
+        cache = IntentCache(
+            INTENT_CACHE_MAX_ENTRIES,
+            persist_path=INTENT_CACHE_PATH or None,
+            ttl_sec=INTENT_CACHE_TTL_SEC,
+            negative_ttl_sec=INTENT_CACHE_NEGATIVE_TTL_SEC,
+            version=router.cache_version(),
+        )
+    router.set_intent_cache(cache)
+
+def warmup_nlp():
+    from utils.enhanced_command_router import nlp, get_intent_and_entities, get_ollama_client
+    from utils.ollama_client import OllamaError
+    nlp("go to the profile page")
+    get_intent_and_entities("scroll down", use_ollama=False)
+    
+    def warm_ollama():
+        # Optional fallback: load the LLM now so the first unmatched command doesn't pay for it
+        try:
+            get_ollama_client().warm()
+            print("✅ Ollama model loaded")
+        except OllamaError as e:
+            print(f"ℹ️ Ollama fallback not warmed: {e}")
+    threading.Thread(target=warm_ollama, daemon=True).start()
+
+startup = ComponentRegistry()
+startup.register("asr", load_asr, warmup_asr)
+startup.register("nlp", load_nlp, warmup_nlp)
+
+def _require_asr():
+    """Block (briefly) until the ASR component is ready; raises ComponentNotReady otherwise"""
+    startup.wait_ready("asr", timeout=ASR_READY_TIMEOUT_SEC)
+
+def _priority_for(audio_np):
+    """Admission class of a clip: short speech is a command, longer is dictation"""
+    return COMMAND if len(audio_np) <= ASR_COMMAND_MAX_SEC * audio_io.TARGET_SAMPLE_RATE else DICTATION
+
+def _run_inference(audio_np, language_short):
+    """
+    Transcribe one clip on the ASR service, the worker pool, the batch scheduler, or directly.
+
+    Returns:
+        dict: text and rejected (reason, or None if kept)
+    """
+    _require_asr()
+    if asr_service_client is not None:
+        return asr_service_client.transcribe(audio_np, language_short)
+    if asr_worker_pool is not None:
+        return asr_worker_pool.transcribe(audio_np, language_short)
+    if inference_scheduler is not None:
+        return inference_scheduler.transcribe(audio_np, language_short)
+    return _transcribe_batch([audio_np], language_short)[0]
+
+def _language_short(language):
+    """Normalize language to short code (e.g., en-US -> en) for Whisper API"""
+    return (language.split("-")[0] if language else "en").lower()
+
+def _record_rejection(reason):
+    with rejection_counts_lock:
+        rejection_counts[reason] = rejection_counts.get(reason, 0) + 1
+
+def _is_likely_noise(transcript):
+    """Check if transcription seems like noise/hallucination"""
+    noise_phrases = [
+        "thank you", "thanks for watching", "i'm sorry", "bye", "you", "i", "and", "the", "a",
+        "thank you for watching", "thanks for", "bye bye", 
+        "open up for now", "you know", "so", "um", "uh",  # Common silence hallucinations
+        "the end", "okay", "yeah", "right", "see you"
+    ]
+    
+    return (
+        len(transcript) < 3 or  # Very short
+        transcript.lower().strip() in noise_phrases or  # Common hallucinations
+        len(transcript.split()) == 1 and len(transcript) < 5 or  # Single very short word
+        # Check if it's a partial match of common phrases
+        any(phrase in transcript.lower() for phrase in ["thank you for", "thanks for watching", "open up for"])
+    )
+
+def _decode_stream_window(audio_np, language_short, prompt, client=None, beam_size=STREAM_BEAM_SIZE):
+    """Decode one streaming/dictation window with the committed text as prompt; returns [(start, end, text)]"""
+    _require_asr()
+    with admission.slot(client or 'anonymous', _priority_for(audio_np)):
+        return _decode_stream_window_admitted(audio_np, language_short, prompt, beam_size)
+
+def _decode_stream_window_admitted(audio_np, language_short, prompt, beam_size):
+    if asr_service_client is not None:
+        return asr_service_client.transcribe_segments(
+            audio_np, language_short, initial_prompt=prompt or None, beam_size=beam_size
+        )
+    if asr_worker_pool is not None:
+        return asr_worker_pool.transcribe_segments(
+            audio_np, language_short, initial_prompt=prompt or None, beam_size=beam_size
+        )
+
+    if use_faster_whisper and fw_model is not None:
+        segments, info = fw_model.transcribe(
+            audio_np,
+            beam_size=beam_size,
+            language=language_short,
+            initial_prompt=prompt or None,
+            condition_on_previous_text=False,
+            no_speech_threshold=rejection_policy.no_speech_prob,
+            log_prob_threshold=rejection_policy.logprob,
+        )
+        kept, rejected = consume_segments(segments, rejection_policy)
+        return kept
+
+    import whisper
+
+    model = _get_whisper_model()
+    mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio_np)).to(model.device)
+    options = whisper.DecodingOptions(
+        language=language_short, fp16=False, prompt=prompt or None, without_timestamps=True,
+        beam_size=beam_size if beam_size > 1 else None,
+    )
+    result = whisper.decode(model, mel, options)
+    if rejection_policy.check(result.no_speech_prob, result.avg_logprob, result.compression_ratio):
+        return []
+    return [(0.0, len(audio_np) / 16000, result.text)]
+
+def transcribe_pcm(audio_np, language="en", client=None):
+    """
+    Transcribe a decoded 16kHz mono float32 array.
+    
+    Results are cached by a hash of the PCM plus language and ASR profile,
+    so a resent or re-inspected clip skips the model entirely.
     
     Args:
-        audio_buffer: BytesIO containing audio data
-        is_wav_format: If True, skip format conversion (already 16kHz mono WAV)
+        client: who is asking (socket sid / remote address), for per-client fairness
     
     Returns:
-        str: Transcribed text or empty string if silence/noise
+        dict: see _transcribe_pcm_uncached
+    Raises:
+        AdmissionRejected: the ASR is saturated (no slot within the clip class's max wait)
     """
-    print("🔊 Processing audio file...")
+    if transcript_cache is None:
+        return _transcribe_pcm_uncached(audio_np, language, client)
     
-    # Save uploaded audio to temp file
-    raw_bytes = audio_buffer.read()
-    print(f"📦 Raw input: {len(raw_bytes)} bytes, format: {'WAV (pre-converted)' if is_wav_format else 'WebM (needs conversion)'} | requested language: {language}")
+    cache_key = audio_fingerprint(audio_np, _language_short(language), asr_profile_name)
+    cached = transcript_cache.get(cache_key)
+    if cached is not None:
+        print(f"⚡ Transcript cache hit: '{cached['text']}'")
+        # Timings belong to the request that ran the model; this one waited for nothing
+        return dict(cached, queue_ms=0.0)
     
-    if is_wav_format:
-        # Audio is already in WAV format (16kHz mono) - skip conversion!
-        print("⚡ Using pre-converted WAV audio (skipping pydub conversion)")
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
-            temp_wav.write(raw_bytes)
-            temp_wav_path = temp_wav.name
-        
-        try:
-            # Quick validation: check WAV header
-            audio = AudioSegment.from_wav(io.BytesIO(raw_bytes))
-            print(f"📊 WAV audio: {len(audio)}ms, {audio.frame_rate}Hz, {audio.channels}ch, RMS={audio.rms}")
-            
-            # Check if audio is too quiet (likely silence)
-            if audio.rms < SILENCE_RMS_THRESHOLD:
-                print(f"⚠️ Audio too quiet (RMS={audio.rms}) - likely silence, skipping transcription")
-                os.unlink(temp_wav_path)
-                return ""
-
-            # Check if audio is too short
-            if len(audio) < SILENCE_MIN_DURATION_MS:
-                print(f"⚠️ Audio too short ({len(audio)}ms) - skipping transcription")
-                os.unlink(temp_wav_path)
-                return ""
-        
-        except Exception as e:
-            print(f"⚠️ WAV validation error: {e}, proceeding with transcription anyway")
+    result = _transcribe_pcm_uncached(audio_np, language, client)
+    transcript_cache.put(cache_key, result)
+    return result
+
+def _transcribe_pcm_uncached(audio_np, language="en", client=None):
+    """
+    Run VAD and the model on a decoded array.
     
-    else:
-        # WebM format - needs conversion
-        with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as temp_input:
-            temp_input.write(raw_bytes)
-            temp_input_path = temp_input.name
-        
-        try:
-            # Convert any audio format to WAV using pydub
-            print("🔁 Converting audio to WAV format...")
-            try:
-                audio = AudioSegment.from_file(temp_input_path)
-            except Exception as e:
-                raise RuntimeError(
-                    "Failed to decode audio. Ensure ffmpeg is installed and available in PATH. "
-                    f"Original error: {e}"
-                )
-
-            print(f"📊 Input audio: {len(audio)}ms, {audio.frame_rate}Hz, {audio.channels}ch, {audio.sample_width}bytes, RMS={audio.rms}, Max={audio.max}")
-
-            # Export as WAV with 16kHz mono (Whisper's required format)
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
-                temp_wav_path = temp_wav.name
-
-            audio = audio.set_frame_rate(16000).set_channels(1)
-            audio.export(temp_wav_path, format="wav")
-            print(f"✅ Audio converted: {len(audio)}ms, 16000Hz, mono, RMS={audio.rms}")
-
-            # Check if audio is too quiet (likely silence)
-            if audio.rms < SILENCE_RMS_THRESHOLD:
-                print(f"⚠️ Audio too quiet (RMS={audio.rms}) - likely silence, skipping transcription")
-                os.unlink(temp_input_path)
-                os.unlink(temp_wav_path)
-                return ""
+    A frame-level VAD trims leading/trailing silence and the gaps between
+    speech segments; clips without speech never reach the model.
+    
+    Returns:
+        dict: text, duration_ms, speech_ms, speech_segments ([start_ms, end_ms] pairs),
+            queue_ms (wait for an inference slot) and rejected (why the text is empty, or None)
+    """
+    result = {
+        'text': '',
+        'duration_ms': audio_io.duration_ms(audio_np),
+        'speech_ms': 0,
+        'speech_segments': [],
+        'rejected': None,
+    }
+    
+    segments = vad.detect_speech_segments(
+        audio_np,
+        energy_threshold=SILENCE_RMS_THRESHOLD,
+        hangover_ms=VAD_HANGOVER_MS,
+        padding_ms=VAD_PADDING_MS,
+    )
+    result['speech_segments'] = vad.segments_to_ms(segments)
+    
+    # No speech frames at all: skip inference entirely
+    if not segments:
+        print(f"⚠️ No speech detected in {result['duration_ms']}ms (RMS={audio_io.rms_int16(audio_np)}) - skipping transcription")
+        result['rejected'] = 'vad_silence'
+        _record_rejection(result['rejected'])
+        return result
+    
+    speech = vad.extract_speech(audio_np, segments)
+    result['speech_ms'] = audio_io.duration_ms(speech)
+    print(f"🗣️ VAD: {len(segments)} speech segment(s), {result['speech_ms']}ms of {result['duration_ms']}ms")
 
-            # Check if audio is too short
-            if len(audio) < SILENCE_MIN_DURATION_MS:
-                print(f"⚠️ Audio too short ({len(audio)}ms) - skipping transcription")
-                os.unlink(temp_input_path)
-                os.unlink(temp_wav_path)
-                return ""
-        
-        finally:
-            # Clean up input file
-            if os.path.exists(temp_input_path):
-                os.unlink(temp_input_path)
+    # Check if speech is too short
+    if result['speech_ms'] < SILENCE_MIN_DURATION_MS:
+        print(f"⚠️ Speech too short ({result['speech_ms']}ms) - skipping transcription")
+        result['rejected'] = 'too_short'
+        _record_rejection(result['rejected'])
+        return result
 
-    try:
-        # Load audio - if faster-whisper is available use it (it can consume the WAV file directly)
-        print("🎵 Loading audio for transcription...")
+    _require_asr()  # don't hold an inference slot while the model is still loading
+    with admission.slot(client or 'anonymous', _priority_for(speech)) as slot:
+        output = _run_inference(speech, _language_short(language))
+    result['queue_ms'] = round(slot.waited_sec * 1000, 1)
+    if output['rejected']:
+        print(f"⚠️ Transcription rejected by the model's confidence scores ({output['rejected']})")
+        result['rejected'] = output['rejected']
+        _record_rejection(result['rejected'])
+        return result
 
-        # Normalize language to short code (e.g., en-US -> en) for Whisper API
-        language_short = (language.split("-")[0] if language else "en").lower()
+    transcript = output['text']
+    print(f"📝 Raw transcript: '{transcript}'")
 
-        if use_faster_whisper and fw_model is not None:
-            try:
-                print("⚡ Using faster-whisper for transcription (file path) ...")
-                # faster-whisper returns (segments, info)
-                segments, info = fw_model.transcribe(temp_wav_path, beam_size=5, language=language_short)
-                transcript = "".join([seg.text for seg in segments]).strip()
-                print(f"📝 Raw transcript (faster-whisper): '{transcript}'")
-            except Exception as e:
-                print(f"⚠️ faster-whisper transcription failed: {e}. Falling back to whisper package.")
-                # fallback to whisper package path below
-                # Ensure the whisper package model is loaded for fallback (lazy-load)
-                if 'whisper_model' not in globals() or whisper_model is None:
-                    try:
-                        print("🔄 Loading Whisper model for fallback...")
-                        whisper_model = whisper.load_model("small.en", "cpu")
-                        print("✅ Whisper model loaded successfully (fallback).")
-                    except Exception as inner_e:
-                        print(f"❌ Failed to load fallback Whisper model: {inner_e}")
-                        raise
-                audio_np = whisper.load_audio(temp_wav_path)
-                audio_np = whisper.pad_or_trim(audio_np)
-                print(f"🔢 Audio array shape: {audio_np.shape}, dtype: {audio_np.dtype}")
-                print("🎵 Generating mel spectrogram...")
-                mel = whisper.log_mel_spectrogram(audio_np).to(whisper_model.device)
-                print("🤖 Running Whisper model (fallback)...")
-                options = whisper.DecodingOptions(language=language_short, fp16=False)
-                result = whisper.decode(whisper_model, mel, options)
-                transcript = result.text.strip()
-                print(f"📝 Raw transcript (whisper fallback): '{transcript}'")
-        else:
-            # Use original whisper package flow
-            audio_np = whisper.load_audio(temp_wav_path)
-            # Whisper.load_audio already returns 16kHz float32, just trim/pad
-            audio_np = whisper.pad_or_trim(audio_np)
-            print(f"🔢 Audio array shape: {audio_np.shape}, dtype: {audio_np.dtype}, min: {audio_np.min():.4f}, max: {audio_np.max():.4f}, mean: {np.abs(audio_np).mean():.4f}")
-
-            print("🎵 Generating mel spectrogram...")
-            mel = whisper.log_mel_spectrogram(audio_np).to(whisper_model.device)
-
-            print("🤖 Running Whisper model...")
-            options = whisper.DecodingOptions(language=language_short, fp16=False)
-            result = whisper.decode(whisper_model, mel, options)
-
-            transcript = result.text.strip()
-            print(f"📝 Raw transcript: '{transcript}'")
-
-        # Check if transcription seems like noise/hallucination
-        noise_phrases = [
-            "thank you", "thanks for watching", "i'm sorry", "bye", "you", "i", "and", "the", "a",
-            "thank you for watching", "thanks for", "bye bye", 
-            "open up for now", "you know", "so", "um", "uh",  # Common silence hallucinations
-            "the end", "okay", "yeah", "right", "see you"
-        ]
-        
-        is_likely_noise = (
-            len(transcript) < 3 or  # Very short
-            transcript.lower().strip() in noise_phrases or  # Common hallucinations
-            len(transcript.split()) == 1 and len(transcript) < 5 or  # Single very short word
-            # Check if it's a partial match of common phrases
-            any(phrase in transcript.lower() for phrase in ["thank you for", "thanks for watching", "open up for"])
+    # Last line of defence for hallucinations the scores didn't catch
+    if _is_likely_noise(transcript):
+        print(f"⚠️ Warning: Transcription appears to be noise/hallucination - returning empty")
+        result['rejected'] = 'noise_phrase'
+        _record_rejection(result['rejected'])
+        return result  # Return empty text instead of hallucination
+
+    result['text'] = transcript
+    return result
+
+def decode_audio(raw_bytes, is_wav_format=False):
+    """
+    Decode an uploaded payload to a 16kHz mono float32 array.
+    
+    Audio is decoded entirely in memory: WAV is parsed straight into a
+    float32 array, anything else is piped through ffmpeg.
+    
+    Args:
+        raw_bytes: bytes-like payload (bytes, memoryview of a session buffer, ...)
+        is_wav_format: If True, skip format conversion (already 16kHz mono WAV)
+    """
+    print(f"📦 Raw input: {len(raw_bytes)} bytes, format: {'WAV (pre-converted)' if is_wav_format else 'WebM (needs conversion)'}")
+    
+    if is_wav_format:
+        print("⚡ Parsing pre-converted WAV audio in memory (skipping conversion)")
+    else:
+        print("🔁 Decoding audio through ffmpeg pipe...")
+    
+    try:
+        audio_np = audio_io.load_audio(raw_bytes, is_wav_format=is_wav_format)
+    except Exception as e:
+        raise RuntimeError(
+            "Failed to decode audio. Ensure ffmpeg is installed and available in PATH. "
+            f"Original error: {e}"
         )
+    
+    print(f"📊 Decoded audio: {audio_io.duration_ms(audio_np)}ms, 16000Hz, mono, RMS={audio_io.rms_int16(audio_np)}")
+    return audio_np
 
-        if is_likely_noise:
-            print(f"⚠️ Warning: Transcription appears to be noise/hallucination - returning empty")
-            return ""  # Return empty string instead of hallucination
+def transcribe_audio_detailed(audio_buffer, is_wav_format=False, language="en", client=None):
+    """
+    Decode an uploaded payload and transcribe it. The decoded array is
+    handed directly to faster-whisper / whisper (no temp files).
+    
+    Args:
+        audio_buffer: BytesIO containing audio data
+        is_wav_format: If True, skip format conversion (already 16kHz mono WAV)
+    
+    Returns:
+        dict: see transcribe_pcm
+    """
+    print(f"🔊 Processing audio file... | requested language: {language}")
+    raw_bytes = audio_buffer.getbuffer() if isinstance(audio_buffer, io.BytesIO) else audio_buffer.read()
+    return transcribe_pcm(decode_audio(raw_bytes, is_wav_format), language, client)
 
-        return transcript
+def transcribe_audio(audio_buffer, is_wav_format=False, language="en"):
+    """
+    Transcribe audio using Whisper model.
     
-    finally:
-        # Clean up temp file
-        if 'temp_wav_path' in locals() and os.path.exists(temp_wav_path):
-            os.unlink(temp_wav_path)
+    Returns:
+        str: Transcribed text or empty string if silence/noise
+    """
+    return transcribe_audio_detailed(audio_buffer, is_wav_format=is_wav_format, language=language)['text']
 
 @app.route('/api/whisper-transcribe', methods=['POST'])
 def whisper_transcribe():
@@ -229,9 +706,15 @@ def whisper_transcribe():
     try:
         print("🎯 Starting transcription...")
         # Map locale to short language code inside transcribe_audio
-        transcript = transcribe_audio(wav_buffer, language=lang)
-        print(f"✅ Transcription complete: '{transcript}'")
-        return jsonify({'transcript': transcript})
+        result = transcribe_audio_detailed(wav_buffer, language=lang, client=request.remote_addr)
+        print(f"✅ Transcription complete: '{result['text']}'")
+        return jsonify({'transcript': result['text'], 'speech_segments': result['speech_segments']})
+    except ComponentNotReady as e:
+        print(f"⏳ {e}")
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(STARTUP_RETRY_AFTER_SEC)}
+    except AdmissionRejected as e:
+        print(f"🚦 {e}")
+        return jsonify({'error': str(e), 'reason': e.reason}), 503, {'Retry-After': str(e.retry_after_sec)}
     except Exception as e:
         print(f"❌ Transcription error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -241,8 +724,12 @@ def whisper_transcribe():
 def parse_command():
     """NLP endpoint - processes voice commands and returns actions"""
     try:
+        startup.wait_ready("nlp", timeout=NLP_READY_TIMEOUT_SEC)
         from utils.enhanced_command_router import get_intent_and_entities, route_command
-    except ImportError as e:
+    except ComponentNotReady as e:
+        print(f"⏳ {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(STARTUP_RETRY_AFTER_SEC)}
+    except Exception as e:
         print(f"❌ Import error: {e}")
         return jsonify({
             'status': 'error',
@@ -251,6 +738,8 @@ def parse_command():
     
     data = request.json
     text = data.get('text', '')
+    # Optional latency budget for the Ollama fallback (default LLM_BUDGET_SEC)
+    budget_ms = data.get('budget_ms')
     
     if not text:
         return jsonify({'status': 'error', 'message': 'No text provided'}), 400
@@ -259,7 +748,9 @@ def parse_command():
     
     try:
         # Use hybrid spaCy + Ollama (set use_ollama=False to disable Ollama fallback)
-        intent, entities = get_intent_and_entities(text, use_ollama=True)
+        intent, entities = get_intent_and_entities(
+            text, use_ollama=True, budget_sec=float(budget_ms) / 1000 if budget_ms is not None else None
+        )
         result = route_command(intent, entities)
         
         print(f"✅ Result: {result}")
@@ -272,6 +763,63 @@ def parse_command():
         }), 500
 
 
+@app.route('/api/parse-batch', methods=['POST'])
+def parse_batch_endpoint():
+    """
+    Parse many utterances in one request (transcript replays, QA runs).
+    
+    Body: {"texts": [...], "batch_size"?: int, "n_process"?: int, "use_ollama"?: bool}
+    batch_size and n_process are capped at PARSE_BATCH_SIZE / PARSE_BATCH_N_PROCESS.
+    Ollama is off by default here: one LLM call per unmatched text would
+    dominate a batch of thousands.
+    """
+    try:
+        startup.wait_ready("nlp", timeout=NLP_READY_TIMEOUT_SEC)
+        from utils.enhanced_command_router import parse_batch, route_command
+    except ComponentNotReady as e:
+        print(f"⏳ {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(STARTUP_RETRY_AFTER_SEC)}
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'NLP failed to load: {e}',
+            'component': startup.snapshot()['components']['nlp'],
+        }), 503
+    
+    data = request.get_json(silent=True) or {}
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return jsonify({'status': 'error', 'message': 'texts must be a list of strings'}), 400
+    if len(texts) > PARSE_BATCH_MAX_ITEMS:
+        return jsonify({'status': 'error', 'message': f'Too many texts: {len(texts)} (max {PARSE_BATCH_MAX_ITEMS})'}), 413
+    options = {}
+    for name, maximum in (('batch_size', PARSE_BATCH_SIZE), ('n_process', PARSE_BATCH_N_PROCESS)):
+        value = data.get(name, maximum)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            return jsonify({'status': 'error', 'message': f'{name} must be a positive integer'}), 400
+        options[name] = min(value, maximum)
+    use_ollama = data.get('use_ollama', False)
+    if not isinstance(use_ollama, bool):
+        return jsonify({'status': 'error', 'message': 'use_ollama must be a boolean'}), 400
+    
+    started = time.perf_counter()
+    try:
+        results = parse_batch(texts, use_ollama=use_ollama, **options)
+    except Exception as e:
+        print(f"❌ Batch parse error: {e}")
+        return jsonify({'status': 'error', 'message': f'Error parsing batch: {str(e)}'}), 500
+    for item in results:
+        item['result'] = route_command(item['intent'], item['entities'])
+    total_ms = (time.perf_counter() - started) * 1000
+    return jsonify({
+        'status': 'success',
+        'count': len(results),
+        'results': results,
+        'total_ms': round(total_ms, 1),
+        'per_item_us': round(total_ms * 1000 / len(results), 1) if results else None,
+    })
+
+
 @app.route('/api/diagnose', methods=['POST'])
 def diagnose_audio():
     """Diagnostics endpoint: validates audio payload and returns metadata + quick transcript."""
@@ -297,6 +845,7 @@ def diagnose_audio():
 
     try:
         try:
+            from pydub import AudioSegment
             seg = AudioSegment.from_file(temp_input_path)
         except Exception as e:
             raise RuntimeError(
@@ -361,6 +910,7 @@ def save_debug_audio():
     
     # Convert to WAV for easy playback
     try:
+        from pydub import AudioSegment
         seg = AudioSegment.from_file(webm_path)
         seg.set_frame_rate(16000).set_channels(1).export(wav_path, format="wav")
         print(f"💾 Saved debug WAV: {wav_path}")
@@ -388,65 +938,537 @@ def save_debug_audio():
 # WEBSOCKET HANDLERS FOR REAL-TIME AUDIO
 # ============================================
 
-# Store audio buffers per session
+# Store audio buffers per session (sid -> AudioRingBuffer)
 audio_buffers = {}
-buffer_timestamps = {}  # Track buffer creation times for cleanup
+session_store = create_session_store(SESSION_STORE, BUFFER_STALE_TIMEOUT_SEC, SESSION_STORE_PATH or None)
+stream_sessions = {}  # sid -> StreamingTranscriber for sessions in streaming mode
+stream_decoders = {}  # sid -> StreamingDecoder (one ffmpeg process) for sessions sending WebM/Opus
+chunk_decoders = {}  # sid -> ChunkDecoder for sessions sending a compact codec (mu-law, IMA-ADPCM, Opus)
+dictation_sessions = {}  # sid -> DictationTranscriber over the session's on-disk PCM spool
+speculations = {}  # sid -> action sent early from interim text, awaiting the final transcript
+speculation_counts = {'emitted': 0, 'confirmed': 0, 'corrected': 0, 'retracted': 0}
+speculation_lock = threading.Lock()
+
+def _release_session(sid):
+    """Free everything this process holds for a session"""
+    audio_buffers.pop(sid, None)
+    stream_sessions.pop(sid, None)
+    session_jobs.close(sid)
+    _close_stream_decoder(sid)
+    chunk_decoders.pop(sid, None)
+    speculations.pop(sid, None)
+    dictation = dictation_sessions.pop(sid, None)
+    if dictation is not None:
+        dictation.spool.close()
 
 def cleanup_stale_buffers():
-    """Background thread to clean up stale buffers"""
+    """Background thread: sleep until the next session is due, then release the expired ones"""
     while True:
         try:
-            time.sleep(BUFFER_CLEANUP_INTERVAL_SEC)
-            current_time = datetime.now()
-            stale_sids = []
-            
-            for sid, timestamp in buffer_timestamps.items():
-                age_sec = (current_time - timestamp).total_seconds()
-                if age_sec > BUFFER_STALE_TIMEOUT_SEC:
-                    stale_sids.append(sid)
-            
-            for sid in stale_sids:
-                if sid in audio_buffers:
-                    del audio_buffers[sid]
-                if sid in buffer_timestamps:
-                    del buffer_timestamps[sid]
+            wait = session_store.next_expiry()
+            time.sleep(BUFFER_CLEANUP_INTERVAL_SEC if wait is None else min(wait + 0.05, BUFFER_CLEANUP_INTERVAL_SEC))
+            for sid in session_store.pop_expired():
+                _release_session(sid)
                 print(f"🧹 Cleaned up stale buffer for session: {sid}")
         except Exception as e:
             print(f"❌ Error in cleanup thread: {e}")
 
-# Start cleanup thread as daemon
-cleanup_thread = threading.Thread(target=cleanup_stale_buffers, daemon=True)
-cleanup_thread.start()
-print("🧹 Buffer cleanup thread started")
+def start_services():
+    """Start background model loading and the cleanup thread (idempotent)"""
+    if not startup.start():
+        return
+    print("🚀 Loading ASR and NLP components in the background...")
+    # Start cleanup thread as daemon
+    cleanup_thread = threading.Thread(target=cleanup_stale_buffers, daemon=True)
+    cleanup_thread.start()
+    print("🧹 Buffer cleanup thread started")
+
+@app.before_request
+def _ensure_services_started():
+    # Covers servers that import this module instead of running __main__
+    start_services()
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up. Reports per-component load state and timings."""
+    return jsonify(startup.snapshot())
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: 200 only once every required component is loaded and warmed up"""
+    snapshot = startup.snapshot()
+    if asr_service_client is not None:
+        # The ASR service can restart or die independently of this process
+        try:
+            snapshot['asr_service'] = asr_service_client.health(timeout=1.0)
+        except AsrServiceError as e:
+            snapshot['asr_service'] = {'status': 'unavailable', 'error': str(e)}
+        snapshot['ready'] = snapshot['ready'] and snapshot['asr_service']['status'] == 'ready'
+    return jsonify(snapshot), (200 if snapshot['ready'] else 503)
+
+@app.route('/api/session-stats', methods=['GET'])
+def session_stats():
+    """Per-session audio buffer memory and transcription job queues"""
+    sessions = {sid: ring.stats() for sid, ring in list(audio_buffers.items())}
+    for sid, queue in session_jobs.stats().items():
+        sessions.setdefault(sid, {})['queue'] = queue
+    for sid, decoder in list(stream_decoders.items()):
+        sessions.setdefault(sid, {})['decoder'] = decoder.stats()
+    for sid, decoder in list(chunk_decoders.items()):
+        sessions.setdefault(sid, {})['codec'] = decoder.stats()
+    for sid, dictation in list(dictation_sessions.items()):
+        sessions.setdefault(sid, {})['dictation'] = dictation.stats()
+    return jsonify({
+        'sessions': sessions,
+        'count': len(sessions),
+        'store': session_store.stats(),
+        'capacity_bytes': sum(s.get('capacity_bytes', 0) for s in sessions.values()),
+        'used_bytes': sum(s.get('used_bytes', 0) for s in sessions.values()),
+        'high_water_bytes': sum(s.get('high_water_bytes', 0) for s in sessions.values()),
+        'queue_policy': {'max_pending': SESSION_QUEUE_MAX_PENDING, 'overflow': SESSION_QUEUE_OVERFLOW},
+        'speculation': speculation_stats(),
+    })
+
+@app.route('/api/asr-stats', methods=['GET'])
+def asr_stats():
+    """ASR runtime counters: active profile, admission queue, batching, worker pool, ASR service, transcript cache and rejections"""
+    with rejection_counts_lock:
+        rejections = dict(rejection_counts)
+    return jsonify({
+        'profile': asr_profile_name,
+        'rejection_policy': rejection_policy.to_dict(),
+        'rejections': rejections,
+        'admission': admission.stats(),
+        'scheduler': inference_scheduler.stats() if inference_scheduler else None,
+        'workers': asr_worker_pool.stats() if asr_worker_pool else None,
+        'service': asr_service_client.stats() if asr_service_client else None,
+        'transcript_cache': transcript_cache.stats() if transcript_cache else None,
+    })
+
+@app.route('/api/nlp-stats', methods=['GET'])
+def nlp_stats():
+    """Intent rule table counters (per-rule calls, hits and time, spaCy and Ollama calls), the intent cache and the LLM fallback breaker/budget"""
+    try:
+        startup.wait_ready("nlp", timeout=NLP_READY_TIMEOUT_SEC)
+    except ComponentNotReady as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': str(STARTUP_RETRY_AFTER_SEC)}
+    except Exception as e:
+        # The NLP component failed to load (e.g. en_core_web_sm missing); report it instead of a bare 500
+        return jsonify({
+            'status': 'error',
+            'message': f'NLP failed to load: {e}',
+            'component': startup.snapshot()['components']['nlp'],
+        }), 503
+    import utils.enhanced_command_router as router
+    return jsonify(dict(
+        router.intent_rule_stats(),
+        cache=router.intent_cache.stats() if router.intent_cache else None,
+        llm_fallback=router.llm_fallback.stats(),
+    ))
 
 @socketio.on('connect')
 def handle_connect():
+    start_services()
     print(f"🔌 Client connected: {request.sid}")
-    audio_buffers[request.sid] = bytearray()
-    buffer_timestamps[request.sid] = datetime.now()
-    emit('connected', {'status': 'ready', 'sid': request.sid})
+    audio_buffers[request.sid] = AudioRingBuffer(AUDIO_RING_CAPACITY_BYTES)
+    session_store.touch(request.sid, connected_at=time.time())
+    # Codecs for audio_chunk, most compact first; 'wav' and 'webm' are always accepted
+    emit('connected', {
+        'status': 'ready',
+        'sid': request.sid,
+        'codecs': available_codecs() + ['webm', 'wav'],
+        'sample_rate': audio_io.TARGET_SAMPLE_RATE,
+    })
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f"🔌 Client disconnected: {request.sid}")
-    if request.sid in audio_buffers:
-        del audio_buffers[request.sid]
-    if request.sid in buffer_timestamps:
-        del buffer_timestamps[request.sid]
+    session_store.remove(request.sid)
+    _release_session(request.sid)
+
+def _take_session_audio(sid):
+    """
+    Detach the session's buffered WAV / bare PCM so its ring can take new
+    chunks straight away. Decoded directly from a view of the ring (one
+    vectorized pass, no subprocess).
+    """
+    ring = audio_buffers[sid]
+    with ring.lock:
+        audio = decode_audio(ring.view(), is_wav_format=True)
+        if ring.owns(audio):
+            audio = audio.copy()  # float32 WAV decodes to a view of the ring itself
+        ring.clear()
+    return audio
+
+def _close_stream_decoder(sid):
+    """
+    Tear down a session's streaming decoder (disconnect / stale timeout).
+    A decoder already handed to a final 'decoded' job is released by that job.
+    """
+    decoder = stream_decoders.pop(sid, None)
+    if decoder is not None:
+        decoder.terminate()
+        print(f"🧹 Streaming decoder for {sid} stopped")
+
+def _merge_session_jobs(pending, job):
+    """Overflow 'merge' policy: fold a new job into the newest pending one where that's meaningful"""
+    if pending['kind'] != job['kind']:
+        return False
+    if job['kind'] == 'clip':
+        pending['payloads'].extend(job['payloads'])
+        pending['final'] = pending['final'] or job['final']
+        pending['language'] = job['language']
+        return True
+    if job['kind'] == 'decoded':
+        # The pending job will take everything this decoder has produced anyway
+        if pending['decoder'] is not job['decoder']:
+            return False
+        pending['final'] = pending['final'] or job['final']
+        pending['language'] = job['language']
+        return True
+    if job['kind'] == 'dictation':
+        # Every dictation job transcribes all full windows spooled by the time it runs
+        if pending['dictation'] is not job['dictation']:
+            return False
+        pending['final'] = pending['final'] or job['final']
+        return True
+    # A pending stream step already decodes everything buffered so far
+    return job['kind'] == 'stream_step'
+
+def _session_mode(sid, mode):
+    """True if the session opted in to a mode (see configure_session)"""
+    info = session_store.get(sid)
+    return bool(info and info.get(mode))
+
+def _route_transcript(text):
+    """
+    Run the NLP router's rule tier on a final transcript.
+
+    Pushed transcripts include free-text field dictation, so the Ollama
+    fallback isn't used here: it would hold the transcript for up to the LLM
+    budget and fill the intent caches with dictated text. An 'unknown'
+    action goes back to the client, which can still ask /api/parse.
+
+    Returns:
+        (intent, entities, result, timings) with intent_ms and route_ms
+    """
+    from utils.enhanced_command_router import get_intent_and_entities, route_command
+    start = time.perf_counter()
+    intent, entities = get_intent_and_entities(text, use_ollama=False)
+    intent_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    result = route_command(intent, entities)
+    route_ms = (time.perf_counter() - start) * 1000
+    return intent, entities, result, {'intent_ms': round(intent_ms, 1), 'route_ms': round(route_ms, 1)}
+
+def _count_speculation(outcome):
+    with speculation_lock:
+        speculation_counts[outcome] += 1
+
+def speculation_stats():
+    with speculation_lock:
+        stats = dict(speculation_counts)
+    settled = stats['confirmed'] + stats['corrected'] + stats['retracted']
+    stats['pending'] = len(speculations)
+    stats['accuracy'] = round(stats['confirmed'] / settled, 3) if settled else None
+    return stats
+
+def _speculate(sid, text, job, timings):
+    """
+    'speculative' mode: act on interim text when the rule table maps it to a
+    reversible command (detect_intent_speculative), before the final
+    transcript. At most one speculation per utterance; the final transcript
+    settles it. Only streaming jobs produce interim text.
+    """
+    if sid in speculations or not text or not _session_mode(sid, 'speculative'):
+        return
+    if not startup.is_ready("nlp"):
+        return
+    from utils.enhanced_command_router import detect_intent_speculative, route_command
+    intent, entities = detect_intent_speculative(text)
+    if intent is None:
+        return
+    result = route_command(intent, entities)
+    speculation_id = job['seq']
+    speculations[sid] = {'id': speculation_id, 'text': text, 'result': result}
+    _count_speculation('emitted')
+    timings = dict(timings, total_ms=round((time.perf_counter() - job['submitted_at']) * 1000, 1))
+    print(f"🔮 Speculative action #{speculation_id}: {result['action']} from '{text}'")
+    socketio.emit('action', {
+        'transcript': text,
+        'intent': intent,
+        'entities': entities,
+        'result': result,
+        'timings': timings,
+        'speculative': True,
+        'speculation_id': speculation_id,
+        'seq': job['seq'],
+        'seqs': job['seqs'],
+    }, to=sid)
+
+def _emit_transcript(sid, text, final, job, timings=None):
+    """
+    Send a transcript event; in 'actions' mode a final transcript is routed
+    here and sent as one 'action' event instead (no /api/parse round trip).
+    
+    A final transcript also settles a pending speculation: the 'action' is
+    marked confirmed if the routed result matches what was already sent,
+    otherwise an 'action_correction' carries both results.
+    """
+    payload = {'text': text, 'final': final, 'seq': job['seq'], 'seqs': job['seqs']}
+    if not final:
+        socketio.emit('transcript', payload, to=sid)
+        return
+    has_text = bool(text and text.strip())
+    speculation = speculations.pop(sid, None)
+    if speculation is not None and not has_text:
+        # The interim words never made it into a final transcript
+        _count_speculation('retracted')
+        print(f"↩️ Speculative action #{speculation['id']} retracted (empty final)")
+        socketio.emit('action_correction', {
+            'speculation_id': speculation['id'],
+            'speculated': speculation['result'],
+            'transcript': '',
+            'result': None,
+            'seq': job['seq'],
+            'seqs': job['seqs'],
+        }, to=sid)
+    if not (has_text and (speculation is not None or _session_mode(sid, 'actions'))):
+        socketio.emit('transcript', payload, to=sid)
+        return
+    try:
+        startup.wait_ready("nlp", timeout=NLP_READY_TIMEOUT_SEC)
+    except ComponentNotReady as e:
+        print(f"⏳ {e}; sending the plain transcript")
+        socketio.emit('transcript', payload, to=sid)
+        return
+    except Exception as e:
+        print(f"⚠️ NLP failed to load ({e}); sending the plain transcript")
+        socketio.emit('transcript', payload, to=sid)
+        return
+    
+    timings = dict(timings or {})
+    try:
+        intent, entities, result, route_timings = _route_transcript(text)
+        timings.update(route_timings)
+    except Exception as e:
+        print(f"❌ Parse error: {e}")
+        intent, entities = 'unknown', {}
+        result = {'status': 'error', 'message': f'Error parsing command: {str(e)}'}
+    timings['total_ms'] = round((time.perf_counter() - job['submitted_at']) * 1000, 1)
+    event = {
+        'transcript': text,
+        'intent': intent,
+        'entities': entities,
+        'result': result,
+        'timings': timings,
+        'seq': job['seq'],
+        'seqs': job['seqs'],
+    }
+    if speculation is not None and result != speculation['result']:
+        _count_speculation('corrected')
+        print(f"↩️ Speculative action #{speculation['id']} corrected: '{speculation['text']}' -> '{text}'")
+        socketio.emit('action_correction', dict(event, speculation_id=speculation['id'], speculated=speculation['result']), to=sid)
+        return
+    if speculation is not None:
+        _count_speculation('confirmed')
+        event.update(speculation_id=speculation['id'], confirmed=True)
+    print(f"🎯 Action #{job['seq']}: {result.get('action', result.get('status'))} ({timings['total_ms']}ms)")
+    socketio.emit('action', event, to=sid)
+
+def _run_session_job(sid, job):
+    """Background task body: the only place socket audio is transcribed"""
+    started = time.perf_counter()
+    timings = {'queue_ms': round((started - job['submitted_at']) * 1000, 1)}
+    if job['kind'] in ('clip', 'decoded'):
+        if job['kind'] == 'decoded':
+            # End of utterance closes the decoder so ffmpeg flushes its tail
+            decoder = job['decoder']
+            audio_np = decoder.close() if job['final'] else decoder.take_pcm()
+        else:
+            parts = job['payloads']
+            audio_np = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        transcript = transcribe_pcm(audio_np, job['language'], client=sid)['text']
+        timings['asr_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        if transcript and transcript.strip():
+            print(f"✅ WebSocket transcript #{job['seq']}: '{transcript}'")
+        else:
+            print(f"⏭️ Empty transcript #{job['seq']} (silence/noise)")
+        _emit_transcript(sid, transcript, job['final'], job, timings)
+        return
+    
+    if job['kind'] == 'dictation':
+        dictation = job['dictation']
+        segments = dictation.process(final=job['final'])
+        timings['asr_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        stats = dictation.stats()
+        if job['final']:
+            # The spool is closed by the job's release once this returns
+            print(f"📝 Dictation finished: {stats['spooled_sec']}s in {stats['windows']} window(s), {stats['segments']} segment(s)")
+        if segments or job['final']:
+            socketio.emit('dictation_segment', {
+                'segments': segments,
+                'final': job['final'],
+                'seq': job['seq'],
+                'spooled_sec': stats['spooled_sec'],
+                'transcribed_sec': stats['transcribed_sec'],
+                'timings': timings,
+            }, to=sid)
+        return
+    
+    stream = job['stream']
+    if job['kind'] == 'stream_final':
+        delta = stream.finish()
+        timings['asr_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        _emit_transcript(sid, '' if _is_likely_noise(delta) else delta, True, job, timings)
+        return
+    
+    if not stream.ready():
+        return
+    if not vad.detect_speech_segments(stream.audio, energy_threshold=SILENCE_RMS_THRESHOLD, hangover_ms=VAD_HANGOVER_MS):
+        # Nothing but silence since the last commit; don't decode it
+        stream.discard_audio()
+        return
+    
+    update = stream.process()
+    timings['asr_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    if update['finalized'] and not _is_likely_noise(update['finalized']):
+        print(f"✅ Streaming segment finalized: '{update['finalized']}'")
+        _emit_transcript(sid, update['finalized'], True, job, timings)
+    socketio.emit('partial_transcript', {'stable': update['stable'], 'unstable': update['unstable'], 'seq': job['seq']}, to=sid)
+    _speculate(sid, f"{update['stable']} {update['unstable']}".strip(), job, timings)
+
+def _is_terminal_job(job):
+    """End-of-utterance jobs carry the final transcript; the queue never sheds them"""
+    return job['kind'] == 'stream_final' or bool(job.get('final'))
+
+def _on_session_job_dropped(sid, job, reason):
+    print(f"🚮 Session {sid}: job #{job['seq']} {reason} (queue full, policy={SESSION_QUEUE_OVERFLOW})")
+    socketio.emit('job_dropped', {'seq': job['seq'], 'seqs': job['seqs'], 'reason': reason}, to=sid)
+
+def _on_session_job_error(sid, job, e):
+    if isinstance(e, AdmissionRejected):
+        print(f"🚦 Session {sid}: job #{job['seq']} {e}")
+        socketio.emit('busy', {'seq': job['seq'], 'seqs': job['seqs'], 'reason': e.reason, 'retry_after_sec': e.retry_after_sec}, to=sid)
+        return
+    print(f"❌ Transcription error (job #{job['seq']}): {e}")
+    socketio.emit('error', {'error': str(e), 'seq': job['seq']}, to=sid)
+
+session_jobs = SessionJobs(
+    _run_session_job,
+    max_pending=SESSION_QUEUE_MAX_PENDING,
+    overflow=SESSION_QUEUE_OVERFLOW,
+    merge_fn=_merge_session_jobs,
+    on_drop=_on_session_job_dropped,
+    on_error=_on_session_job_error,
+    spawn=socketio.start_background_task,
+    is_terminal=_is_terminal_job,
+)
+
+def _decode_codec_chunk(sid, codec, data, audio_data):
+    """Decode a compact-codec chunk with the session's decoder; returns bare s16le PCM bytes"""
+    decoder = chunk_decoders.get(sid)
+    if decoder is None or decoder.codec != codec:
+        decoder = chunk_decoders[sid] = ChunkDecoder(
+            codec,
+            sample_rate=audio_io.TARGET_SAMPLE_RATE,
+            block_align=int(data.get('block_align', DEFAULT_ADPCM_BLOCK_ALIGN)),
+        )
+    return memoryview(decoder.decode(audio_data)).cast('B')
+
+def _handle_stream_chunk(sid, audio_data, is_final, language):
+    """
+    Streaming mode: ingest the chunk and queue a sliding-window decode.
+    
+    The job emits 'partial_transcript' with the stable/unstable parts of the
+    live hypothesis, and a 'transcript' event carrying only the newly
+    committed text whenever a segment is finalized. Chunks must be WAV or
+    bare 16kHz s16le PCM (compact codecs are decoded to PCM before this).
+    """
+    stream = stream_sessions.get(sid)
+    if stream is None:
+        language_short = _language_short(language)
+        stream = StreamingTranscriber(
+            lambda audio_np, prompt: _decode_stream_window(audio_np, language_short, prompt, client=sid),
+            min_step_ms=STREAM_STEP_MS,
+            window_sec=STREAM_WINDOW_SEC,
+            overlap_ms=STREAM_OVERLAP_MS,
+        )
+        stream_sessions[sid] = stream
+    
+    stream.insert_audio(audio_io.load_audio(audio_data, is_wav_format=True))
+    
+    if is_final:
+        stream_sessions.pop(sid, None)
+        return session_jobs.submit(sid, {'kind': 'stream_final', 'stream': stream})
+    return session_jobs.submit(sid, {'kind': 'stream_step', 'stream': stream})
+
+def _decode_dictation_window(audio_np, language_short, prompt, sid):
+    """Dictation decode: skip silent windows, otherwise the profile's beam at dictation priority"""
+    if not vad.detect_speech_segments(audio_np, energy_threshold=SILENCE_RMS_THRESHOLD, hangover_ms=VAD_HANGOVER_MS):
+        return []
+    return _decode_stream_window(audio_np, language_short, prompt, client=sid, beam_size=asr_profile["beam_size"])
+
+def _handle_dictation_chunk(sid, audio_data, is_final, language):
+    """
+    Dictation mode: append the chunk to the session's spool and queue a
+    window decode once a full window is waiting.
+    
+    Audio goes to a memory-mapped file rather than the ring, so a dictation
+    can run for many minutes without growing the heap; each job emits a
+    'dictation_segment' event with the segments it committed (timestamps
+    from the start of the dictation). The final chunk (or stop_recording)
+    transcribes the remainder and closes the spool. Chunks must be WAV or
+    bare 16kHz s16le PCM (compact codecs are decoded to PCM before this).
+    """
+    dictation = dictation_sessions.get(sid)
+    if dictation is None:
+        language_short = _language_short(language)
+        dictation = DictationTranscriber(
+            lambda audio_np, prompt: _decode_dictation_window(audio_np, language_short, prompt, sid),
+            PcmSpool(DICTATION_SPOOL_DIR or None),
+            sample_rate=audio_io.TARGET_SAMPLE_RATE,
+            window_sec=DICTATION_WINDOW_SEC,
+            prompt_chars=DICTATION_PROMPT_CHARS,
+        )
+        dictation_sessions[sid] = dictation
+        print(f"📝 Dictation started for {sid}")
+    
+    samples = audio_io.load_audio(audio_data, is_wav_format=True)
+    dictation.spool.append((np.clip(samples, -1.0, 32767 / 32768) * 32768).astype('<i2'))
+    if len(dictation.spool) >= DICTATION_MAX_SEC * audio_io.TARGET_SAMPLE_RATE and not is_final:
+        emit('error', {'message': f'Dictation reached the {DICTATION_MAX_SEC:.0f}s limit; finishing it'})
+        is_final = True
+    
+    if is_final:
+        dictation_sessions.pop(sid, None)
+        return session_jobs.submit(sid, {'kind': 'dictation', 'dictation': dictation, 'final': True, 'release': dictation.spool.close})
+    if dictation.ready():
+        return session_jobs.submit(sid, {'kind': 'dictation', 'dictation': dictation, 'final': False})
+    return None, 'spooled'
 
 @socketio.on('audio_chunk')
 def handle_audio_chunk(data):
-    """Receive audio chunk and buffer it"""
+    """
+    Receive audio chunk and buffer it.
+    
+    Only ingestion happens here; transcription is queued as a session job.
+    'codec' selects the payload encoding (see the 'connected' event); without
+    it, format == 'wav' means WAV / bare PCM and anything else WebM/Opus.
+    'stream' and 'dictation' select the streaming and long-form dictation
+    modes instead of buffered clips.
+    The ack (if the client asked for one) carries the job's sequence number
+    and whether it was queued, merged into a pending job or rejected.
+    """
     try:
         sid = request.sid
         if sid not in audio_buffers:
-            audio_buffers[sid] = bytearray()
-            buffer_timestamps[sid] = datetime.now()
+            audio_buffers[sid] = AudioRingBuffer(AUDIO_RING_CAPACITY_BYTES)
         
-        # Validate audio data size
-        audio_data = data.get('audio', [])
-        if not isinstance(audio_data, (list, bytes, bytearray)):
-            emit('error', {'message': 'Invalid audio data format'})
+        # Binary frames only (ArrayBuffer/Uint8Array arrive as bytes); JSON int lists are ~4x larger
+        audio_data = data.get('audio', b'')
+        if not isinstance(audio_data, (bytes, bytearray, memoryview)):
+            emit('error', {'message': 'Invalid audio data format: send audio as binary (ArrayBuffer/Uint8Array), not a list'})
             return
         
         chunk_size = len(audio_data)
@@ -455,77 +1477,154 @@ def handle_audio_chunk(data):
             return
         
         # Check if audio is already WAV format (skip conversion)
-        is_wav_format = data.get('format') == 'wav'
+        is_wav_format = data.get('format') == 'wav' or data.get('codec') == 'wav'
         
-        # Append chunk to buffer
-        audio_buffers[sid].extend(audio_data)
-        buffer_timestamps[sid] = datetime.now()  # Update timestamp on activity
-        print(f"📦 Received chunk: {chunk_size} bytes, total: {len(audio_buffers[sid])} bytes, format: {'WAV' if is_wav_format else 'WebM'}")
+        codec = data.get('codec')
+        if codec in available_codecs():
+            # Compact codec: decode to bare PCM here, then it takes the WAV path
+            audio_data = _decode_codec_chunk(sid, codec, data, audio_data)
+            is_wav_format = True
+            if len(audio_data) > AUDIO_BUFFER_MAX_SIZE:
+                emit('error', {'message': f'Decoded audio chunk too large: {len(audio_data)} bytes (max {AUDIO_BUFFER_MAX_SIZE})'})
+                return
+        elif codec not in (None, 'wav', 'webm'):
+            emit('error', {'message': f"Unsupported codec '{codec}'. Available: {', '.join(available_codecs() + ['webm', 'wav'])}"})
+            return
+        
+        if data.get('dictation'):
+            if not is_wav_format:
+                emit('error', {'message': 'Dictation mode needs WAV / PCM or a compact codec, not WebM'})
+                return
+            session_store.touch(sid)
+            seq, status = _handle_dictation_chunk(sid, audio_data, data.get('final', False), data.get('language', 'en-US'))
+            return {'seq': seq, 'status': status}
+        
+        if data.get('stream'):
+            if not is_wav_format:
+                emit('error', {'message': 'Streaming mode needs WAV / PCM or a compact codec, not WebM'})
+                return
+            session_store.touch(sid)
+            seq, status = _handle_stream_chunk(sid, audio_data, data.get('final', False), data.get('language', 'en-US'))
+            return {'seq': seq, 'status': status}
         
-        # If final chunk or buffer is large enough, process it
         is_final = data.get('final', False)
         # language optionally provided by client (e.g., 'en-US')
         language = data.get('language', 'en-US')
-        if is_final or len(audio_buffers[sid]) >= AUDIO_BUFFER_THRESHOLD_BYTES:  # ~5 seconds at 16kHz
-            print("🎤 Processing buffered audio...")
-            audio_data = bytes(audio_buffers[sid])
-            audio_buffers[sid] = bytearray()  # Clear buffer
-            
-            # Process audio
-            audio_io = io.BytesIO(audio_data)
+        session_store.touch(sid)  # Push the session's expiry out on activity
+        
+        if not is_wav_format:
+            # Compressed (WebM/Opus): feed the session's long-lived decoder, which keeps
+            # the container state across chunks; the job takes whatever PCM it has produced
+            decoder = stream_decoders.get(sid)
+            if decoder is None:
+                decoder = stream_decoders[sid] = StreamingDecoder()
+                print(f"🔁 Streaming decoder started for {sid} (pid {decoder.proc.pid})")
             try:
-                transcript = transcribe_audio(audio_io, is_wav_format=is_wav_format, language=language)
-                
-                if transcript and transcript.strip():
-                    print(f"✅ WebSocket transcript: '{transcript}'")
-                    emit('transcript', {'text': transcript, 'final': is_final})
-                else:
-                    print("⏭️ Empty transcript (silence/noise)")
-                    emit('transcript', {'text': '', 'final': is_final})
-            except Exception as e:
-                print(f"❌ Transcription error: {e}")
-                emit('error', {'error': str(e)})
+                decoder.feed(audio_data)
+            except RuntimeError:
+                stream_decoders.pop(sid, None)
+                raise
+            print(f"📦 Received chunk: {chunk_size} bytes, fed since flush: {decoder.fed_since_flush} bytes, format: WebM")
+            
+            if is_final or decoder.fed_since_flush >= AUDIO_BUFFER_THRESHOLD_BYTES:
+                if is_final:
+                    stream_decoders.pop(sid, None)  # the next utterance starts a new container
+                decoder.fed_since_flush = 0
+                print("🎤 Queueing decoded audio for transcription...")
+                job = {'kind': 'decoded', 'decoder': decoder, 'final': is_final, 'language': language}
+                if is_final:
+                    # The job now owns the decoder: ffmpeg is reaped when it runs, is dropped or is discarded
+                    job['release'] = decoder.terminate
+                seq, status = session_jobs.submit(sid, job)
+                return {'seq': seq, 'status': status}
+            return
+        
+        # Append chunk to buffer
+        ring = audio_buffers[sid]
+        with ring.lock:
+            ring.write(audio_data)
+            buffered = len(ring)
+        print(f"📦 Received chunk: {chunk_size} bytes, total: {buffered} bytes, format: {codec or 'WAV'}")
+        
+        # If final chunk or buffer is large enough, process it
+        if is_final or buffered >= AUDIO_BUFFER_THRESHOLD_BYTES:  # ~5 seconds at 16kHz
+            print("🎤 Queueing buffered audio for transcription...")
+            job = {'kind': 'clip', 'payloads': [_take_session_audio(sid)], 'final': is_final, 'language': language}
+            seq, status = session_jobs.submit(sid, job)
+            return {'seq': seq, 'status': status}
     
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
         emit('error', {'error': str(e)})
 
+@socketio.on('configure_session')
+def handle_configure_session(data):
+    """
+    Opt in to (or out of) per-session modes; the ack returns the settings in effect.
+    
+    actions: final transcripts come back as one 'action' event carrying the
+        transcript, the route_command payload and per-stage timings
+    speculative: a streaming partial hypothesis that is a short,
+        reversible command is sent early as an 'action' with
+        speculative=True; the final transcript confirms it or sends an
+        'action_correction'. Needs streaming mode ('stream' chunks): the
+        bundled client sends buffered clips, so it never receives these
+    """
+    sid = request.sid
+    data = data or {}
+    modes = {mode: bool(data[mode]) for mode in SESSION_MODES if mode in data}
+    session_store.touch(sid, **modes)
+    info = session_store.get(sid) or {}
+    settings = {mode: bool(info.get(mode)) for mode in SESSION_MODES}
+    print(f"⚙️ Session {sid} modes: {settings}")
+    return settings
+
 @socketio.on('start_recording')
 def handle_start_recording():
     """Signal that recording has started"""
     sid = request.sid
-    audio_buffers[sid] = bytearray()
+    if sid in audio_buffers:
+        audio_buffers[sid].clear()
+    else:
+        audio_buffers[sid] = AudioRingBuffer(AUDIO_RING_CAPACITY_BYTES)
     print(f"🎙️ Recording started for {sid}")
     emit('recording_started', {'status': 'recording'})
 
 @socketio.on('stop_recording')
 def handle_stop_recording():
-    """Process final buffered audio"""
+    """Queue whatever is still buffered; transcripts follow as events tagged with their seq"""
     sid = request.sid
+    stream = stream_sessions.pop(sid, None)
+    if stream is not None:
+        session_jobs.submit(sid, {'kind': 'stream_final', 'stream': stream})
+    dictation = dictation_sessions.pop(sid, None)
+    if dictation is not None:
+        session_jobs.submit(sid, {'kind': 'dictation', 'dictation': dictation, 'final': True, 'release': dictation.spool.close})
+    decoder = stream_decoders.pop(sid, None)
+    if decoder is not None:
+        session_jobs.submit(sid, {'kind': 'decoded', 'decoder': decoder, 'final': True, 'language': 'en-US',
+                                  'release': decoder.terminate})
     if sid in audio_buffers and len(audio_buffers[sid]) > 0:
-        print("🎤 Processing final audio buffer...")
-        audio_data = bytes(audio_buffers[sid])
-        audio_buffers[sid] = bytearray()
-        
-        audio_io = io.BytesIO(audio_data)
+        print("🎤 Queueing final audio buffer...")
         try:
             # Default to en-US if client didn't supply language in chunks
-            transcript = transcribe_audio(audio_io, language='en-US')
-            if transcript and transcript.strip():
-                emit('transcript', {'text': transcript, 'final': True})
-            else:
-                emit('transcript', {'text': '', 'final': True})
+            job = {'kind': 'clip', 'payloads': [_take_session_audio(sid)], 'final': True, 'language': 'en-US'}
+            session_jobs.submit(sid, job)
         except Exception as e:
             emit('error', {'error': str(e)})
     
     emit('recording_stopped', {'status': 'stopped'})
 
 if __name__ == "__main__":
+    debug = True
+    # With the debug reloader, only the child process that actually serves loads models
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true" or not debug:
+        start_services()
     enable_https = os.getenv("ENABLE_HTTPS", "false").lower() in ("1", "true", "yes")
     if enable_https:
         # Development self-signed cert; browsers may warn unless localhost
         print("🔐 Starting HTTPS server with WebSocket support (adhoc certificate)")
-        socketio.run(app, host="0.0.0.0", port=5000, debug=True, ssl_context="adhoc")
+        socketio.run(app, host="0.0.0.0", port=5000, debug=debug, ssl_context="adhoc")
     else:
         print("🚀 Starting HTTP server with WebSocket support")
-        socketio.run(app, host="0.0.0.0", port=5000, debug=True)
+        socketio.run(app, host="0.0.0.0", port=5000, debug=debug)
@@ -147,6 +147,20 @@ def main():
         
         print()
     
+    # All commands through one nlp.pipe pass (what /api/parse-batch does)
+    try:
+        from utils.enhanced_command_router import parse_batch
+        start = time.time()
+        batch = parse_batch(TEST_COMMANDS)
+        latency = (time.time() - start) * 1000
+        matched = sum(1 for item in batch if item["intent"] != "unknown")
+        print(f"spaCy batch: {len(batch)} commands in {latency:.1f}ms "
+              f"({latency / len(batch):.2f}ms each), {matched} matched")
+        print()
+    except Exception as e:
+        print(f"spaCy batch failed: {e}")
+        print()
+    
     print("=" * 80)
     print(f"RESULTS: spaCy {spacy_wins} | Ollama {ollama_wins}")
     print("=" * 80)
@@ -0,0 +1,227 @@
+"""
+Admission control for ASR inference.
+
+Caps how many inferences run at once and decides who goes next when the
+cap is reached, instead of letting every request slow down together:
+
+    priority classes  waiting command clips are always admitted before
+                      dictation; dictation may also never take the slots
+                      reserved for commands
+    fairness          within a class, waiting clients are served round-robin,
+                      so one client's burst can't starve the others
+    deadlines         a waiter gives up once its class's max wait has passed
+    fast rejection    a full queue rejects at once, with a Retry-After
+                      estimate from recent inference times
+
+Rejections raise AdmissionRejected; HTTP handlers turn it into 503 +
+Retry-After and socket jobs into a 'busy' event.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+COMMAND = "command"
+DICTATION = "dictation"
+PRIORITY_ORDER = (COMMAND, DICTATION)
+
+WAIT_SAMPLES = 512  # recent waits kept per class for the percentiles
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused (queue full) or waited past its deadline"""
+
+    def __init__(self, reason, priority, retry_after_sec):
+        super().__init__(f"ASR busy ({reason}, {priority}); retry after {retry_after_sec}s")
+        self.reason = reason
+        self.priority = priority
+        self.retry_after_sec = retry_after_sec
+
+
+class _Waiter:
+    __slots__ = ("client", "priority", "enqueued", "deadline", "event", "granted")
+
+    def __init__(self, client, priority, deadline):
+        self.client = client
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+        self.event = threading.Event()
+        self.granted = False
+
+
+class _ClassStats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = {}  # reason -> count
+        self.in_flight = 0
+        self.waits_ms = deque(maxlen=WAIT_SAMPLES)
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+class AdmissionController:
+    """
+    Args:
+        max_concurrent: inferences allowed to run at once
+        max_queue: waiters allowed across all classes before rejecting outright
+        max_wait_sec: {priority: longest a request may wait for a slot}
+        reserved_for_commands: slots dictation may never occupy
+        max_queue_per_client: waiters allowed per client (0 = no limit)
+    """
+
+    def __init__(self, max_concurrent, max_queue=32, max_wait_sec=None,
+                 reserved_for_commands=1, max_queue_per_client=4):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_wait_sec = dict({COMMAND: 2.0, DICTATION: 10.0}, **(max_wait_sec or {}))
+        self.reserved_for_commands = min(reserved_for_commands, self.max_concurrent - 1)
+        self.max_queue_per_client = max_queue_per_client
+        self._lock = threading.Lock()
+        # priority -> OrderedDict(client -> deque of waiters); the dict order is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_ORDER}
+        self._queued = 0
+        self._in_flight = 0
+        self._service_ewma_sec = None
+        self._stats = {priority: _ClassStats() for priority in PRIORITY_ORDER}
+
+    def _client_queued(self, client):
+        return sum(len(q[client]) for q in self._queues.values() if client in q)
+
+    def retry_after_sec(self):
+        """Rough time until a new request could start: queued work spread over the slots"""
+        service = self._service_ewma_sec or 1.0
+        return max(1, math.ceil(service * (self._queued / self.max_concurrent + 1)))
+
+    def _reject(self, reason, priority):
+        self._stats[priority].rejected[reason] = self._stats[priority].rejected.get(reason, 0) + 1
+        return AdmissionRejected(reason, priority, self.retry_after_sec())
+
+    def _can_start(self, priority):
+        limit = self.max_concurrent - (self.reserved_for_commands if priority == DICTATION else 0)
+        return self._in_flight < limit
+
+    def _dispatch(self):
+        """Grant free slots to waiters: highest class first, clients in rotation (caller holds the lock)"""
+        now = time.monotonic()
+        for priority in PRIORITY_ORDER:
+            clients = self._queues[priority]
+            while clients and self._can_start(priority):
+                client, waiters = next(iter(clients.items()))
+                waiter = waiters.popleft()
+                self._queued -= 1
+                if waiters:
+                    clients.move_to_end(client)  # this client's next request waits for the others
+                else:
+                    del clients[client]
+                if waiter.deadline < now:
+                    continue  # its own timeout will report it
+                waiter.granted = True
+                self._in_flight += 1
+                self._stats[priority].in_flight += 1
+                waiter.event.set()
+
+    def acquire(self, client, priority):
+        """
+        Wait for an inference slot.
+
+        Returns:
+            seconds spent waiting
+        Raises:
+            AdmissionRejected: queue full, or the class's max wait passed
+        """
+        stats = self._stats[priority]
+        with self._lock:
+            if self._queued == 0 and self._can_start(priority):
+                self._in_flight += 1
+                stats.in_flight += 1
+                stats.admitted += 1
+                stats.waits_ms.append(0.0)
+                return 0.0
+            if self._queued >= self.max_queue:
+                raise self._reject("queue_full", priority)
+            if self.max_queue_per_client and self._client_queued(client) >= self.max_queue_per_client:
+                raise self._reject("client_queue_full", priority)
+            waiter = _Waiter(client, priority, time.monotonic() + self.max_wait_sec[priority])
+            self._queues[priority].setdefault(client, deque()).append(waiter)
+            self._queued += 1
+            self._dispatch()
+
+        waiter.event.wait(max(0.0, waiter.deadline - time.monotonic()))
+        with self._lock:
+            waited = time.monotonic() - waiter.enqueued
+            if not waiter.granted:
+                waiters = self._queues[priority].get(client)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    self._queued -= 1
+                    if not waiters:
+                        del self._queues[priority][client]
+                raise self._reject("deadline", priority)
+            stats.admitted += 1
+            stats.waits_ms.append(waited * 1000)
+        return waited
+
+    def release(self, priority, service_sec=None):
+        """Free a slot; service_sec feeds the Retry-After estimate"""
+        with self._lock:
+            self._in_flight -= 1
+            self._stats[priority].in_flight -= 1
+            if service_sec is not None:
+                self._service_ewma_sec = service_sec if self._service_ewma_sec is None \
+                    else 0.8 * self._service_ewma_sec + 0.2 * service_sec
+            self._dispatch()
+
+    def slot(self, client, priority):
+        """Context manager: acquire() on enter, release() (with the measured time) on exit"""
+        return _Slot(self, client, priority)
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            for priority, stats in self._stats.items():
+                waits = list(stats.waits_ms)
+                classes[priority] = {
+                    "queued": sum(len(w) for w in self._queues[priority].values()),
+                    "waiting_clients": len(self._queues[priority]),
+                    "in_flight": stats.in_flight,
+                    "admitted": stats.admitted,
+                    "rejected": dict(stats.rejected),
+                    "max_wait_sec": self.max_wait_sec[priority],
+                    "wait_p50_ms": _percentile(waits, 0.50),
+                    "wait_p95_ms": _percentile(waits, 0.95),
+                    "wait_max_ms": round(max(waits), 1) if waits else None,
+                }
+            return {
+                "max_concurrent": self.max_concurrent,
+                "reserved_for_commands": self.reserved_for_commands,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "service_ewma_ms": round(self._service_ewma_sec * 1000, 1) if self._service_ewma_sec else None,
+                "retry_after_sec": self.retry_after_sec(),
+                "classes": classes,
+            }
+
+
+class _Slot:
+    def __init__(self, controller, client, priority):
+        self.controller = controller
+        self.client = client
+        self.priority = priority
+        self.waited_sec = None
+        self._started = None
+
+    def __enter__(self):
+        self.waited_sec = self.controller.acquire(self.client, self.priority)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.release(self.priority, time.perf_counter() - self._started)
+        return False
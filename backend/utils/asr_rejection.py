@@ -0,0 +1,95 @@
+"""
+Confidence-driven rejection of ASR output.
+
+Whisper reports, per segment, the probability that the window contains no
+speech (no_speech_prob), the mean token log-probability (avg_logprob) and the
+gzip compression ratio of the text (high = repetitive hallucination loop).
+These checks run while segments are being consumed, so a clip whose first
+segment is conclusively silent stops decoding right there instead of being
+fully decoded and thrown away by the noise-phrase filter afterwards.
+"""
+
+
+class RejectionPolicy:
+    """
+    Thresholds for rejecting decoded output.
+
+    Args:
+        no_speech_prob: a segment is silence if no_speech_prob is at or above this
+            and its avg_logprob is at or below logprob (same rule as Whisper)
+        logprob: see above
+        compression_ratio: segments at or above this ratio are repetition loops
+        min_avg_logprob: segments below this are too uncertain to keep
+        probe_no_speech_prob: reject from the one-token probe alone (no logprob yet)
+        max_silent_segments: stop consuming after this many silent segments in a row
+    """
+
+    def __init__(self, no_speech_prob=0.6, logprob=-1.0, compression_ratio=2.4,
+                 min_avg_logprob=-2.0, probe_no_speech_prob=0.8, max_silent_segments=2):
+        self.no_speech_prob = no_speech_prob
+        self.logprob = logprob
+        self.compression_ratio = compression_ratio
+        self.min_avg_logprob = min_avg_logprob
+        self.probe_no_speech_prob = probe_no_speech_prob
+        self.max_silent_segments = max_silent_segments
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def check(self, no_speech_prob, avg_logprob, compression_ratio):
+        """Return the rejection reason for one decoded segment, or None to keep it"""
+        if no_speech_prob >= self.no_speech_prob and avg_logprob <= self.logprob:
+            return "no_speech"
+        if compression_ratio >= self.compression_ratio:
+            return "repetitive"
+        if avg_logprob < self.min_avg_logprob:
+            return "low_confidence"
+        return None
+
+    def check_probe(self, no_speech_prob):
+        """Decision from the first decoder step only"""
+        if no_speech_prob >= self.probe_no_speech_prob:
+            return "no_speech_probe"
+        return None
+
+
+def consume_segments(segments, policy):
+    """
+    Pull segments from a (lazy) faster-whisper generator, dropping rejected
+    ones and stopping early once silence is conclusive.
+
+    The transcribe() calls should get the same thresholds, so windows the
+    model itself skips as silent are never decoded past the fallback check;
+    a generator that yields nothing at all counts as no speech.
+
+    Returns:
+        (kept, rejected) where kept is a list of (start, end, text) and
+        rejected is the reason the whole clip was rejected (None if any
+        segment was kept)
+    """
+    kept = []
+    first_reason = None
+    silent_run = 0
+    seen = 0
+    for seg in segments:
+        seen += 1
+        reason = policy.check(seg.no_speech_prob, seg.avg_logprob, seg.compression_ratio)
+        if reason is None:
+            kept.append((seg.start, seg.end, seg.text))
+            silent_run = 0
+            continue
+
+        first_reason = first_reason or reason
+        if reason == "no_speech":
+            silent_run += 1
+            # Silent from the very start, or several silent windows in a row: stop decoding
+            if seen == 1 or silent_run >= policy.max_silent_segments:
+                break
+
+    # Stop the generator so faster-whisper doesn't decode the remaining windows
+    close = getattr(segments, "close", None)
+    if close is not None:
+        close()
+    if kept:
+        return kept, None
+    return kept, first_reason or ("no_speech" if not seen else None)
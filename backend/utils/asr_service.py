@@ -0,0 +1,527 @@
+"""
+Standalone ASR service, reachable over a Unix socket.
+
+The service process owns the model (or an AsrWorkerPool of model
+processes); the web tier only holds an AsrServiceClient, so Flask /
+Socket.IO never share a GIL with inference and ASR capacity scales on its
+own. Start it with:
+
+    python -m utils.asr_service --socket /tmp/demo-asr.sock [--profile small-int8] [--workers 2]
+    python -m utils.asr_service --socket /tmp/demo-asr.sock --engine stub   # no model, for local testing
+
+Wire format (both directions): struct "!II" (header length, payload
+length), a JSON header, then a raw payload. Requests:
+
+    {"op": "health", "id": n}
+    {"op": "transcribe", "id": n, "language": "en", "initial_prompt": null,
+     "beam_size": null, "deadline": <epoch seconds or null>}  + float32 PCM payload
+
+Responses echo the id: {"id": n, "ok": true, ...} or
+{"id": n, "ok": false, "code": "deadline_exceeded" | "not_ready" | "failed", "error": "..."}.
+Requests are multiplexed: a connection may have many in flight.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+
+FRAME_HEADER = struct.Struct("!II")
+DEADLINE_GRACE_SEC = 0.5  # client waits this much past the deadline for the service's own answer
+
+
+class AsrServiceError(Exception):
+    """Error reported by (or about) the ASR service; code is machine-readable"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        count = sock.recv_into(view[got:], n - got)
+        if count == 0:
+            raise ConnectionError("ASR service connection closed")
+        got += count
+    return buf
+
+
+def read_frame(sock):
+    """Returns (header dict, payload bytearray)"""
+    header_len, payload_len = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    header = json.loads(_recv_exact(sock, header_len).decode())
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+def write_frame(sock, header, payload=b""):
+    data = json.dumps(header).encode()
+    sock.sendall(FRAME_HEADER.pack(len(data), len(payload)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+# ============================================
+# CLIENT (web tier)
+# ============================================
+
+class AsrServiceClient:
+    """
+    Multiplexed client for one ASR service socket. Reconnects lazily after
+    the service restarts; requests in flight on a dropped connection fail
+    with AsrServiceError("unavailable").
+
+    Args:
+        path: Unix socket path
+        default_timeout: request deadline when the caller gives none
+    """
+
+    def __init__(self, path, default_timeout=30.0):
+        self.path = path
+        self.default_timeout = default_timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = {}  # id -> Future
+        self._next_id = 0
+        self.sent = 0
+        self.completed = 0
+        self.errors = {}  # code -> count
+        self.last_health = None
+
+    def _connect(self):
+        """Return a connected socket (caller holds self._lock)"""
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise AsrServiceError("unavailable", f"cannot connect to {self.path}: {e}")
+            self._sock = sock
+            threading.Thread(target=self._read_responses, args=(sock,),
+                             name="asr-service-client", daemon=True).start()
+        return self._sock
+
+    def _read_responses(self, sock):
+        while True:
+            try:
+                header, _ = read_frame(sock)
+            except (ConnectionError, OSError, ValueError):
+                break
+            with self._lock:
+                future = self._pending.pop(header.get("id"), None)
+            if future is None or future.done():
+                continue
+            if header.get("ok"):
+                if "segments" in header:
+                    with self._lock:
+                        self.completed += 1
+                future.set_result(header)
+            else:
+                self._count_error(header.get("code", "failed"))
+                future.set_exception(AsrServiceError(header.get("code", "failed"), header.get("error", "")))
+
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            orphans = list(self._pending.values())
+            self._pending.clear()
+        sock.close()
+        for future in orphans:
+            if not future.done():
+                self._count_error("unavailable")
+                future.set_exception(AsrServiceError("unavailable", "connection to the ASR service was lost"))
+
+    def _count_error(self, code):
+        with self._lock:
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def _request(self, header, payload=b""):
+        future = Future()
+        with self._lock:
+            sock = self._connect()
+            header["id"] = self._next_id
+            self._next_id += 1
+            self._pending[header["id"]] = future
+            self.sent += 1
+        try:
+            with self._write_lock:
+                write_frame(sock, header, payload)
+        except OSError as e:
+            with self._lock:
+                self._pending.pop(header["id"], None)
+                if self._sock is sock:
+                    self._sock = None
+            raise AsrServiceError("unavailable", f"send failed: {e}")
+        return future
+
+    def submit(self, audio, language="en", initial_prompt=None, beam_size=None, timeout=None):
+        """Queue a clip; the Future resolves to the response header (segments, rejected, timings)"""
+        audio = np.ascontiguousarray(audio, dtype="<f4")
+        deadline = time.time() + (timeout or self.default_timeout)
+        return self._request({
+            "op": "transcribe",
+            "language": language,
+            "initial_prompt": initial_prompt,
+            "beam_size": beam_size,
+            "deadline": deadline,
+        }, memoryview(audio).cast("B"))
+
+    def _result(self, future, timeout):
+        try:
+            result = future.result(timeout=(timeout or self.default_timeout) + DEADLINE_GRACE_SEC)
+        except FutureTimeoutError:
+            self._count_error("deadline_exceeded")
+            raise AsrServiceError("deadline_exceeded", "no answer from the ASR service before the deadline")
+        return result
+
+    def transcribe_segments(self, audio, language="en", initial_prompt=None, beam_size=None, timeout=None):
+        future = self.submit(audio, language, initial_prompt, beam_size, timeout)
+        return [tuple(seg) for seg in self._result(future, timeout)["segments"]]
+
+    def transcribe(self, audio, language="en", timeout=None):
+        """Returns a dict with text and rejected (reason, or None if kept)"""
+        result = self._result(self.submit(audio, language, timeout=timeout), timeout)
+        return {
+            "text": "".join(text for _, _, text in result["segments"]).strip(),
+            "rejected": result["rejected"],
+        }
+
+    def health(self, timeout=2.0):
+        try:
+            self.last_health = self._request({"op": "health"}).result(timeout=timeout)
+        except FutureTimeoutError:
+            raise AsrServiceError("unavailable", "health check timed out")
+        return self.last_health
+
+    def wait_ready(self, timeout=None, poll_sec=0.5):
+        """Poll health until the service reports ready; raises AsrServiceError on timeout"""
+        give_up = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                health = self.health()
+                if health["status"] == "ready":
+                    return health
+                if health["status"] == "failed":
+                    raise AsrServiceError("failed", health.get("error") or "ASR service failed to load")
+            except AsrServiceError as e:
+                if e.code == "failed":
+                    raise
+            if give_up is not None and time.monotonic() > give_up:
+                raise AsrServiceError("not_ready", f"ASR service at {self.path} not ready after {timeout}s")
+            time.sleep(poll_sec)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "socket": self.path,
+                "connected": self._sock is not None,
+                "inflight": len(self._pending),
+                "sent": self.sent,
+                "completed": self.completed,
+                "errors": dict(self.errors),
+                "service": self.last_health,
+            }
+
+    def close(self):
+        with self._lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+
+# ============================================
+# SERVICE PROCESS
+# ============================================
+
+class _PoolEngine:
+    """Model processes from AsrWorkerPool (one model per worker)"""
+
+    def __init__(self, profile, workers, cpu_threads, pin_cores, rejection):
+        from utils.asr_worker_pool import AsrWorkerPool
+        self.pool = AsrWorkerPool(
+            workers,
+            model_size=profile["model"],
+            compute_type=profile["compute_type"],
+            cpu_threads=cpu_threads or profile["cpu_threads"],
+            beam_size=profile["beam_size"],
+            pin_cores=pin_cores,
+            rejection=rejection,
+        )
+
+    def load(self):
+        # Workers load in their own processes; ready once any of them has
+        while not any(w.ready for w in self.pool.workers):
+            failed = [w.failed for w in self.pool.workers if w.failed is not None]
+            if len(failed) == len(self.pool.workers):
+                raise RuntimeError(f"every ASR worker failed ({'; '.join(sorted(set(failed)))})")
+            time.sleep(0.1)
+
+    def submit(self, audio, language, initial_prompt, beam_size, deadline):
+        return self.pool.submit(audio, language, initial_prompt, beam_size, deadline=deadline)
+
+    def stats(self):
+        return {"workers": self.pool.stats()}
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+class _LocalEngine:
+    """One model in the service process, one clip at a time"""
+
+    def __init__(self, profile, cpu_threads, rejection):
+        self.profile = profile
+        self.cpu_threads = cpu_threads or profile["cpu_threads"]
+        self.policy = None
+        if rejection:
+            from utils.asr_rejection import RejectionPolicy
+            self.policy = RejectionPolicy(**rejection)
+        self.transcribe = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def load(self):
+        from utils.asr_worker_pool import _load_engine
+        self.transcribe = _load_engine(self.profile["model"], self.profile["compute_type"], self.cpu_threads)
+
+    def _run(self, audio, language, initial_prompt, beam_size, deadline):
+        if deadline and time.time() > deadline:
+            raise AsrServiceError("deadline_exceeded", "job expired before it started")
+        return self.transcribe(audio, language, initial_prompt, beam_size or self.profile["beam_size"], self.policy)
+
+    def submit(self, audio, language, initial_prompt, beam_size, deadline):
+        return self.executor.submit(self._run, audio, language, initial_prompt, beam_size, deadline)
+
+    def stats(self):
+        return {"workers": None}
+
+
+class _StubEngine:
+    """Model-free stand-in: answers after a fixed delay with a transcript describing the clip"""
+
+    def __init__(self, delay_ms):
+        self.delay_sec = delay_ms / 1000.0
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def load(self):
+        pass
+
+    def _run(self, audio, language, initial_prompt, beam_size, deadline):
+        if deadline and time.time() > deadline:
+            raise AsrServiceError("deadline_exceeded", "job expired before it started")
+        time.sleep(self.delay_sec)
+        duration = len(audio) / 16000
+        if not len(audio) or float(np.sqrt(np.mean(np.square(audio)))) < 1e-3:
+            return {"segments": [], "rejected": "no_speech"}
+        return {"segments": [(0.0, duration, f" stub transcript of {duration:.1f} seconds")], "rejected": None}
+
+    def submit(self, audio, language, initial_prompt, beam_size, deadline):
+        return self.executor.submit(self._run, audio, language, initial_prompt, beam_size, deadline)
+
+    def stats(self):
+        return {"workers": None}
+
+
+class AsrService:
+    """Owns the engine, its load state and request counters"""
+
+    def __init__(self, engine, engine_name, profile_name):
+        self.engine = engine
+        self.engine_name = engine_name
+        self.profile_name = profile_name
+        self.status = "loading"
+        self.error = None
+        self.started_at = time.time()
+        self.inflight = 0
+        self.completed = 0
+        self.expired = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            start = time.perf_counter()
+            self.engine.load()
+            self.status = "ready"
+            print(f"✅ ASR service ready ({self.engine_name}, profile {self.profile_name}, {time.perf_counter() - start:.1f}s)")
+        except Exception as e:
+            self.status = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"❌ ASR service failed to load: {self.error}")
+
+    def health(self):
+        with self._lock:
+            health = {
+                "ok": True,
+                "status": self.status,
+                "error": self.error,
+                "engine": self.engine_name,
+                "profile": self.profile_name,
+                "pid": os.getpid(),
+                "uptime_sec": round(time.time() - self.started_at, 1),
+                "inflight": self.inflight,
+                "completed": self.completed,
+                "expired": self.expired,
+                "failed": self.failed,
+            }
+        health.update(self.engine.stats())
+        return health
+
+    def handle_transcribe(self, header, payload, reply):
+        if self.status != "ready":
+            reply({"ok": False, "code": "not_ready", "error": f"ASR service is {self.status}"})
+            return
+        deadline = header.get("deadline")
+        if deadline and time.time() > deadline:
+            with self._lock:
+                self.expired += 1
+            reply({"ok": False, "code": "deadline_exceeded", "error": "deadline passed before the request arrived"})
+            return
+
+        audio = np.frombuffer(payload, dtype="<f4")
+        received = time.perf_counter()
+        with self._lock:
+            self.inflight += 1
+        future = self.engine.submit(audio, header.get("language") or "en", header.get("initial_prompt"),
+                                    header.get("beam_size"), deadline)
+
+        def done(f):
+            with self._lock:
+                self.inflight -= 1
+            try:
+                result = f.result()
+            except Exception as e:
+                expired = getattr(e, "code", None) == "deadline_exceeded" or str(e).startswith("deadline_exceeded")
+                with self._lock:
+                    if expired:
+                        self.expired += 1
+                    else:
+                        self.failed += 1
+                reply({"ok": False, "code": "deadline_exceeded" if expired else "failed", "error": str(e)})
+                return
+            with self._lock:
+                self.completed += 1
+            reply({
+                "ok": True,
+                "segments": [list(seg) for seg in result["segments"]],
+                "rejected": result["rejected"],
+                "elapsed_ms": round((time.perf_counter() - received) * 1000, 1),
+            })
+        future.add_done_callback(done)
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        write_lock = threading.Lock()
+
+        def reply_to(request_id):
+            def reply(header):
+                header["id"] = request_id
+                try:
+                    with write_lock:
+                        write_frame(self.request, header)
+                except OSError:
+                    pass  # client went away; nothing to tell it
+            return reply
+
+        while True:
+            try:
+                header, payload = read_frame(self.request)
+            except (ConnectionError, OSError, ValueError):
+                return
+            reply = reply_to(header.get("id"))
+            op = header.get("op")
+            if op == "health":
+                reply(service.health())
+            elif op == "transcribe":
+                service.handle_transcribe(header, payload, reply)
+            else:
+                reply({"ok": False, "code": "failed", "error": f"unknown op '{op}'"})
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(args):
+    from config.asr_profiles import asrProfiles, DEFAULT_ASR_PROFILE
+
+    profile_name = args.profile or os.getenv("ASR_PROFILE", DEFAULT_ASR_PROFILE)
+    profile = asrProfiles[profile_name]
+    rejection = json.loads(args.rejection) if args.rejection else None
+    if args.engine == "stub":
+        engine = _StubEngine(args.stub_delay_ms)
+    elif args.workers > 0:
+        engine = _PoolEngine(profile, args.workers, args.cpu_threads, args.pin_cores, rejection)
+    else:
+        engine = _LocalEngine(profile, args.cpu_threads, rejection)
+    engine_name = "stub" if args.engine == "stub" else (f"pool x{args.workers}" if args.workers > 0 else "local")
+    service = AsrService(engine, engine_name, profile_name)
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    server = _Server(args.socket, _ConnectionHandler)
+    server.service = service
+    os.chmod(args.socket, 0o600)  # same-user IPC only
+    print(f"🎧 ASR service listening on {args.socket} (pid {os.getpid()}, engine {engine_name})")
+
+    # Answer health checks (status "loading") while the model loads
+    threading.Thread(target=service.load, name="asr-service-load", daemon=True).start()
+    # serve_forever() returns once shutdown() runs; it has to be called off the serving thread
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if hasattr(engine, "shutdown"):
+            engine.shutdown()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+def spawn_local_service(socket_path, profile_name, workers=0, cpu_threads=0, rejection=None, engine="model",
+                        pin_cores=False):
+    """Start the service as a child process (the single-machine stand-in); returns the Popen"""
+    import subprocess
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cmd = [sys.executable, "-m", "utils.asr_service", "--socket", socket_path,
+           "--profile", profile_name, "--workers", str(workers), "--cpu-threads", str(cpu_threads),
+           "--engine", engine]
+    if rejection:
+        cmd += ["--rejection", json.dumps(rejection)]
+    if pin_cores:
+        cmd.append("--pin-cores")
+    return subprocess.Popen(cmd, cwd=backend_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Standalone ASR service on a Unix socket")
+    parser.add_argument("--socket", default="/tmp/demo-asr.sock")
+    parser.add_argument("--profile", help="ASR profile name (default: ASR_PROFILE or the repo default)")
+    parser.add_argument("--workers", type=int, default=0, help="model processes (0 = one model in this process)")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="threads per model (0 = profile default)")
+    parser.add_argument("--pin-cores", action="store_true", help="pin each worker process to its own cores")
+    parser.add_argument("--rejection", help="RejectionPolicy thresholds as JSON")
+    parser.add_argument("--engine", choices=["model", "stub"], default="model",
+                        help="'stub' answers without a model, for testing the stack on one machine")
+    parser.add_argument("--stub-delay-ms", type=int, default=50)
+    serve(parser.parse_args())
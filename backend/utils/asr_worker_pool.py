@@ -0,0 +1,361 @@
+"""
+Multi-process ASR worker pool.
+
+Each worker is a separate Python process that owns its own model instance
+with its own cpu_threads, pinned to a disjoint set of CPU cores. The web
+process dispatches each job to the least-loaded live worker and restarts
+workers that crash (their in-flight jobs are retried once on another worker).
+A worker whose model fails to load, or that keeps dying before it is ready,
+is not restarted: its jobs fail with the load error, which stats() reports.
+
+Workers are started as `python -m utils.asr_worker_pool --worker ...` and talk
+to the pool over their stdin/stdout pipes with pickled messages, so the child
+never re-imports demo.py.
+"""
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from utils.asr_rejection import RejectionPolicy, consume_segments
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEADLINE_EXCEEDED = "deadline_exceeded"  # error prefix for jobs that expired in the queue
+RESTART_BACKOFF_SEC = 1.0  # minimum delay between restarts of the same worker
+MAX_START_FAILURES = 3  # exits before ever becoming ready, after which a worker is given up on
+LOAD_FAILED_EXIT_CODE = 3
+
+
+def plan_core_sets(num_workers, cores=None):
+    """Split the available cores into num_workers contiguous, disjoint sets"""
+    if cores is None:
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cores) // num_workers)
+    sets = []
+    for i in range(num_workers):
+        chunk = cores[i * per_worker:(i + 1) * per_worker]
+        # More workers than cores: wrap around and share
+        sets.append(chunk or [cores[i % len(cores)]])
+    return sets
+
+
+class _Worker:
+    """Parent-side handle for one worker process"""
+
+    def __init__(self, index, cores):
+        self.index = index
+        self.cores = cores
+        self.proc = None
+        self.inflight = {}  # job_id -> (future, payload, attempts)
+        self.ready = False
+        self.completed = 0
+        self.restarts = 0
+        self.started_at = 0.0
+        self.start_failures = 0  # consecutive exits before 'ready'
+        self.failed = None  # why the worker was given up on
+        self.write_lock = threading.Lock()
+
+
+class AsrWorkerPool:
+    """
+    Pool of model-owning worker processes.
+
+    Args:
+        num_workers: number of worker processes
+        model_size / compute_type / beam_size: passed to each worker's model
+        cpu_threads: threads per worker (0 = one per pinned core)
+        pin_cores: pin each worker to its own core set with sched_setaffinity
+        rejection: RejectionPolicy thresholds (dict) applied inside the workers
+    """
+
+    def __init__(self, num_workers, model_size="small.en", compute_type="float32",
+                 cpu_threads=0, beam_size=5, pin_cores=True, rejection=None):
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self.rejection = rejection
+        self.pin_cores = pin_cores and hasattr(os, "sched_setaffinity")
+        self._lock = threading.Lock()
+        self._next_job_id = 0
+        self._closed = False
+        self.workers = [_Worker(i, cores) for i, cores in enumerate(plan_core_sets(num_workers))]
+        for worker in self.workers:
+            self._start(worker)
+
+    # ---------- process management ----------
+
+    def _start(self, worker):
+        threads = self.cpu_threads or len(worker.cores)
+        cmd = [
+            sys.executable, "-m", "utils.asr_worker_pool", "--worker",
+            "--index", str(worker.index),
+            "--model", self.model_size,
+            "--compute-type", self.compute_type,
+            "--cpu-threads", str(threads),
+            "--beam-size", str(self.beam_size),
+        ]
+        if self.pin_cores:
+            # The child pins itself before it loads anything, so no thread starts unpinned
+            cmd += ["--cores", ",".join(str(core) for core in worker.cores)]
+        env = dict(os.environ, OMP_NUM_THREADS=str(threads))
+        worker.proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        worker.ready = False
+        worker.started_at = time.monotonic()
+        print(f"🧵 ASR worker {worker.index} started (pid {worker.proc.pid}, cores {worker.cores}, {threads} threads)")
+        threading.Thread(target=self._read_results, args=(worker, worker.proc),
+                         name=f"asr-worker-{worker.index}-reader", daemon=True).start()
+
+    def _read_results(self, worker, proc):
+        """Resolve futures from one worker's stdout; on EOF treat the worker as crashed"""
+        while True:
+            try:
+                msg = pickle.load(proc.stdout)
+            except (EOFError, OSError, pickle.UnpicklingError):
+                break
+
+            if msg[0] == "ready":
+                worker.ready = True
+                worker.start_failures = 0
+                print(f"✅ ASR worker {worker.index} ready (model loaded in {msg[1]:.1f}s)")
+                continue
+            if msg[0] == "load_failed":
+                worker.failed = f"model failed to load: {msg[1]}"
+                continue
+
+            _, job_id, result, error = msg
+            with self._lock:
+                entry = worker.inflight.pop(job_id, None)
+                worker.completed += 1
+            if entry is None:
+                continue
+            future = entry[0]
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+        proc.wait()
+        self._on_worker_exit(worker, proc)
+
+    def _on_worker_exit(self, worker, proc):
+        with self._lock:
+            if self._closed or worker.proc is not proc:
+                return
+            orphans = list(worker.inflight.items())
+            worker.inflight.clear()
+            if not worker.ready:
+                worker.start_failures += 1
+            worker.ready = False
+            if worker.failed is None and worker.start_failures >= MAX_START_FAILURES:
+                worker.failed = f"exited {worker.start_failures} times before becoming ready (code {proc.returncode})"
+        if worker.failed is not None:
+            print(f"❌ ASR worker {worker.index} (pid {proc.pid}) {worker.failed}; not restarting")
+            for job_id, (future, payload, attempts) in orphans:
+                self._redispatch(future, payload, attempts, f"ASR worker {worker.index} {worker.failed}")
+            return
+        print(f"💥 ASR worker {worker.index} (pid {proc.pid}) exited with code {proc.returncode}, restarting")
+
+        # Don't spin if the worker dies right after starting (e.g. model failed to load)
+        delay = RESTART_BACKOFF_SEC - (time.monotonic() - worker.started_at)
+        if delay > 0:
+            time.sleep(delay)
+        with self._lock:
+            if self._closed:
+                return
+            worker.restarts += 1
+            self._start(worker)
+
+        for job_id, (future, payload, attempts) in orphans:
+            self._redispatch(future, payload, attempts, f"ASR worker {worker.index} crashed while processing the job")
+
+    def _redispatch(self, future, payload, attempts, error):
+        """Retry an orphaned job once on another worker, else fail it"""
+        if attempts < 2:
+            try:
+                self._dispatch(future, payload, attempts + 1)
+                return
+            except RuntimeError as e:
+                error = str(e)
+        future.set_exception(RuntimeError(error))
+
+    # ---------- job dispatch ----------
+
+    def _pick_worker(self):
+        """Least-loaded live worker; ready workers win ties over ones still loading"""
+        live = [w for w in self.workers if w.proc is not None and w.proc.poll() is None and w.failed is None]
+        if not live:
+            reasons = sorted({w.failed for w in self.workers if w.failed})
+            raise RuntimeError(f"No live ASR workers ({'; '.join(reasons)})" if reasons else "No live ASR workers")
+        return min(live, key=lambda w: (len(w.inflight), not w.ready))
+
+    def _dispatch(self, future, payload, attempts=1):
+        with self._lock:
+            worker = self._pick_worker()
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            worker.inflight[job_id] = (future, payload, attempts)
+        try:
+            with worker.write_lock:
+                pickle.dump(("job", job_id, payload), worker.proc.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                worker.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            # The reader thread notices the exit and re-dispatches in-flight jobs
+            pass
+
+    def submit(self, audio, language="en", initial_prompt=None, beam_size=None, deadline=None):
+        """
+        Queue a clip; the Future resolves to a dict with segments (list of
+        (start_sec, end_sec, text)) and rejected (reason, or None if kept).
+        A job still queued at its deadline (epoch seconds) fails with
+        DEADLINE_EXCEEDED instead of running.
+        """
+        future = Future()
+        payload = {
+            "audio": audio,
+            "language": language,
+            "initial_prompt": initial_prompt,
+            "beam_size": beam_size or self.beam_size,
+            "rejection": self.rejection,
+            "deadline": deadline,
+        }
+        self._dispatch(future, payload)
+        return future
+
+    def transcribe_segments(self, audio, language="en", initial_prompt=None, beam_size=None, timeout=None):
+        return self.submit(audio, language, initial_prompt, beam_size).result(timeout=timeout)["segments"]
+
+    def transcribe(self, audio, language="en", timeout=None):
+        """Returns a dict with text and rejected (reason, or None if kept)"""
+        result = self.submit(audio, language).result(timeout=timeout)
+        return {
+            "text": "".join(text for _, _, text in result["segments"]).strip(),
+            "rejected": result["rejected"],
+        }
+
+    def stats(self):
+        with self._lock:
+            return [{
+                "index": w.index,
+                "pid": w.proc.pid if w.proc else None,
+                "cores": w.cores,
+                "ready": w.ready,
+                "inflight": len(w.inflight),
+                "completed": w.completed,
+                "restarts": w.restarts,
+                "failed": w.failed,
+            } for w in self.workers]
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+        for worker in self.workers:
+            if worker.proc and worker.proc.poll() is None:
+                worker.proc.terminate()
+
+
+# ============================================
+# WORKER PROCESS
+# ============================================
+
+def _load_engine(model_size, compute_type, cpu_threads):
+    """
+    Return transcribe(audio, language, initial_prompt, beam_size, policy)
+    -> {"segments": [(start, end, text)], "rejected": reason or None}
+    """
+    try:
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+
+        def transcribe(audio, language, initial_prompt, beam_size, policy):
+            thresholds = {}
+            if policy is not None:
+                thresholds = {
+                    "no_speech_threshold": policy.no_speech_prob,
+                    "log_prob_threshold": policy.logprob,
+                    "compression_ratio_threshold": policy.compression_ratio,
+                }
+            segments, _ = model.transcribe(audio, beam_size=beam_size, language=language,
+                                           initial_prompt=initial_prompt, **thresholds)
+            if policy is None:
+                return {"segments": [(seg.start, seg.end, seg.text) for seg in segments], "rejected": None}
+            kept, rejected = consume_segments(segments, policy)
+            return {"segments": kept, "rejected": rejected}
+        return transcribe
+    except ImportError:
+        import torch
+        import whisper
+        torch.set_num_threads(cpu_threads)
+        model = whisper.load_model(model_size, "cpu")
+
+        def transcribe(audio, language, initial_prompt, beam_size, policy):
+            result = model.transcribe(audio, language=language, initial_prompt=initial_prompt,
+                                      beam_size=beam_size, fp16=False)
+            segments = [SimpleNamespace(**seg) for seg in result["segments"]]
+            if policy is None:
+                return {"segments": [(seg.start, seg.end, seg.text) for seg in segments], "rejected": None}
+            kept, rejected = consume_segments(segments, policy)
+            return {"segments": kept, "rejected": rejected}
+        return transcribe
+
+
+def worker_main(args):
+    # stdout carries the protocol; send every print (ours and the libraries') to stderr
+    channel_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    channel_in = sys.stdin.buffer
+
+    if args.cores:
+        cores = [int(core) for core in args.cores.split(",")]
+        try:
+            os.sched_setaffinity(0, cores)
+        except (AttributeError, OSError) as e:
+            print(f"⚠️ Could not pin ASR worker {args.index} to cores {cores}: {e}")
+
+    start = time.perf_counter()
+    try:
+        transcribe = _load_engine(args.model, args.compute_type, args.cpu_threads)
+    except Exception as e:
+        # A missing or corrupt model won't load on a restart either; tell the pool so it stops trying
+        pickle.dump(("load_failed", f"{type(e).__name__}: {e}"), channel_out)
+        channel_out.flush()
+        sys.exit(LOAD_FAILED_EXIT_CODE)
+    pickle.dump(("ready", time.perf_counter() - start), channel_out)
+    channel_out.flush()
+
+    while True:
+        try:
+            _, job_id, payload = pickle.load(channel_in)
+        except EOFError:
+            return
+        if payload.get("deadline") and time.time() > payload["deadline"]:
+            # Nobody is waiting for this any more; don't spend model time on it
+            reply = ("result", job_id, None, f"{DEADLINE_EXCEEDED}: job expired before it started")
+        else:
+            try:
+                policy = RejectionPolicy(**payload["rejection"]) if payload.get("rejection") else None
+                result = transcribe(payload["audio"], payload["language"],
+                                    payload["initial_prompt"], payload["beam_size"], policy)
+                reply = ("result", job_id, result, None)
+            except Exception as e:
+                reply = ("result", job_id, None, f"{type(e).__name__}: {e}")
+        pickle.dump(reply, channel_out, protocol=pickle.HIGHEST_PROTOCOL)
+        channel_out.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ASR worker process (started by AsrWorkerPool)")
+    parser.add_argument("--worker", action="store_true", required=True)
+    parser.add_argument("--index", type=int, default=0)
+    parser.add_argument("--model", default="small.en")
+    parser.add_argument("--compute-type", default="float32")
+    parser.add_argument("--cpu-threads", type=int, default=1)
+    parser.add_argument("--beam-size", type=int, default=5)
+    parser.add_argument("--cores", default="", help="comma-separated CPU cores to pin this process to")
+    worker_main(parser.parse_args())
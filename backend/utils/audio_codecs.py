@@ -0,0 +1,237 @@
+"""
+Compact codecs for socket audio (16kHz mono).
+
+Uncompressed 16-bit PCM costs 32 KB per second of speech on the uplink.
+Clients can instead send one of these codecs in audio_chunk (the
+'connected' event lists what this server accepts); chunks are decoded here
+into s16le PCM, which then takes the same path as WAV chunks.
+
+    mulaw      G.711 mu-law, 8 bits/sample (16 KB/s); one table lookup per byte
+    ima_adpcm  IMA-ADPCM, 4 bits/sample in WAV-style blocks (~8 KB/s)
+    opus       raw Opus packets, each prefixed with a 2-byte big-endian length
+               (~2-3 KB/s); needs the optional opuslib package and libopus
+
+IMA-ADPCM blocks follow the WAV (format 0x11) mono layout: int16 predictor,
+uint8 step index, a reserved byte, then block_align - 4 bytes of nibbles
+(low nibble first). Every block restarts the decoder state, so all blocks
+of a chunk are decoded side by side with one vectorized step per sample
+position.
+"""
+import struct
+import time
+
+import numpy as np
+
+try:
+    import opuslib
+except ImportError:  # optional: raw Opus frames
+    opuslib = None
+
+DEFAULT_ADPCM_BLOCK_ALIGN = 256  # 505 samples per block
+OPUS_MAX_FRAME_SAMPLES = 1920  # 120 ms at 16kHz, the longest Opus frame
+
+
+def _mulaw_decode_table():
+    """All 256 mu-law codes -> int16 (G.711)"""
+    code = ~np.arange(256, dtype=np.uint8)
+    exponent = (code >> 4) & 0x07
+    mantissa = (code & 0x0F).astype(np.int32)
+    magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return np.where(code & 0x80, -magnitude, magnitude).astype(np.int16)
+
+
+MULAW_DECODE_TABLE = _mulaw_decode_table()
+MULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF], dtype=np.int32)
+
+IMA_STEP_TABLE = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487,
+    12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+], dtype=np.int32)
+IMA_INDEX_TABLE = np.array([-1, -1, -1, -1, 2, 4, 6, 8] * 2, dtype=np.int32)
+
+
+def _ima_tables():
+    """(step index, nibble) -> signed predictor delta, and -> next step index"""
+    step = IMA_STEP_TABLE[:, None]
+    nibble = np.arange(16, dtype=np.int32)[None, :]
+    delta = (step >> 3) + np.where(nibble & 4, step, 0) + np.where(nibble & 2, step >> 1, 0) \
+        + np.where(nibble & 1, step >> 2, 0)
+    delta = np.where(nibble & 8, -delta, delta).astype(np.int32)
+    next_index = np.clip(np.arange(89)[:, None] + IMA_INDEX_TABLE[None, :], 0, 88).astype(np.intp)
+    return delta, next_index
+
+
+IMA_DELTA_TABLE, IMA_NEXT_INDEX_TABLE = _ima_tables()
+
+
+def decode_mulaw(raw_bytes):
+    """mu-law bytes -> int16 samples"""
+    return MULAW_DECODE_TABLE[np.frombuffer(raw_bytes, dtype=np.uint8)]
+
+
+def encode_mulaw(samples):
+    """int16 samples -> mu-law bytes (G.711 reference encoder; for tests and benchmarks)"""
+    value = np.asarray(samples, dtype=np.int32) >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(value), 8159) + 0x21
+    segment = np.searchsorted(MULAW_SEGMENT_ENDS, value)
+    code = np.where(segment < 8, (segment << 4) | ((value >> (segment + 1)) & 0x0F), 0x7F)
+    return (code ^ mask).astype(np.uint8).tobytes()
+
+
+def _decode_adpcm_blocks(blocks):
+    """Decode an (n, block_align) uint8 array of complete blocks -> int16 (n * samples_per_block)"""
+    count, block_align = blocks.shape
+    predictor = blocks[:, 0].astype(np.int32) | (blocks[:, 1].astype(np.int32) << 8)
+    predictor = np.where(predictor >= 32768, predictor - 65536, predictor)
+    index = np.minimum(blocks[:, 2], 88).astype(np.intp)
+
+    data = blocks[:, 4:]
+    nibbles = np.empty((count, 2 * data.shape[1]), dtype=np.intp)
+    nibbles[:, 0::2] = data & 0x0F
+    nibbles[:, 1::2] = data >> 4
+
+    out = np.empty((count, nibbles.shape[1] + 1), dtype=np.int16)
+    out[:, 0] = predictor
+    # The state recurrence is sequential within a block; blocks are independent
+    for k in range(nibbles.shape[1]):
+        nibble = nibbles[:, k]
+        predictor = np.clip(predictor + IMA_DELTA_TABLE[index, nibble], -32768, 32767)
+        index = IMA_NEXT_INDEX_TABLE[index, nibble]
+        out[:, k + 1] = predictor
+    return out.reshape(-1)
+
+
+def decode_ima_adpcm(raw_bytes, block_align=DEFAULT_ADPCM_BLOCK_ALIGN):
+    """
+    IMA-ADPCM blocks -> int16 samples. A shorter final block (end of
+    utterance) is decoded as far as it goes.
+    """
+    if block_align < 5:
+        raise ValueError(f"IMA-ADPCM block_align must be at least 5 bytes, got {block_align}")
+    data = np.frombuffer(raw_bytes, dtype=np.uint8)
+    full = len(data) // block_align
+    parts = []
+    if full:
+        parts.append(_decode_adpcm_blocks(data[:full * block_align].reshape(full, block_align)))
+    tail = data[full * block_align:]
+    if len(tail) >= 4:
+        parts.append(_decode_adpcm_blocks(tail.reshape(1, -1)))
+    if not parts:
+        return np.zeros(0, dtype=np.int16)
+    return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def encode_ima_adpcm(samples, block_align=DEFAULT_ADPCM_BLOCK_ALIGN):
+    """int16 samples -> IMA-ADPCM blocks (reference encoder for tests and benchmarks)"""
+    samples = np.asarray(samples, dtype=np.int16).tolist()
+    step_table = IMA_STEP_TABLE.tolist()
+    index_table = IMA_INDEX_TABLE.tolist()
+    per_block = 1 + 2 * (block_align - 4)
+    out = bytearray()
+    index = 0
+    for start in range(0, len(samples), per_block):
+        block = samples[start:start + per_block]
+        predictor = block[0]
+        out += struct.pack("<hBB", predictor, index, 0)
+        codes = []
+        for sample in block[1:]:
+            step = step_table[index]
+            diff = sample - predictor
+            nibble = 0
+            if diff < 0:
+                nibble = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                nibble |= 4
+                diff -= step
+                delta += step
+            if diff >= step >> 1:
+                nibble |= 2
+                diff -= step >> 1
+                delta += step >> 1
+            if diff >= step >> 2:
+                nibble |= 1
+                delta += step >> 2
+            predictor = max(-32768, min(32767, predictor - delta if nibble & 8 else predictor + delta))
+            index = max(0, min(88, index + index_table[nibble]))
+            codes.append(nibble)
+        if len(codes) % 2:
+            codes.append(0)
+        out += bytes(codes[i] | (codes[i + 1] << 4) for i in range(0, len(codes), 2))
+    return bytes(out)
+
+
+def split_opus_packets(raw_bytes):
+    """Length-prefixed Opus packets -> list of memoryviews"""
+    mv = memoryview(raw_bytes)
+    packets = []
+    offset = 0
+    while offset + 2 <= len(mv):
+        (length,) = struct.unpack_from(">H", mv, offset)
+        offset += 2
+        if offset + length > len(mv):
+            raise ValueError("Truncated Opus packet")
+        packets.append(mv[offset:offset + length])
+        offset += length
+    return packets
+
+
+class ChunkDecoder:
+    """
+    Per-session decoder for one codec; keeps byte and timing counters.
+
+    Args:
+        codec: one of available_codecs()
+        sample_rate: sample rate the client encoded at (must match the ASR rate)
+        block_align: IMA-ADPCM block size in bytes
+    """
+
+    def __init__(self, codec, sample_rate=16000, block_align=DEFAULT_ADPCM_BLOCK_ALIGN):
+        if codec not in available_codecs():
+            raise ValueError(f"Unsupported codec '{codec}'. Available: {', '.join(available_codecs())}")
+        self.codec = codec
+        self.block_align = block_align
+        self._opus = opuslib.Decoder(sample_rate, 1) if codec == "opus" else None
+        self.chunks = 0
+        self.bytes_in = 0
+        self.samples_out = 0
+        self.decode_sec = 0.0
+
+    def decode(self, raw_bytes):
+        """One audio_chunk payload -> int16 samples"""
+        start = time.perf_counter()
+        if self.codec == "mulaw":
+            samples = decode_mulaw(raw_bytes)
+        elif self.codec == "ima_adpcm":
+            samples = decode_ima_adpcm(raw_bytes, self.block_align)
+        else:
+            # Opus frames depend on the previous ones, hence one decoder per session
+            pcm = b"".join(self._opus.decode(bytes(packet), OPUS_MAX_FRAME_SAMPLES)
+                           for packet in split_opus_packets(raw_bytes))
+            samples = np.frombuffer(pcm, dtype="<i2")
+        self.decode_sec += time.perf_counter() - start
+        self.chunks += 1
+        self.bytes_in += len(raw_bytes)
+        self.samples_out += len(samples)
+        return samples
+
+    def stats(self):
+        return {
+            "codec": self.codec,
+            "chunks": self.chunks,
+            "bytes_in": self.bytes_in,
+            "pcm_bytes_out": self.samples_out * 2,
+            "compression": round(self.samples_out * 2 / self.bytes_in, 2) if self.bytes_in else None,
+            "decode_ms": round(self.decode_sec * 1000, 2),
+        }
+
+
+def available_codecs():
+    """Codecs this server can decode, most compact first"""
+    return (["opus"] if opuslib is not None else []) + ["ima_adpcm", "mulaw"]
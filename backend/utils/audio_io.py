@@ -0,0 +1,209 @@
+"""
+In-memory audio decoding for the transcription path.
+
+WAV/PCM uploads are parsed straight into float32 NumPy arrays (16kHz mono,
+the format Whisper expects). Anything else (WebM/Opus from MediaRecorder)
+is piped through a single ffmpeg process. Nothing touches the disk.
+"""
+import struct
+import subprocess
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16000
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def is_wav(raw_bytes):
+    """True if the payload starts with a RIFF/WAVE header"""
+    return len(raw_bytes) >= 12 and raw_bytes[:4] == b"RIFF" and raw_bytes[8:12] == b"WAVE"
+
+
+def parse_wav_header(raw_bytes):
+    """
+    Walk the RIFF chunks and locate the 'fmt ' and 'data' chunks.
+
+    Streaming encoders often write 0 or 0xFFFFFFFF as the data size, so the
+    data length is clamped to the bytes actually present.
+
+    Returns:
+        dict with format, channels, sample_rate, bits, data_offset, data_length
+    """
+    if not is_wav(raw_bytes):
+        raise ValueError("Not a RIFF/WAVE payload")
+
+    header = {}
+    offset = 12
+    total = len(raw_bytes)
+    while offset + 8 <= total:
+        chunk_id = raw_bytes[offset:offset + 4]
+        (chunk_size,) = struct.unpack_from("<I", raw_bytes, offset + 4)
+        body = offset + 8
+
+        if chunk_id == b"fmt ":
+            fmt, channels, sample_rate, _, _, bits = struct.unpack_from("<HHIIHH", raw_bytes, body)
+            if fmt == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                # Real format code lives in the first two bytes of the SubFormat GUID
+                (fmt,) = struct.unpack_from("<H", raw_bytes, body + 24)
+            header.update({
+                "format": fmt,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "bits": bits,
+            })
+
+        elif chunk_id == b"data":
+            if "format" not in header:
+                raise ValueError("WAV 'data' chunk before 'fmt ' chunk")
+            header["data_offset"] = body
+            header["data_length"] = min(chunk_size, total - body)
+            return header
+
+        # Chunks are word-aligned
+        offset = body + chunk_size + (chunk_size & 1)
+
+    raise ValueError("WAV payload has no 'data' chunk")
+
+
+def pcm_to_float32(raw_bytes, offset=0, length=None, bits=16, fmt=WAVE_FORMAT_PCM, channels=1):
+    """
+    Interpret a region of PCM bytes as float32 samples in [-1, 1].
+
+    32-bit float mono data is returned as a read-only view of the input
+    buffer (zero-copy); integer formats need exactly one conversion pass.
+    """
+    if length is None:
+        length = len(raw_bytes) - offset
+    frame_bytes = channels * bits // 8
+    if frame_bytes <= 0:
+        raise ValueError(f"Unsupported WAV layout: {channels}ch, {bits} bits")
+    length -= length % frame_bytes
+    count = length // (bits // 8)
+    mv = memoryview(raw_bytes)
+
+    if fmt == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+        samples = np.frombuffer(mv, dtype="<f4", count=count, offset=offset)
+    elif fmt == WAVE_FORMAT_IEEE_FLOAT and bits == 64:
+        samples = np.frombuffer(mv, dtype="<f8", count=count, offset=offset).astype(np.float32)
+    elif fmt != WAVE_FORMAT_PCM:
+        raise ValueError(f"Unsupported WAV format code: {fmt:#06x}")
+    elif bits == 16:
+        samples = np.frombuffer(mv, dtype="<i2", count=count, offset=offset).astype(np.float32)
+        samples *= 1.0 / 32768.0
+    elif bits == 8:
+        samples = np.frombuffer(mv, dtype=np.uint8, count=count, offset=offset).astype(np.float32)
+        samples -= 128.0
+        samples *= 1.0 / 128.0
+    elif bits == 32:
+        samples = np.frombuffer(mv, dtype="<i4", count=count, offset=offset).astype(np.float32)
+        samples *= 1.0 / 2147483648.0
+    elif bits == 24:
+        raw = np.frombuffer(mv, dtype=np.uint8, count=length, offset=offset).reshape(-1, 3)
+        widened = (raw[:, 0].astype(np.int32)
+                   | (raw[:, 1].astype(np.int32) << 8)
+                   | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = widened.astype(np.float32)
+        samples *= 1.0 / 8388608.0
+    else:
+        raise ValueError(f"Unsupported PCM bit depth: {bits}")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    return samples
+
+
+def resample_linear(audio, from_rate, to_rate=TARGET_SAMPLE_RATE):
+    """Linear-interpolation resampler (same approach as the frontend audioEncoder.js)"""
+    if from_rate == to_rate or len(audio) == 0:
+        return audio
+    new_length = int(round(len(audio) * to_rate / from_rate))
+    positions = np.arange(new_length, dtype=np.float64) * (from_rate / to_rate)
+    return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+def decode_wav(raw_bytes):
+    """
+    Parse a WAV payload into a 16kHz mono float32 array without copying
+    more than once.
+
+    Returns:
+        (audio, header) tuple
+    """
+    header = parse_wav_header(raw_bytes)
+    audio = pcm_to_float32(
+        raw_bytes,
+        offset=header["data_offset"],
+        length=header["data_length"],
+        bits=header["bits"],
+        fmt=header["format"],
+        channels=header["channels"],
+    )
+    audio = resample_linear(audio, header["sample_rate"])
+    return audio, header
+
+
+def decode_with_ffmpeg(raw_bytes, sample_rate=TARGET_SAMPLE_RATE):
+    """
+    Decode any container/codec ffmpeg understands by piping bytes through
+    stdin/stdout. One process spawn, no temp files.
+    """
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads", "0",
+        "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "s16le",
+        "-ac", "1",
+        "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(cmd, input=raw_bytes, capture_output=True, check=False)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg not found. Install ffmpeg and ensure it is on PATH.")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg decode failed: {proc.stderr.decode(errors='replace').strip()}")
+    return pcm_to_float32(proc.stdout, bits=16)
+
+
+def load_audio(raw_bytes, is_wav_format=False):
+    """
+    Turn an uploaded payload into a 16kHz mono float32 array.
+
+    Args:
+        raw_bytes: bytes-like audio payload
+        is_wav_format: client says the payload is WAV (or bare 16kHz s16le PCM)
+
+    Returns:
+        np.ndarray (float32, 16kHz mono)
+    """
+    if is_wav(raw_bytes):
+        try:
+            audio, _ = decode_wav(raw_bytes)
+            return audio
+        except (ValueError, struct.error) as e:
+            print(f"⚠️ In-memory WAV parse failed ({e}), falling back to ffmpeg")
+            return decode_with_ffmpeg(raw_bytes)
+
+    if is_wav_format:
+        # Header-less PCM: assume the 16kHz mono s16le the frontend produces
+        return pcm_to_float32(raw_bytes, bits=16)
+
+    return decode_with_ffmpeg(raw_bytes)
+
+
+def rms_int16(audio):
+    """RMS on the 16-bit scale, comparable to pydub's AudioSegment.rms"""
+    if len(audio) == 0:
+        return 0
+    return int(np.sqrt(np.mean(np.square(audio, dtype=np.float64))) * 32768)
+
+
+def duration_ms(audio, sample_rate=TARGET_SAMPLE_RATE):
+    """Duration of a sample array in milliseconds"""
+    return int(len(audio) * 1000 / sample_rate)
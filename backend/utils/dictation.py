@@ -0,0 +1,181 @@
+"""
+Long-form dictation: spool to disk, transcribe in windows.
+
+Dictation audio (notes, summaries, messages) can run for many minutes, so
+it never lives in the Python heap. Each session appends 16kHz s16le PCM to
+a memory-mapped spool file; the transcriber reads one window at a time
+(30s, the model's native context), commits the segments that ended inside
+it and moves its cursor to where the last uncommitted segment began. The
+tail of the committed text is fed back as the prompt, so wording and
+casing carry across windows. Committed spool pages are dropped from memory
+once transcribed.
+"""
+import mmap
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+SAMPLE_BYTES = 2  # s16le
+
+
+class PcmSpool:
+    """
+    Append-only int16 PCM in an unlinked, memory-mapped temp file.
+
+    Args:
+        directory: where the spool file is created (default: the system temp dir)
+        grow_bytes: the file grows in steps of at least this much
+    """
+
+    def __init__(self, directory=None, grow_bytes=8 * 1024 * 1024):
+        self._file = tempfile.TemporaryFile(dir=directory or None)
+        self.grow_bytes = grow_bytes
+        self.capacity = 0
+        self.size = 0  # bytes written
+        self.released = 0  # bytes before this offset were dropped from memory
+        self._mm = None
+        self._lock = threading.Lock()
+
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity + self.grow_bytes)
+        capacity += -capacity % mmap.PAGESIZE
+        if self._mm is not None:
+            self._mm.close()
+        os.ftruncate(self._file.fileno(), capacity)
+        self._mm = mmap.mmap(self._file.fileno(), capacity)
+        self.capacity = capacity
+
+    def append(self, pcm):
+        """Append s16le bytes (or an int16 array)"""
+        data = memoryview(np.ascontiguousarray(pcm, dtype="<i2") if isinstance(pcm, np.ndarray) else pcm).cast("B")
+        with self._lock:
+            self._reserve(self.size + len(data))
+            self._mm[self.size:self.size + len(data)] = data
+            self.size += len(data)
+
+    def __len__(self):
+        """Samples spooled so far"""
+        return self.size // SAMPLE_BYTES
+
+    def read(self, start, end):
+        """Samples [start, end) as a float32 array (the only heap copy of the audio)"""
+        with self._lock:
+            end = min(end, len(self))
+            if start >= end:
+                return np.zeros(0, dtype=np.float32)
+            view = np.frombuffer(self._mm, dtype="<i2", count=end - start, offset=start * SAMPLE_BYTES)
+            audio = view.astype(np.float32)
+            del view  # no exported buffer may outlive the lock (the map is replaced on growth)
+        audio *= 1.0 / 32768.0
+        return audio
+
+    def release(self, upto):
+        """Drop the pages before sample `upto` from memory; they stay in the file"""
+        with self._lock:
+            offset = (upto * SAMPLE_BYTES) // mmap.PAGESIZE * mmap.PAGESIZE
+            if self._mm is None or offset <= self.released:
+                return
+            if hasattr(self._mm, "madvise"):
+                self._mm.madvise(mmap.MADV_DONTNEED, self.released, offset - self.released)
+            self.released = offset
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            self._file.close()
+
+    def stats(self):
+        return {
+            "spooled_bytes": self.size,
+            "file_bytes": self.capacity,
+            "released_bytes": self.released,
+        }
+
+
+class DictationTranscriber:
+    """
+    Windowed transcription over a PcmSpool.
+
+    Args:
+        decode_fn: callable(audio_np, prompt) -> list of (start_sec, end_sec, text)
+        spool: PcmSpool the session appends to
+        sample_rate: sample rate of the spooled audio
+        window_sec: audio decoded per pass
+        prompt_chars: how much committed text is fed back as the prompt
+    """
+
+    def __init__(self, decode_fn, spool, sample_rate=16000, window_sec=30, prompt_chars=200):
+        self.decode_fn = decode_fn
+        self.spool = spool
+        self.sample_rate = sample_rate
+        self.window_samples = int(window_sec * sample_rate)
+        self.prompt_chars = prompt_chars
+        self.cursor = 0  # first sample not yet committed
+        self.prompt = ""
+        self.committed_segments = 0
+        self.windows = 0
+        self.lock = threading.Lock()
+
+    @property
+    def pending_samples(self):
+        return len(self.spool) - self.cursor
+
+    def ready(self):
+        """A full window of untranscribed audio is waiting"""
+        return self.pending_samples >= self.window_samples
+
+    def _window(self, final):
+        """Decode one window; returns committed segments with absolute timestamps"""
+        end = min(self.cursor + self.window_samples, len(self.spool))
+        audio = self.spool.read(self.cursor, end)
+        offset_sec = self.cursor / self.sample_rate
+        segments = [(s, e, t) for s, e, t in self.decode_fn(audio, self.prompt) if t.strip()]
+        self.windows += 1
+
+        last_window = final and end == len(self.spool)
+        if segments and not last_window and len(segments) > 1:
+            # The last segment may be cut by the window edge: re-hear it in the next window
+            resume = int(segments[-1][0] * self.sample_rate)
+            committed, next_cursor = segments[:-1], self.cursor + resume
+        else:
+            committed, next_cursor = segments, end
+
+        self.cursor = next_cursor
+        self.spool.release(self.cursor)
+        if committed:
+            text = " ".join(t.strip() for _, _, t in committed)
+            self.prompt = f"{self.prompt} {text}".strip()[-self.prompt_chars:]
+            self.committed_segments += len(committed)
+        return [
+            {"start": round(offset_sec + s, 2), "end": round(offset_sec + e, 2), "text": t.strip()}
+            for s, e, t in committed
+        ]
+
+    def process(self, final=False):
+        """
+        Transcribe every full window waiting (and, if final, the remainder).
+
+        Returns:
+            list of committed segments: {start, end, text}, times in seconds
+            from the start of the dictation
+        """
+        with self.lock:
+            segments = []
+            while self.ready() or (final and self.pending_samples > 0):
+                segments.extend(self._window(final))
+            return segments
+
+    def stats(self):
+        return dict(
+            self.spool.stats(),
+            spooled_sec=round(len(self.spool) / self.sample_rate, 1),
+            transcribed_sec=round(self.cursor / self.sample_rate, 1),
+            windows=self.windows,
+            segments=self.committed_segments,
+        )
@@ -4,8 +4,28 @@ Enhanced Command Router with Ollama fallback for complex queries
 import spacy
 import re
 import json
+import hashlib
+import os
+import threading
+import time
 from spacy.matcher import Matcher
 from config.form_map import formMap
+from utils.intent_cache import IntentCache
+from utils.llm_fallback import CircuitBreaker, DeadlineFallback
+from utils.ollama_client import OllamaClient, OllamaError
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:1b")  # or llama2, mistral, etc.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # keep the model loaded between fallbacks
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "96"))  # intent JSON is a few dozen tokens
+OLLAMA_TIMEOUT_SEC = float(os.getenv("OLLAMA_TIMEOUT_SEC", "10"))
+
+LLM_BUDGET_SEC = float(os.getenv("LLM_BUDGET_SEC", "3"))  # latency budget of a request that falls back to Ollama
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))  # consecutive failures that open the circuit
+LLM_BREAKER_RESET_SEC = float(os.getenv("LLM_BREAKER_RESET_SEC", "30"))  # probe interval while open
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")  # start Ollama alongside the rules
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "2"))
+LLM_HEDGE_MIN_WORDS = 4  # shorter utterances are nearly always commands
 
 # Load spaCy
 nlp = spacy.load("en_core_web_sm")
@@ -97,109 +117,172 @@ def get_mapped_field(entity_label):
 # PATTERN-BASED INTENT DETECTION
 # ============================================
 
-def detect_intent_spacy(text):
-    """Fast pattern matching for common commands"""
-    doc = nlp(text)
-    matches = matcher(doc)
-    
-    print(f"🔍 Analyzing: '{text}'")
-    
-    # Clear field command
-    if text.lower().startswith("clear "):
-        words = text.lower().split()
-        if len(words) > 1:
-            field = words[-1].rstrip(".?!")
-            field = re.sub(r'[^\w\s]', '', field)
-            return "clear_field", {"field": field}
-    
-    # Fill field using regex (more flexible)
-    # Pattern 1: "type VALUE in FIELD" or "enter VALUE in FIELD"
-    fill_match = re.search(r'(?:enter|type|set|put)\s+(.*?)\s+(?:in|into|as|for)\s+(.*?)[.?!]?$', text, re.IGNORECASE)
-    if fill_match:
-        value = fill_match.group(1).strip()
-        label = fill_match.group(2).strip().rstrip(".?!")
-        label = re.sub(r'[^a-z0-9]', '', label.lower())
-        print(f"✅ Pattern 1 match: field='{label}', value='{value}'")
-        return "fill", {"label": label, "value": value}
-    
-    # Pattern 2: "write in FIELD that VALUE" or "write in FIELD VALUE"
-    write_match = re.search(r'(?:write|add)\s+(?:in|into|to)\s+(\w+)\s+(?:that\s+)?(.*)', text, re.IGNORECASE)
-    if write_match:
-        label = write_match.group(1).strip().rstrip(".?!")
-        value = write_match.group(2).strip().rstrip(".?!")
-        label = re.sub(r'[^a-z0-9]', '', label.lower())
-        print(f"✅ Pattern 2 match: field='{label}', value='{value}'")
-        return "fill", {"label": label, "value": value}
-    
-    # Checkbox detection
-    if any(w in text.lower() for w in ["check", "tick", "select", "mark", "uncheck"]):
-        action_type = "check" if any(w in text.lower() for w in ["check", "tick", "select", "mark"]) else "uncheck"
-        parts = re.split(r'\s+in\s+|\s+under\s+', text.lower(), 1)
-        if len(parts) == 2:
-            checkbox_label = parts[0].replace("check", "").replace("uncheck", "").strip()
-            form = get_mapped_field(parts[1].strip())
-            return "check_box", {
-                "checkbox_action": action_type,
-                "data": {form: [checkbox_label]}
-            }
-    
-    # Scroll detection
-    if "scroll" in text.lower() or "move" in text.lower():
-        if "up" in text.lower():
-            return "scroll_up", {}
-        elif "down" in text.lower():
-            return "scroll_down", {}
-    
-    # Stop detection
-    if text.lower().strip() in ["stop", "pause", "sleep"]:
+# Matcher patterns that only read token text run on a tokenized (untagged)
+# doc; the tagger runs only when a POS-based pattern could match at all.
+lexical_matcher = Matcher(nlp.vocab)
+lexical_matcher.add("submit_form", submit_patterns)
+lexical_matcher.add("book_appointment", book_patterns)
+lexical_matcher.add("refresh_page", refresh_patterns)
+lexical_matcher.add("stop_listening", stop_patterns)
+
+
+def _first_words(patterns):
+    """Lowercase words a pattern list can start with"""
+    words = set()
+    for pattern in patterns:
+        lower = pattern[0]["LOWER"]
+        words.update(lower["IN"] if isinstance(lower, dict) else [lower])
+    return frozenset(words)
+
+
+# POS-based patterns whose match decides the intent (navigate, dropdown, select)
+TAGGED_PATTERN_WORDS = _first_words(navigate_patterns + dropdown_patterns + select_patterns)
+
+# The router reads token text and POS (tagger + attribute_ruler) only
+UNUSED_PIPES = [name for name in ("parser", "lemmatizer", "ner") if name in nlp.pipe_names]
+
+
+class _Utterance:
+    """The text as every rule sees it: normalized once, spaCy docs built on first use"""
+
+    __slots__ = ("text", "lower", "_tokens", "_doc")
+
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self._tokens = None
+        self._doc = None
+
+    @property
+    def tokens(self):
+        """Tokenizer-only doc (no tagger)"""
+        if self._tokens is None:
+            self._tokens = nlp.make_doc(self.text)
+            _count("tokenized")
+        return self._tokens
+
+    def needs_tags(self):
+        """True if a POS-based matcher pattern could match (otherwise the tokens are enough)"""
+        return not TAGGED_PATTERN_WORDS.isdisjoint(t.lower_ for t in self.tokens)
+
+    @property
+    def doc(self):
+        """Fully tagged doc"""
+        if self._doc is None:
+            self._doc = nlp(self.text, disable=UNUSED_PIPES)
+            _count("tagged")
+        return self._doc
+
+
+class IntentRule:
+    """
+    One row of INTENT_RULES.
+
+    Args:
+        name: label in the per-rule stats
+        extract: callable(utterance, match) -> (intent, entities), or None to fall through
+        pattern: regex (compiled case-insensitive) that must be found in the text
+        keywords: substrings of the lowercased text, at least one required
+        speculative: intents of this rule that may run from interim text
+            (idempotent and reversible, see detect_intent_speculative)
+    """
+
+    __slots__ = ("name", "extract", "pattern", "keywords", "speculative")
+
+    def __init__(self, name, extract, pattern=None, keywords=(), speculative=()):
+        self.name = name
+        self.extract = extract
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.keywords = tuple(keywords)
+        self.speculative = frozenset(speculative)
+
+    def apply(self, utterance):
+        if self.keywords and not any(k in utterance.lower for k in self.keywords):
+            return None
+        match = None
+        if self.pattern is not None:
+            match = self.pattern.search(utterance.text)
+            if match is None:
+                return None
+        return self.extract(utterance, match)
+
+
+def _clear_field(u, m):
+    words = u.lower.split()
+    if len(words) > 1:
+        field = words[-1].rstrip(".?!")
+        field = re.sub(r'[^\w\s]', '', field)
+        return "clear_field", {"field": field}
+
+
+def _fill_type_in(u, m):
+    # "type VALUE in FIELD" or "enter VALUE in FIELD"
+    value = m.group(1).strip()
+    label = m.group(2).strip().rstrip(".?!")
+    label = re.sub(r'[^a-z0-9]', '', label.lower())
+    print(f"✅ Pattern 1 match: field='{label}', value='{value}'")
+    return "fill", {"label": label, "value": value}
+
+
+def _fill_write_in(u, m):
+    # "write in FIELD that VALUE" or "write in FIELD VALUE"
+    label = m.group(1).strip().rstrip(".?!")
+    value = m.group(2).strip().rstrip(".?!")
+    label = re.sub(r'[^a-z0-9]', '', label.lower())
+    print(f"✅ Pattern 2 match: field='{label}', value='{value}'")
+    return "fill", {"label": label, "value": value}
+
+
+def _check_box(u, m):
+    action_type = "check" if any(w in u.lower for w in ["check", "tick", "select", "mark"]) else "uncheck"
+    parts = re.split(r'\s+in\s+|\s+under\s+', u.lower, 1)
+    if len(parts) == 2:
+        checkbox_label = parts[0].replace("check", "").replace("uncheck", "").strip()
+        form = get_mapped_field(parts[1].strip())
+        return "check_box", {
+            "checkbox_action": action_type,
+            "data": {form: [checkbox_label]}
+        }
+
+
+def _scroll(u, m):
+    if "up" in u.lower:
+        return "scroll_up", {}
+    elif "down" in u.lower:
+        return "scroll_down", {}
+
+
+def _stop_word(u, m):
+    if u.lower.strip() in ["stop", "pause", "sleep"]:
         return "stop_listening", {}
 
-    # Dictation specific controls: continue/start/stop/clear/open dictation
-    dict_continue_match = re.search(r'continue in\s+(notes|summary|message)', text, re.IGNORECASE)
-    if dict_continue_match:
-        area = dict_continue_match.group(1).lower()
-        return "dictation_control", {"op": "continue", "area": area}
 
-    dict_start_match = re.search(r'(?:(?:start|begin|resume) (?:dictation|dictate))(?: in (notes|summary|message))?', text, re.IGNORECASE)
-    if dict_start_match:
-        area = dict_start_match.group(1).lower() if dict_start_match.group(1) else ""
-        return "dictation_control", {"op": "start", "area": area}
+def _dictation_area(op):
+    return lambda u, m: ("dictation_control", {"op": op, "area": (m.group(1) or "").lower()})
 
-    if re.search(r'\b(stop|stop dictation|end dictation|pause dictation)\b', text, re.IGNORECASE):
-        return "dictation_control", {"op": "stop", "area": ""}
 
-    if re.search(r'\b(open|go to|navigate to)\s+dictation\b', text, re.IGNORECASE):
-        return "navigate_page", {"page": "dictation"}
+def _constant(intent, entities=None):
+    return lambda u, m: (intent, dict(entities or {}))
+
+
+def _open_dropdown(u, m):
+    field = m.group(1).strip()
+    field = re.sub(r'[^a-z0-9]', '', field.lower())
+    return "open_dropdown", {"field": field}
+
+
+def _select_option(u, m):
+    return "select_option", {"value": m.group(1).strip()}
+
+
+def _matcher_patterns(u, m):
+    """spaCy Matcher results, first match wins; tags only if a POS-based pattern can match"""
+    if not u.needs_tags():
+        doc, matches = u.tokens, lexical_matcher(u.tokens)
+    else:
+        doc = u.doc
+        matches = matcher(doc)
 
-    clear_dict_match = re.search(r'clear\s+(notes|summary|message)\b', text, re.IGNORECASE)
-    if clear_dict_match:
-        area = clear_dict_match.group(1).lower()
-        return "dictation_control", {"op": "clear", "area": area}
-    
-    # Show/close commands
-    if "show command" in text.lower():
-        return "show_commands", {}
-    if "close command" in text.lower():
-        return "close_commands", {}
-
-    # Show numbered inputs: "show numbers", "number the fields", "number inputs"
-    if re.search(r'\b(show|display|number|label)\b.*\b(number|numbers|fields|inputs|inputs with numbers|label inputs)\b', text, re.IGNORECASE):
-        return "show_numbers", {}
-    
-    # Dropdown open detection
-    dropdown_open_match = re.search(r'(?:open|show|expand)\s+(.*?)\s+dropdown', text, re.IGNORECASE)
-    if dropdown_open_match:
-        field = dropdown_open_match.group(1).strip()
-        field = re.sub(r'[^a-z0-9]', '', field.lower())
-        return "open_dropdown", {"field": field}
-    
-    # Select dropdown option detection
-    select_match = re.search(r'(?:select|choose|pick)\s+(.*?)(?:\s+from\s+dropdown)?[.?!]?$', text, re.IGNORECASE)
-    if select_match and any(w in text.lower() for w in ["select", "choose", "pick"]):
-        value = select_match.group(1).strip()
-        return "select_option", {"value": value}
-    
-    # Pattern matcher results
     for match_id, start, end in matches:
         intent = nlp.vocab.strings[match_id]
         
@@ -208,17 +291,8 @@ def detect_intent_spacy(text):
                 if token.pos_ == "NOUN":
                     return "navigate_page", {"page": token.text}
         
-        elif intent == "submit_form":
-            return "submit_form", {}
-        
-        elif intent == "book_appointment":
-            return "book_appointment", {}
-        
-        elif intent == "refresh_page":
-            return "refresh_page", {}
-        
-        elif intent == "stop_listening":
-            return "stop_listening", {}
+        elif intent in ("submit_form", "book_appointment", "refresh_page", "stop_listening"):
+            return intent, {}
         
         elif intent == "open_dropdown":
             for token in doc:
@@ -231,32 +305,225 @@ def detect_intent_spacy(text):
                 if token.lower_ in ["select", "choose", "pick"]:
                     value = " ".join([t.text for t in doc[i+1:]])
                     return "select_option", {"value": value.strip()}
-    
+
+
+# Tried top to bottom; the first rule returning an intent wins
+INTENT_RULES = [
+    IntentRule("clear_field", _clear_field, pattern=r'^clear '),
+    IntentRule("fill_type_in", _fill_type_in, pattern=r'(?:enter|type|set|put)\s+(.*?)\s+(?:in|into|as|for)\s+(.*?)[.?!]?$'),
+    IntentRule("fill_write_in", _fill_write_in, pattern=r'(?:write|add)\s+(?:in|into|to)\s+(\w+)\s+(?:that\s+)?(.*)'),
+    IntentRule("check_box", _check_box, keywords=["check", "tick", "select", "mark", "uncheck"]),
+    IntentRule("scroll", _scroll, keywords=["scroll", "move"], speculative=["scroll_up", "scroll_down"]),
+    IntentRule("stop_word", _stop_word, keywords=["stop", "pause", "sleep"]),
+    IntentRule("dictation_continue", _dictation_area("continue"), pattern=r'continue in\s+(notes|summary|message)'),
+    IntentRule("dictation_start", _dictation_area("start"),
+               pattern=r'(?:(?:start|begin|resume) (?:dictation|dictate))(?: in (notes|summary|message))?'),
+    IntentRule("dictation_stop", _constant("dictation_control", {"op": "stop", "area": ""}),
+               pattern=r'\b(stop|stop dictation|end dictation|pause dictation)\b'),
+    IntentRule("navigate_dictation", _constant("navigate_page", {"page": "dictation"}),
+               pattern=r'\b(open|go to|navigate to)\s+dictation\b', speculative=["navigate_page"]),
+    IntentRule("dictation_clear", _dictation_area("clear"), pattern=r'clear\s+(notes|summary|message)\b'),
+    IntentRule("show_commands", _constant("show_commands"), keywords=["show command"], speculative=["show_commands"]),
+    IntentRule("close_commands", _constant("close_commands"), keywords=["close command"], speculative=["close_commands"]),
+    IntentRule("show_numbers", _constant("show_numbers"),
+               pattern=r'\b(show|display|number|label)\b.*\b(number|numbers|fields|inputs|inputs with numbers|label inputs)\b'),
+    IntentRule("open_dropdown", _open_dropdown, pattern=r'(?:open|show|expand)\s+(.*?)\s+dropdown'),
+    IntentRule("select_option", _select_option, keywords=["select", "choose", "pick"],
+               pattern=r'(?:select|choose|pick)\s+(.*?)(?:\s+from\s+dropdown)?[.?!]?$'),
+    IntentRule("spacy_matcher", _matcher_patterns),
+]
+INTENT_RULES_BY_NAME = {rule.name: rule for rule in INTENT_RULES}
+
+rule_stats = {rule.name: {"calls": 0, "hits": 0, "total_ns": 0} for rule in INTENT_RULES}
+nlp_counts = {"utterances": 0, "tokenized": 0, "tagged": 0, "ollama_calls": 0}
+rule_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with rule_stats_lock:
+        nlp_counts[key] += 1
+
+
+def _run_rules(utterance, rules):
+    """Try rules in order; returns (result or None, [(rule name, ns)])"""
+    timings = []
+    for rule in rules:
+        start = time.perf_counter_ns()
+        result = rule.apply(utterance)
+        timings.append((rule.name, time.perf_counter_ns() - start))
+        if result is not None:
+            return result, timings
+    return None, timings
+
+
+def _record_rule_stats(timings, hit, utterances=1):
+    with rule_stats_lock:
+        nlp_counts["utterances"] += utterances
+        for name, elapsed in timings:
+            stats = rule_stats[name]
+            stats["calls"] += 1
+            stats["total_ns"] += elapsed
+        if hit:
+            rule_stats[timings[-1][0]]["hits"] += 1
+
+
+def detect_intent_spacy(text):
+    """
+    Fast pattern matching for common commands: one pass over INTENT_RULES.
+    spaCy only tokenizes/tags if the matcher rule at the end is reached.
+    """
+    print(f"🔍 Analyzing: '{text}'")
+    result, timings = _run_rules(_Utterance(text), INTENT_RULES)
+    _record_rule_stats(timings, result is not None)
+
     # If no pattern matched, return None to trigger Ollama fallback
-    return None, None
+    return result if result is not None else (None, None)
+
+
+def parse_batch(texts, batch_size=256, n_process=1, use_ollama=False):
+    """
+    Detect intents for many utterances at once (transcript replays, QA runs).
+
+    The regex rules run per text exactly as in detect_intent_spacy; the texts
+    that reach the matcher and need POS tags are then tagged together with
+    nlp.pipe (unused pipeline components disabled) before the matcher runs.
+
+    Args:
+        texts: list of utterances
+        batch_size: nlp.pipe batch size
+        n_process: nlp.pipe worker processes (1 = tag in this process)
+        use_ollama: send texts no rule matched to Ollama, one by one
+
+    Returns:
+        list of dicts in input order: text, intent, entities, rule (the rule
+        that matched, 'ollama', or None) and timings: rules_us, tag_us (this
+        item's share of the batched tagging) and ollama_ms
+    """
+    items = []
+    for text in texts:
+        utterance = _Utterance(text)
+        result, timings = _run_rules(utterance, INTENT_RULES[:-1])
+        items.append({"utterance": utterance, "result": result, "timings": timings})
+
+    pending = [item for item in items if item["result"] is None]
+    to_tag = [item for item in pending if item["utterance"].needs_tags()]
+    tag_us = 0.0
+    if to_tag:
+        start = time.perf_counter()
+        docs = nlp.pipe(
+            (item["utterance"].text for item in to_tag),
+            batch_size=batch_size,
+            n_process=n_process,
+            disable=UNUSED_PIPES,
+        )
+        for item, doc in zip(to_tag, docs):
+            item["utterance"]._doc = doc
+        tag_us = (time.perf_counter() - start) * 1e6 / len(to_tag)
+        with rule_stats_lock:
+            nlp_counts["tagged"] += len(to_tag)
+
+    matcher_rule = INTENT_RULES[-1]
+    for item in pending:
+        item["result"], timings = _run_rules(item["utterance"], [matcher_rule])
+        item["timings"].extend(timings)
+
+    results = []
+    for item in items:
+        utterance, result, timings = item["utterance"], item["result"], item["timings"]
+        _record_rule_stats(timings, result is not None)
+        entry = {
+            "text": utterance.text,
+            "intent": None,
+            "entities": {},
+            "rule": timings[-1][0] if result is not None else None,
+            "timings": {
+                "rules_us": round(sum(ns for _, ns in timings) / 1000, 2),
+                "tag_us": round(tag_us, 2) if utterance._doc is not None else 0.0,
+                "ollama_ms": None,
+            },
+        }
+        if result is None and use_ollama:
+            start = time.perf_counter()
+            result = llm_fallback.resolve(utterance.text, llm_fallback.deadline())
+            entry["timings"]["ollama_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            entry["rule"] = "ollama" if result is not None and result[0] != "unknown" else None
+        entry["intent"], entry["entities"] = result if result is not None and result[0] else ("unknown", {})
+        results.append(entry)
+
+    print(f"📚 Parsed batch of {len(results)}: {len(pending)} reached the matcher, {len(to_tag)} tagged")
+    return results
+
+
+def rules_version():
+    """Hash of everything that decides a pattern result: rule order, regexes, extractors, matcher patterns"""
+    h = hashlib.blake2b(digest_size=8)
+    for rule in INTENT_RULES:
+        pattern = rule.pattern.pattern if rule.pattern is not None else None
+        h.update(repr((rule.name, pattern, rule.keywords)).encode())
+        h.update(rule.extract.__code__.co_code)
+    matcher_patterns = [navigate_patterns, fill_patterns, submit_patterns, scroll_patterns, check_patterns,
+                        book_patterns, refresh_patterns, stop_patterns, dropdown_patterns, select_patterns]
+    h.update(json.dumps(matcher_patterns, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def intent_rule_stats():
+    """Per-rule call/hit counts and time, plus how often spaCy had to run"""
+    with rule_stats_lock:
+        rules = [
+            {
+                "rule": name,
+                "calls": stats["calls"],
+                "hits": stats["hits"],
+                "avg_us": round(stats["total_ns"] / stats["calls"] / 1000, 2) if stats["calls"] else None,
+                "total_ms": round(stats["total_ns"] / 1e6, 3),
+            }
+            for name, stats in rule_stats.items()
+        ]
+        return dict(nlp_counts, rules=rules)
 
 
 # ============================================
-# OLLAMA INTEGRATION (for complex queries)
+# SPECULATIVE DETECTION (interim text)
 # ============================================
 
-def detect_intent_ollama(text, available_actions=None):
+# Interim text longer than this is likely a longer command still being spoken
+SPECULATIVE_MAX_WORDS = 5
+
+
+def detect_intent_speculative(text):
     """
-    Use Ollama for complex/conversational queries.
-    Fallback when spaCy patterns fail.
+    Early decision for interim (not yet final) text, from the regex and
+    keyword rules of the same table as the final transcript (the spaCy
+    matcher is left out, so a partial never costs a tagger pass). It is
+    only taken when the rule that wins marks the intent speculative
+    (commands harmless to repeat or reverse; submit/stop/refresh wait for
+    the final transcript since a correction could not undo them) and the
+    text is at most SPECULATIVE_MAX_WORDS. No Ollama, and not counted in
+    the rule stats.
+
+    Interim text only exists in streaming mode ('stream' audio chunks); a
+    client sending buffered clips never gets speculative actions.
+    
+    Returns:
+        (intent, entities) tuple, or (None, None)
     """
-    try:
-        import requests
-        
-        if available_actions is None:
-            available_actions = [
-                "navigate_page", "fill_field", "check_box", "submit_form",
-                "book_appointment", "scroll_up", "scroll_down", "clear_field", "refresh_page"
-            ]
-        
-        # Prompt for Ollama
-        prompt = f"""You are a voice assistant for a medical appointment booking system.
-User said: "{text}"
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+    if not normalized or len(normalized.split()) > SPECULATIVE_MAX_WORDS:
+        return None, None
+    result, timings = _run_rules(_Utterance(normalized), INTENT_RULES[:-1])
+    if result is None or result[0] not in INTENT_RULES_BY_NAME[timings[-1][0]].speculative:
+        return None, None
+    return result
+
+
+# ============================================
+# OLLAMA INTEGRATION (for complex queries)
+# ============================================
+
+# Fixed instructions: identical on every call, so Ollama reuses the evaluated prefix
+OLLAMA_SYSTEM_PROMPT = """You are a voice assistant for a medical appointment booking system.
+Extract the intent and entities from the user's command.
 
 Available actions:
 - navigate_page: Go to a specific page (home, profile, appointments, etc.)
@@ -268,57 +535,63 @@ Available actions:
 - clear_field: Clear a form field
 - refresh_page: Reload the page
 
-Extract the intent and entities from the user's command.
-
-Respond ONLY with valid JSON in this format:
-{{
-  "intent": "action_name",
-  "entities": {{"field": "name", "value": "John"}}
-}}
+Respond ONLY with JSON in this format:
+{"intent": "action_name", "entities": {"field": "name", "value": "John"}}
 
 Examples:
 User: "I want to make an appointment for next Monday"
-{{"intent": "fill_field", "entities": {{"field": "date", "value": "next Monday"}}}}
+{"intent": "fill_field", "entities": {"field": "date", "value": "next Monday"}}
 
 User: "Put my name as Sarah Johnson"
-{{"intent": "fill_field", "entities": {{"field": "name", "value": "Sarah Johnson"}}}}
+{"intent": "fill_field", "entities": {"field": "name", "value": "Sarah Johnson"}}
 
 User: "Go back to the main page"
-{{"intent": "navigate_page", "entities": {{"page": "home"}}}}
+{"intent": "navigate_page", "entities": {"page": "home"}}"""
+
+_ollama_client = None
+_ollama_client_lock = threading.Lock()
+
+
+def get_ollama_client():
+    """Shared pooled client (created on first use)"""
+    global _ollama_client
+    with _ollama_client_lock:
+        if _ollama_client is None:
+            _ollama_client = OllamaClient(
+                OLLAMA_MODEL,
+                base_url=OLLAMA_URL,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                num_predict=OLLAMA_NUM_PREDICT,
+                timeout=OLLAMA_TIMEOUT_SEC,
+            )
+        return _ollama_client
+
+
+def _ollama_intent(text, timeout=None):
+    """One Ollama call -> (intent, entities); raises OllamaError"""
+    parsed, timings = get_ollama_client().generate_json(OLLAMA_SYSTEM_PROMPT, f'User: "{text}"', timeout=timeout)
+    intent = parsed.get("intent")
+    entities = parsed.get("entities") or {}
+    if not isinstance(intent, str) or not isinstance(entities, dict):
+        raise OllamaError("parse", f"unexpected shape: {parsed}")
+    print(f"🤖 Ollama detected: {intent} | {entities} "
+          f"(first token {timings['ttft_ms']}ms, total {timings['total_ms']}ms)")
+    return intent, entities
 
-Now analyze: "{text}"
-"""
-        
-        # Call Ollama API (assumed running on localhost:11434)
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "gemma3:1b",  # or llama2, mistral, etc.
-                "prompt": prompt,
-                "stream": False,
-                "temperature": 0.1,  # Low temp for consistent structured output
-            },
-            timeout=10  # Increased timeout for smaller models
-        )
-        
-        if response.ok:
-            result = response.json()
-            raw_text = result.get("response", "")
-            
-            # Extract JSON from response (handle markdown code blocks)
-            json_match = re.search(r'\{.*\}', raw_text, re.DOTALL)
-            if json_match:
-                parsed = json.loads(json_match.group())
-                intent = parsed.get("intent")
-                entities = parsed.get("entities", {})
-                print(f"🤖 Ollama detected: {intent} | {entities}")
-                return intent, entities
-        
-        print("⚠️ Ollama failed to parse")
-        return "unknown", {}
+
+def detect_intent_ollama(text, available_actions=None):
+    """
+    Use Ollama for complex/conversational queries.
+    Fallback when spaCy patterns fail.
+    """
+    try:
+        return _ollama_intent(text)
     
-    except requests.exceptions.RequestException:
-        print("⚠️ Ollama not available (is it running?)")
+    except OllamaError as e:
+        if e.kind == "unavailable":
+            print("⚠️ Ollama not available (is it running?)")
+        else:
+            print(f"⚠️ Ollama failed to parse: {e}" if e.kind == "parse" else f"⚠️ {e}")
         return "unknown", {}
     except Exception as e:
         print(f"⚠️ Ollama error: {e}")
@@ -329,31 +602,120 @@ Now analyze: "{text}"
 # MAIN ROUTING FUNCTION
 # ============================================
 
-def get_intent_and_entities(text, use_ollama=True):
+def cache_version():
+    """Version stamped on cached results: the rule set plus the LLM (and prompt) that answered"""
+    prompt_hash = hashlib.blake2b(OLLAMA_SYSTEM_PROMPT.encode(), digest_size=4).hexdigest()
+    return f"{rules_version()}:{OLLAMA_MODEL}:{prompt_hash}"
+
+
+# Memory tier only by default; demo.py installs a configured (persistent) cache
+intent_cache = IntentCache(version=cache_version())
+
+
+def set_intent_cache(cache):
+    """Replace the intent cache (None disables caching)"""
+    global intent_cache
+    intent_cache = cache
+
+
+def _persisted_llm_result(text):
+    """A phrase the LLM already parsed (for this rule set and model), from the cache's disk tier"""
+    cache = intent_cache
+    if cache is None:
+        return None
+    cached = cache.get_persistent(text)
+    if cached is not None:
+        print(f"💾 Cached LLM result: {cached[0]}")
+    return cached
+
+
+def _call_llm(text, timeout):
+    with rule_stats_lock:
+        nlp_counts["ollama_calls"] += 1
+    intent, entities = _ollama_intent(text, timeout)
+    cache = intent_cache
+    if cache is not None and intent != "unknown":
+        cache.put_persistent(text, intent, entities)
+    return intent, entities
+
+
+llm_fallback = DeadlineFallback(
+    _call_llm,
+    lookup_fn=_persisted_llm_result,
+    breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SEC, probe=lambda: get_ollama_client().ping()),
+    # A reply that isn't an intent object still means the server is up
+    is_failure=lambda e: not (isinstance(e, OllamaError) and e.kind == "parse"),
+    is_timeout=lambda e: isinstance(e, OllamaError) and e.kind == "timeout",
+    budget_sec=LLM_BUDGET_SEC,
+    hedge_workers=LLM_HEDGE_WORKERS if LLM_HEDGE else 0,
+)
+
+# Words the rule table keys on; an utterance with none of them won't match a rule
+COMMAND_WORDS = (
+    TAGGED_PATTERN_WORDS
+    | _first_words(fill_patterns + submit_patterns + scroll_patterns + check_patterns
+                   + book_patterns + refresh_patterns + stop_patterns)
+    | {keyword.split()[0] for rule in INTENT_RULES for keyword in rule.keywords}
+    | {"clear", "enter", "type", "set", "put", "write", "add", "continue", "start", "begin", "resume",
+       "end", "go", "navigate", "display", "number", "label", "close"}
+)
+
+
+def _should_hedge(text):
+    """Longer utterances without a command word are the ones the rules miss"""
+    words = re.findall(r"[a-z']+", text.lower())
+    return len(words) >= LLM_HEDGE_MIN_WORDS and COMMAND_WORDS.isdisjoint(words)
+
+
+def get_intent_and_entities(text, use_ollama=True, budget_sec=None):
     """
     Primary entry point. Tries spaCy first, falls back to Ollama.
+    Repeated utterances are answered from intent_cache; the Ollama fallback
+    runs under a latency budget behind a circuit breaker (llm_fallback).
     
     Args:
         text: User's voice command
         use_ollama: If True, use Ollama for unknown commands
+        budget_sec: latency budget of this call (default LLM_BUDGET_SEC)
     
     Returns:
         (intent, entities) tuple
     """
+    deadline = llm_fallback.deadline(budget_sec)
+    cache = intent_cache
+    if cache is not None:
+        cached = cache.get(text)
+        # Without Ollama, only pattern results apply
+        if cached is not None and (use_ollama or cached[2] == "rules"):
+            print(f"⚡ Intent cache hit ({cached[2]}): {cached[0]}")
+            return cached[0], cached[1]
+    
+    hedged = None
+    if use_ollama and llm_fallback.hedging and _should_hedge(text):
+        hedged = llm_fallback.hedge(text, deadline)
+    
     # 1. Try fast pattern matching
     intent, entities = detect_intent_spacy(text)
     
     if intent:
         print(f"✅ Pattern match: {intent}")
+        llm_fallback.abandon(hedged)
+        if cache is not None:
+            cache.put(text, intent, entities, "rules")
         return intent, entities
     
     # 2. Fallback to Ollama for complex/conversational queries
     if use_ollama:
         print(f"🔄 No pattern match, trying Ollama...")
-        intent, entities = detect_intent_ollama(text)
-        if intent and intent != "unknown":
-            return intent, entities
-    
+        result = llm_fallback.resolve(text, deadline, hedged)
+        if result is not None and result[0] and result[0] != "unknown":
+            if cache is not None:
+                cache.put(text, result[0], result[1], "ollama")
+            return result
+        if result is not None and cache is not None:
+            # Ollama answered and couldn't parse it either (outages aren't cached)
+            cache.put_unknown(text)
+
     # 3. Complete failure
     print(f"❌ Could not understand: {text}")
     return "unknown", {}
@@ -0,0 +1,105 @@
+"""
+Batched inference scheduler for the shared ASR model.
+
+HTTP requests and socket handlers submit decoded clips to a single queue.
+A dispatcher thread collects clips that arrive within a short window (up to
+a maximum batch size), runs them through the model as one batched pass and
+resolves each caller's Future with its own transcript.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class InferenceScheduler:
+    """
+    Collects transcription jobs into batches.
+
+    Args:
+        batch_fn: callable(list_of_audio_arrays, language) -> list of transcripts
+        window_ms: how long to wait for more clips after the first one arrives
+        max_batch_size: flush as soon as this many clips are waiting
+    """
+
+    def __init__(self, batch_fn, window_ms=30, max_batch_size=8):
+        self.batch_fn = batch_fn
+        self.window_sec = max(0, window_ms) / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "clips": 0, "max_batch_seen": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="asr-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, audio, language="en"):
+        """Queue one clip; returns a Future resolving to its transcript"""
+        future = Future()
+        self._queue.put((audio, language, future))
+        return future
+
+    def transcribe(self, audio, language="en", timeout=None):
+        """Blocking convenience wrapper around submit()"""
+        return self.submit(audio, language).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch_size"] = round(stats["clips"] / stats["batches"], 2) if stats["batches"] else 0
+        return stats
+
+    def _collect(self):
+        """Block for the first job, then gather more until the window closes or the batch is full"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_sec
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # A batch shares one decoder prompt, so split it by language
+            by_language = {}
+            for audio, language, future in batch:
+                if future.set_running_or_notify_cancel():
+                    by_language.setdefault(language, []).append((audio, future))
+
+            for language, jobs in by_language.items():
+                self._run_batch(language, jobs)
+
+    def _run_batch(self, language, jobs):
+        start = time.perf_counter()
+        try:
+            results = self.batch_fn([audio for audio, _ in jobs], language)
+        except Exception as e:
+            print(f"❌ Batched inference failed ({len(jobs)} clips): {e}")
+            with self._lock:
+                self._stats["errors"] += 1
+            for _, future in jobs:
+                future.set_exception(e)
+            return
+
+        results = list(results)
+        for (_, future), text in zip(jobs, results):
+            future.set_result(text)
+        if len(results) != len(jobs):
+            print(f"❌ Batched inference returned {len(results)} result(s) for {len(jobs)} clip(s)")
+            with self._lock:
+                self._stats["errors"] += 1
+            for _, future in jobs[len(results):]:
+                future.set_exception(RuntimeError(f"batch returned {len(results)} result(s) for {len(jobs)} clip(s)"))
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["clips"] += len(jobs)
+            self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(jobs))
+        print(f"🧮 Batched inference: {len(jobs)} clip(s) in {(time.perf_counter() - start) * 1000:.0f}ms")
@@ -0,0 +1,152 @@
+"""
+Two-tier cache of intent results.
+
+    memory  LRU keyed by the exact utterance, in front of the whole router:
+            a repeated phrase skips the rule table, spaCy and Ollama. Exact
+            text, because rule results depend on casing and punctuation.
+    disk    SQLite table of Ollama results keyed by normalized text
+            (casefolded, whitespace collapsed, surrounding punctuation
+            dropped), so they survive restarts. Rows carry the version of
+            the rule set and model that produced them plus an expiry;
+            rows from another version are ignored and purged on open.
+
+Failed Ollama lookups ('unknown') are only cached in memory, briefly, so a
+phrase nobody can parse doesn't cost a 10s LLM call on every repeat.
+"""
+import copy
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_utterance(text):
+    """Key for the disk tier: casefolded, single-spaced, no surrounding punctuation"""
+    return re.sub(r"^[\W_]+|[\W_]+$", "", " ".join(text.casefold().split()))
+
+
+class IntentCache:
+    """
+    Args:
+        max_entries: memory tier size
+        persist_path: optional SQLite file for the disk tier
+        ttl_sec: lifetime of disk-tier (LLM) results
+        negative_ttl_sec: lifetime of cached 'unknown' results (memory only)
+        version: rule set / model version; disk rows from other versions are ignored
+    """
+
+    def __init__(self, max_entries=2048, persist_path=None, ttl_sec=30 * 86400,
+                 negative_ttl_sec=300, version=""):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.negative_ttl_sec = negative_ttl_sec
+        self.version = version
+        self._entries = OrderedDict()  # text -> (intent, entities, source, expires_at or None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.purged = 0
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intents (key TEXT, version TEXT, intent TEXT, entities TEXT, "
+                "created REAL, expires REAL, PRIMARY KEY (key, version))"
+            )
+            cursor = self._db.execute(
+                "DELETE FROM intents WHERE version != ? OR expires < ?", (self.version, time.time())
+            )
+            self.purged = cursor.rowcount
+            self._db.commit()
+
+    def get(self, text):
+        """Memory tier: (intent, entities, source) for this exact utterance, or None"""
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is not None:
+                intent, entities, source, expires_at = entry
+                if expires_at is None or expires_at > time.time():
+                    self._entries.move_to_end(text)
+                    self.hits += 1
+                    return intent, copy.deepcopy(entities), source
+                del self._entries[text]
+                self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, text, intent, entities, source, ttl_sec=None):
+        """Memory tier insert; ttl_sec=None keeps the entry until evicted"""
+        with self._lock:
+            expires_at = time.time() + ttl_sec if ttl_sec is not None else None
+            self._entries[text] = (intent, copy.deepcopy(entities), source, expires_at)
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put_unknown(self, text):
+        """Remember (briefly) that nothing could parse this utterance"""
+        self.put(text, "unknown", {}, "negative", ttl_sec=self.negative_ttl_sec)
+
+    def get_persistent(self, text):
+        """Disk tier: (intent, entities) from a previous LLM call on the same normalized text, or None"""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT intent, entities FROM intents WHERE key = ? AND version = ? AND expires > ?",
+                (normalize_utterance(text), self.version, time.time()),
+            ).fetchone()
+            if row is None:
+                self.disk_misses += 1
+                return None
+            self.disk_hits += 1
+            return row[0], json.loads(row[1])
+
+    def put_persistent(self, text, intent, entities):
+        if self._db is None:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO intents (key, version, intent, entities, created, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_utterance(text), self.version, intent, json.dumps(entities), now, now + self.ttl_sec),
+            )
+            self._db.commit()
+
+    def clear(self):
+        """Drop the memory tier (the disk tier is versioned instead)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_rows = None
+            if self._db is not None:
+                disk_rows = self._db.execute(
+                    "SELECT COUNT(*) FROM intents WHERE version = ?", (self.version,)
+                ).fetchone()[0]
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None,
+                "disk_rows": disk_rows,
+                "disk_hits": self.disk_hits,
+                "disk_misses": self.disk_misses,
+                "purged_on_open": self.purged,
+                "ttl_sec": self.ttl_sec,
+            }
@@ -0,0 +1,255 @@
+"""
+Deadline-aware LLM fallback for intent detection.
+
+The Ollama fallback is the one slow step in parsing a command, and when
+Ollama is down or overloaded it used to hold the request for its whole
+10s timeout. Here every fallback runs under the request's latency budget:
+
+    budget      the call gets whatever time is left before the request's
+                deadline; a request with no time left answers 'unknown'
+                at once (budget_exhausted), one whose call runs out of
+                time is an overrun
+    breaker     after failure_threshold consecutive failures (unreachable,
+                timeout, HTTP error) the circuit opens and fallbacks answer
+                'unknown' without calling; a background probe checks the
+                server every reset_after_sec and, once it answers, a single
+                real call is let through (half-open) to close the circuit
+    hedging     optionally, utterances that don't look like commands start
+                their LLM call in parallel with the rule tier; if a rule
+                matches after all, the call still finishes in the background
+                and its result lands in the cache
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+LATENCY_SAMPLES = 256
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+
+class CircuitBreaker:
+    """
+    Args:
+        failure_threshold: consecutive failures that open the circuit
+        reset_after_sec: time between probes while open
+        probe: optional callable() -> bool (True = reachable), run in the
+            background while open; without it the next call after
+            reset_after_sec is the trial
+    """
+
+    def __init__(self, failure_threshold=3, reset_after_sec=30.0, probe=None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_after_sec = reset_after_sec
+        self.probe = probe
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._next_probe_at = None
+        self._probing = False
+        self._trial_in_flight = False
+        self.counts = {"allowed": 0, "short_circuited": 0, "successes": 0, "failures": 0,
+                       "opened": 0, "probes": 0, "probe_failures": 0}
+
+    def allow(self):
+        """True if a call may go out now"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self._next_probe_at:
+                if self.probe is None:
+                    self.state = HALF_OPEN
+                elif not self._probing:
+                    self._probing = True
+                    threading.Thread(target=self._run_probe, daemon=True).start()
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._trial_in_flight):
+                self._trial_in_flight = self.state == HALF_OPEN
+                self.counts["allowed"] += 1
+                return True
+            self.counts["short_circuited"] += 1
+            return False
+
+    def _run_probe(self):
+        try:
+            reachable = bool(self.probe())
+        except Exception:
+            reachable = False
+        with self._lock:
+            self._probing = False
+            self.counts["probes"] += 1
+            if self.state != OPEN:
+                return
+            if reachable:
+                self.state = HALF_OPEN
+                print("🔌 LLM fallback: probe succeeded, circuit half-open")
+            else:
+                self.counts["probe_failures"] += 1
+                self._next_probe_at = time.monotonic() + self.reset_after_sec
+
+    def record_success(self):
+        with self._lock:
+            self.counts["successes"] += 1
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                print("✅ LLM fallback: circuit closed")
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.counts["failures"] += 1
+            self._consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self._consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self.counts["opened"] += 1
+                self._opened_at = time.monotonic()
+                self._next_probe_at = self._opened_at + self.reset_after_sec
+                print(f"🚫 LLM fallback: circuit open after {self._consecutive_failures} failure(s)")
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self.counts,
+                state=self.state,
+                consecutive_failures=self._consecutive_failures,
+                open_for_sec=round(time.monotonic() - self._opened_at, 1) if self.state != CLOSED and self._opened_at else None,
+                failure_threshold=self.failure_threshold,
+                reset_after_sec=self.reset_after_sec,
+            )
+
+
+class DeadlineFallback:
+    """
+    Args:
+        call_fn: callable(text, timeout_sec) -> (intent, entities); raises on failure
+        lookup_fn: optional callable(text) -> (intent, entities) or None, tried
+            before the breaker and the budget (e.g. the persistent cache)
+        breaker: CircuitBreaker guarding call_fn
+        is_failure: callable(exception) -> True if it counts against the breaker
+        is_timeout: callable(exception) -> True if it was the budget running out
+        budget_sec: default latency budget of a request
+        min_call_sec: don't start a call with less time than this left
+        hedge_workers: threads for hedged calls (0 disables hedging)
+    """
+
+    def __init__(self, call_fn, lookup_fn=None, breaker=None, is_failure=None, is_timeout=None,
+                 budget_sec=3.0, min_call_sec=0.25, hedge_workers=0):
+        self.call_fn = call_fn
+        self.lookup_fn = lookup_fn
+        self.breaker = breaker or CircuitBreaker()
+        self.is_failure = is_failure or (lambda e: True)
+        self.is_timeout = is_timeout or (lambda e: False)
+        self.budget_sec = budget_sec
+        self.min_call_sec = min_call_sec
+        self._executor = ThreadPoolExecutor(hedge_workers, thread_name_prefix="llm-hedge") if hedge_workers > 0 else None
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.counts = {"requests": 0, "lookup_hits": 0, "calls": 0, "answered": 0, "errors": 0,
+                       "short_circuited": 0, "budget_exhausted": 0, "overruns": 0,
+                       "hedges_started": 0, "hedges_used": 0, "hedges_wasted": 0}
+
+    @property
+    def hedging(self):
+        return self._executor is not None
+
+    def deadline(self, budget_sec=None):
+        """Absolute (monotonic) deadline for a request starting now"""
+        return time.monotonic() + (self.budget_sec if budget_sec is None else budget_sec)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _call(self, text, deadline):
+        """Breaker + budget around one call; returns (intent, entities) or None"""
+        remaining = deadline - time.monotonic()
+        if remaining < self.min_call_sec:
+            self._count("budget_exhausted")
+            return None
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            return None
+        self._count("calls")
+        started = time.monotonic()
+        try:
+            result = self.call_fn(text, remaining)
+        except Exception as e:
+            if self.is_failure(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # it answered, just not usefully
+            self._count("overruns" if self.is_timeout(e) else "errors")
+            print(f"⚠️ LLM fallback failed: {e}")
+            return None
+        self.breaker.record_success()
+        with self._lock:
+            self._latencies_ms.append((time.monotonic() - started) * 1000)
+            self.counts["answered"] += 1
+            if time.monotonic() > deadline:
+                self.counts["overruns"] += 1
+        return result
+
+    def hedge(self, text, deadline):
+        """Start the call now, in parallel with the rule tier; returns a future or None"""
+        if self._executor is None:
+            return None
+        if self.lookup_fn is not None and self.lookup_fn(text) is not None:
+            return None  # resolve() will answer from the lookup
+        self._count("hedges_started")
+        return self._executor.submit(self._call, text, deadline)
+
+    def abandon(self, future):
+        """A rule matched: the hedged call's answer isn't needed (it still fills the cache)"""
+        if future is not None:
+            self._count("hedges_wasted")
+
+    def resolve(self, text, deadline, hedged=None):
+        """
+        The fallback answer within the deadline.
+
+        Returns:
+            (intent, entities), or None if there was no answer in time
+        """
+        self._count("requests")
+        if self.lookup_fn is not None:
+            cached = self.lookup_fn(text)
+            if cached is not None:
+                self._count("lookup_hits")
+                return cached
+        if hedged is not None:
+            self._count("hedges_used")
+            try:
+                result = hedged.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeout:
+                # Still running: it will land in the cache for the next repeat
+                self._count("overruns")
+                print("⏱️ LLM fallback: budget spent waiting on the hedged call")
+                result = None
+        else:
+            result = self._call(text, deadline)
+        return result
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies_ms)
+            counts = dict(self.counts)
+        return dict(
+            counts,
+            budget_sec=self.budget_sec,
+            hedging=self.hedging,
+            latency_p50_ms=_percentile(latencies, 0.50),
+            latency_p95_ms=_percentile(latencies, 0.95),
+            breaker=self.breaker.stats(),
+        )
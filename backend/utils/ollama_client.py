@@ -0,0 +1,191 @@
+"""
+Ollama client for the intent fallback.
+
+What makes a fallback call cheap:
+
+    pooled connections  one requests.Session per client, so calls reuse an
+                        open keep-alive connection instead of a new TCP setup
+    keep_alive          Ollama keeps the model loaded between calls instead
+                        of unloading it after 5 idle minutes
+    static system       instructions and examples are a fixed system prompt,
+    prompt              so Ollama can reuse the evaluated prompt prefix;
+                        each call only adds the utterance
+    format=json         output constrained to JSON, capped by num_predict
+    streaming           tokens are scanned as they arrive and the call
+                        returns as soon as the top-level object closes
+                        (the stream is then closed, which stops generation)
+"""
+import json
+import time
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # optional: only the LLM fallback needs it
+    requests = None
+
+DEFAULT_URL = "http://localhost:11434"
+
+
+class OllamaError(Exception):
+    """A failed Ollama call; kind is 'unavailable', 'timeout', 'http' or 'parse'"""
+
+    def __init__(self, kind, message):
+        super().__init__(f"Ollama {kind}: {message}")
+        self.kind = kind
+
+
+class JsonObjectScanner:
+    """
+    Finds the first complete top-level JSON object in streamed text.
+
+    feed() takes chunks as they arrive and returns the object's text once
+    its closing brace has been seen (braces inside strings don't count).
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.length = 0
+
+    def feed(self, chunk):
+        base = self.length
+        self.buffer.append(chunk)
+        self.length += len(chunk)
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.start is None:
+                    self.start = base + i
+                self.depth += 1
+            elif ch == "}" and self.start is not None:
+                self.depth -= 1
+                if self.depth == 0:
+                    return "".join(self.buffer)[self.start:base + i + 1]
+        return None
+
+    def text(self):
+        return "".join(self.buffer)
+
+
+class OllamaClient:
+    """
+    Args:
+        model: Ollama model name
+        base_url: Ollama server
+        keep_alive: how long Ollama keeps the model loaded after a call
+        num_predict: cap on generated tokens
+        temperature: sampling temperature
+        timeout: default seconds for a whole call
+        pool_size: keep-alive connections kept open
+    """
+
+    def __init__(self, model, base_url=DEFAULT_URL, keep_alive="30m", num_predict=96,
+                 temperature=0.1, timeout=10.0, pool_size=4):
+        if requests is None:
+            raise OllamaError("unavailable", "the requests package is not installed (pip install requests)")
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.num_predict = num_predict
+        self.temperature = temperature
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate_json(self, system, prompt, timeout=None):
+        """
+        One constrained, streamed generation.
+
+        Returns:
+            (parsed object, timings dict: ttft_ms, total_ms, chunks, early_exit)
+        Raises:
+            OllamaError: server unreachable, timed out, HTTP error, or no JSON object
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+        body = {
+            "model": self.model,
+            "system": system,
+            "prompt": prompt,
+            "format": "json",
+            "stream": True,
+            "keep_alive": self.keep_alive,
+            "options": {"temperature": self.temperature, "num_predict": self.num_predict},
+        }
+        timings = {"ttft_ms": None, "total_ms": None, "chunks": 0, "early_exit": False}
+        scanner = JsonObjectScanner()
+        found = None
+        try:
+            # (connect, read) timeouts; the overall deadline is checked per chunk
+            with self.session.post(f"{self.base_url}/api/generate", json=body, stream=True,
+                                   timeout=(min(timeout, 3.0), timeout)) as response:
+                if response.status_code != 200:
+                    raise OllamaError("http", f"{response.status_code} {response.text[:200]}")
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event.get("error"):
+                        raise OllamaError("http", event["error"])
+                    piece = event.get("response", "")
+                    if piece:
+                        timings["chunks"] += 1
+                        if timings["ttft_ms"] is None:
+                            timings["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        found = scanner.feed(piece)
+                    if found is not None:
+                        # Whatever follows the object is whitespace at best; stop generating it
+                        timings["early_exit"] = not event.get("done", False)
+                        break
+                    if event.get("done"):
+                        break
+                    if time.perf_counter() > deadline:
+                        raise OllamaError("timeout", f"no complete JSON object within {timeout}s")
+        except requests.exceptions.Timeout as e:
+            raise OllamaError("timeout", str(e))
+        except requests.exceptions.RequestException as e:
+            raise OllamaError("unavailable", str(e))
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        if found is None:
+            raise OllamaError("parse", f"no JSON object in response: {scanner.text()[:200]!r}")
+        try:
+            return json.loads(found), timings
+        except ValueError as e:
+            raise OllamaError("parse", f"{e}: {found[:200]!r}")
+
+    def warm(self, timeout=None):
+        """Load the model ahead of the first real call (an empty generate only loads it)"""
+        try:
+            self.session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": self.keep_alive},
+                timeout=self.timeout if timeout is None else timeout,
+            ).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise OllamaError("unavailable", str(e))
+
+    def ping(self, timeout=1.0):
+        """True if the server answers (cheap: lists local models, loads nothing)"""
+        try:
+            return self.session.get(f"{self.base_url}/api/tags", timeout=timeout).ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,94 @@
+"""
+Fixed-capacity byte ring buffer for per-session audio.
+
+Each socket session gets one buffer, allocated once at connect time. Chunks
+are copied in exactly once (from the Socket.IO binary attachment), and
+readers get a memoryview / NumPy view of the buffered bytes instead of a
+bytes() copy. The backing array comes from np.empty, so pages are only
+committed as they are first written; high_water_bytes tracks how much of
+the capacity a session has actually touched.
+"""
+import threading
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Args:
+        capacity: maximum number of buffered bytes; when full, the oldest
+            bytes are overwritten (and counted in dropped_bytes)
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._data = np.empty(capacity, dtype=np.uint8)
+        self._start = 0
+        self._size = 0
+        self.lock = threading.Lock()
+        self.high_water_bytes = 0
+        self.dropped_bytes = 0
+        self.total_bytes = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, chunk):
+        """Append a bytes-like chunk (bytes, bytearray, memoryview)"""
+        src = np.frombuffer(chunk, dtype=np.uint8)
+        self.total_bytes += len(src)
+        if len(src) >= self.capacity:
+            # Only the newest `capacity` bytes survive
+            self.dropped_bytes += self._size + len(src) - self.capacity
+            self._data[:] = src[len(src) - self.capacity:]
+            self._start, self._size = 0, self.capacity
+            self.high_water_bytes = self.capacity
+            return
+
+        overflow = self._size + len(src) - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._size -= overflow
+            self.dropped_bytes += overflow
+
+        end = (self._start + self._size) % self.capacity
+        first = min(len(src), self.capacity - end)
+        self._data[end:end + first] = src[:first]
+        if first < len(src):
+            self._data[:len(src) - first] = src[first:]
+        self._size += len(src)
+        self.high_water_bytes = max(self.high_water_bytes, min(self.capacity, end + len(src)))
+
+    def _linearize(self):
+        """Move wrapped contents to the front so they can be viewed contiguously (overflow only)"""
+        if self._start + self._size > self.capacity:
+            self._data[:] = np.roll(self._data, -self._start)
+            self._start = 0
+
+    def view(self):
+        """Contiguous memoryview of the buffered bytes; valid until the next write/clear"""
+        self._linearize()
+        return memoryview(self._data[self._start:self._start + self._size])
+
+    def as_array(self, dtype=np.int16):
+        """NumPy view of the buffered bytes as dtype (no copy)"""
+        usable = self._size - self._size % np.dtype(dtype).itemsize
+        self._linearize()
+        return self._data[self._start:self._start + usable].view(dtype)
+
+    def owns(self, array):
+        """True if array aliases this buffer's memory (so it must be copied before clear())"""
+        return isinstance(array, np.ndarray) and np.shares_memory(array, self._data)
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def stats(self):
+        return {
+            "capacity_bytes": self.capacity,
+            "used_bytes": self._size,
+            "high_water_bytes": self.high_water_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "total_bytes": self.total_bytes,
+        }
@@ -0,0 +1,189 @@
+"""
+Per-session job queues for socket transcription work.
+
+Socket handlers only ingest audio and submit a job; the job runs on a
+background task owned by that session, so a slow inference never blocks
+event processing. Jobs of one session run one at a time in submission
+order, and every job gets a sequence number the result events carry.
+
+Each session queue holds at most max_pending jobs. When it is full the
+overflow policy decides what happens to a new job:
+
+    merge        fold it into the newest pending job (merge_fn combines the payloads)
+    drop_oldest  discard the oldest pending job to make room
+    reject       refuse the new job
+
+Terminal jobs (is_terminal, e.g. the end of an utterance) are never shed:
+they are queued past the cap, and drop_oldest only discards non-terminal
+jobs. A job may carry 'release': a callable freeing what the job owns (a
+decoder process, a spool file). It runs exactly once, when the job has
+run, or when it is dropped, rejected or discarded by close().
+"""
+import threading
+import time
+from collections import deque
+
+OVERFLOW_POLICIES = ("merge", "drop_oldest", "reject")
+
+
+class _SessionQueue:
+    def __init__(self):
+        self.pending = deque()
+        self.running = False
+        self.closed = False
+        self.next_seq = 1
+        self.submitted = 0
+        self.completed = 0
+        self.merged = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed = 0
+
+
+class SessionJobs:
+    """
+    Args:
+        run_fn: callable(sid, job) executed on the session's background task
+        max_pending: queued (not yet running) jobs allowed per session
+        overflow: one of OVERFLOW_POLICIES
+        merge_fn: callable(pending_job, new_job) -> True if new_job was folded in
+        on_drop: callable(sid, job, reason) for dropped/rejected jobs
+        on_error: callable(sid, job, exception) when run_fn raises
+        spawn: callable(fn, *args) starting a background task (default: daemon thread)
+        is_terminal: callable(job) -> True for jobs that must not be shed
+    """
+
+    def __init__(self, run_fn, max_pending=2, overflow="merge", merge_fn=None,
+                 on_drop=None, on_error=None, spawn=None, is_terminal=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}'. Available: {', '.join(OVERFLOW_POLICIES)}")
+        self.run_fn = run_fn
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.merge_fn = merge_fn
+        self.on_drop = on_drop
+        self.on_error = on_error
+        self.spawn = spawn or self._spawn_thread
+        self.is_terminal = is_terminal or (lambda job: False)
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _spawn_thread(fn, *args):
+        threading.Thread(target=fn, args=args, daemon=True).start()
+
+    @staticmethod
+    def _release(job):
+        release = job.pop('release', None)
+        if release is not None:
+            try:
+                release()
+            except Exception as e:
+                print(f"⚠️ Releasing job #{job['seq']} failed: {e}")
+
+    def submit(self, sid, job):
+        """
+        Queue a job (a dict; 'seq', 'seqs' and 'submitted_at' are filled in here).
+
+        Returns:
+            (seq, status) with status 'queued', 'merged' or 'rejected'
+        """
+        dropped = None
+        with self._lock:
+            queue = self._queues.get(sid)
+            if queue is None:
+                queue = self._queues[sid] = _SessionQueue()
+            job['seq'] = queue.next_seq
+            job['seqs'] = [job['seq']]
+            job['submitted_at'] = time.perf_counter()
+            queue.next_seq += 1
+            queue.submitted += 1
+
+            status = "queued"
+            if len(queue.pending) >= self.max_pending:
+                newest = queue.pending[-1] if queue.pending else None
+                sheddable = [pending for pending in queue.pending if not self.is_terminal(pending)]
+                if self.overflow == "merge" and newest is not None and self.merge_fn and self.merge_fn(newest, job):
+                    newest['seqs'].extend(job['seqs'])
+                    newest['seq'] = job['seq']
+                    if job.get('release') is not None and newest.get('release') is None:
+                        newest['release'] = job.pop('release')  # the pending job now owns it
+                    queue.merged += 1
+                    status = "merged"
+                elif self.is_terminal(job):
+                    pass  # over the cap rather than lose the end of an utterance
+                elif self.overflow == "drop_oldest" and sheddable:
+                    dropped = sheddable[0]
+                    queue.pending.remove(dropped)
+                    queue.dropped += 1
+                else:
+                    queue.rejected += 1
+                    status = "rejected"
+
+            if status == "queued":
+                queue.pending.append(job)
+                if not queue.running:
+                    queue.running = True
+                    self.spawn(self._drain, sid, queue)
+
+        if dropped is not None:
+            self._release(dropped)
+            if self.on_drop:
+                self.on_drop(sid, dropped, "dropped_oldest")
+        if status == "rejected":
+            self._release(job)
+            if self.on_drop:
+                self.on_drop(sid, job, "rejected")
+        return job['seq'], status
+
+    def _drain(self, sid, queue):
+        """Run the session's jobs one after another until its queue is empty"""
+        while True:
+            with self._lock:
+                if not queue.pending or queue.closed:
+                    queue.running = False
+                    return
+                job = queue.pending.popleft()
+            try:
+                self.run_fn(sid, job)
+            except Exception as e:
+                with self._lock:
+                    queue.failed += 1
+                if self.on_error:
+                    self.on_error(sid, job, e)
+            finally:
+                self._release(job)
+            with self._lock:
+                queue.completed += 1
+
+    def close(self, sid):
+        """Forget a session; pending jobs are discarded (and released), a running job finishes"""
+        with self._lock:
+            queue = self._queues.pop(sid, None)
+            discarded = []
+            if queue is not None:
+                queue.closed = True
+                discarded = list(queue.pending)
+                queue.pending.clear()
+        for job in discarded:
+            self._release(job)
+
+    def stats(self, sid=None):
+        with self._lock:
+            if sid is not None:
+                items = [(sid, self._queues[sid])] if sid in self._queues else []
+            else:
+                items = list(self._queues.items())
+            return {
+                s: {
+                    "pending": len(q.pending),
+                    "running": q.running,
+                    "submitted": q.submitted,
+                    "completed": q.completed,
+                    "merged": q.merged,
+                    "dropped": q.dropped,
+                    "rejected": q.rejected,
+                    "failed": q.failed,
+                }
+                for s, q in items
+            }
@@ -0,0 +1,260 @@
+"""
+Session metadata stores with expiry.
+
+A session store tracks which socket sessions exist, when each was last
+active and a small metadata dict (language, format, owning worker...).
+Per-session resources that can't leave the process (ring buffers, decoders,
+job queues) stay in demo.py and are released when the store reports the
+session expired.
+
+    InProcessSessionStore  dict + min-heap of deadlines; expiry pops only
+                           what is due instead of scanning every session
+    SqliteSessionStore     shared SQLite (WAL) file, so several demo.py
+                           workers behind a load balancer see one session
+                           table; each worker reaps only its own sessions
+"""
+import heapq
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionStore(ABC):
+    """
+    Interface shared by the store implementations.
+
+    Args:
+        ttl_sec: a session expires this long after its last touch()
+    """
+
+    backend = None
+
+    def __init__(self, ttl_sec):
+        self.ttl_sec = ttl_sec
+
+    @abstractmethod
+    def touch(self, sid, **meta):
+        """Create or refresh a session, merging any metadata given"""
+
+    @abstractmethod
+    def get(self, sid):
+        """Metadata dict (plus last_seen) for a live session, or None"""
+
+    @abstractmethod
+    def remove(self, sid):
+        """Forget a session"""
+
+    @abstractmethod
+    def pop_expired(self, now=None):
+        """Remove and return the sids whose deadline has passed"""
+
+    @abstractmethod
+    def next_expiry(self, now=None):
+        """Seconds until the next session is due to expire (None if there are none)"""
+
+    @abstractmethod
+    def __len__(self):
+        """Number of live sessions"""
+
+    def stats(self):
+        return {"backend": self.backend, "sessions": len(self), "ttl_sec": self.ttl_sec}
+
+
+class InProcessSessionStore(SessionStore):
+    """
+    Thread-safe dict of sessions with a min-heap of (deadline, sid).
+
+    touch() pushes a new heap entry instead of updating the old one; stale
+    entries are skipped when popped and the heap is rebuilt once they
+    outnumber live sessions.
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl_sec):
+        super().__init__(ttl_sec)
+        self._sessions = {}  # sid -> {"deadline": ..., "last_seen": ..., "meta": {...}}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def touch(self, sid, **meta):
+        now = time.time()
+        deadline = now + self.ttl_sec
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                session = self._sessions[sid] = {"meta": {}}
+            session["last_seen"] = now
+            session["deadline"] = deadline
+            session["meta"].update(meta)
+            heapq.heappush(self._heap, (deadline, sid))
+            if len(self._heap) > 2 * len(self._sessions) + 1024:
+                self._compact()
+
+    def _compact(self):
+        self._heap = [(s["deadline"], sid) for sid, s in self._sessions.items()]
+        heapq.heapify(self._heap)
+
+    def get(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                return None
+            return dict(session["meta"], last_seen=session["last_seen"])
+
+    def remove(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def pop_expired(self, now=None):
+        now = time.time() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, sid = heapq.heappop(self._heap)
+                session = self._sessions.get(sid)
+                # Removed, or touched again since this entry was pushed
+                if session is None or session["deadline"] != deadline:
+                    continue
+                del self._sessions[sid]
+                expired.append(sid)
+        return expired
+
+    def next_expiry(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._heap:
+                deadline, sid = self._heap[0]
+                session = self._sessions.get(sid)
+                if session is not None and session["deadline"] == deadline:
+                    return max(0.0, deadline - now)
+                heapq.heappop(self._heap)
+        return None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self):
+        stats = super().stats()
+        stats["heap_entries"] = len(self._heap)
+        return stats
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Session table in a SQLite file shared by every worker on the host.
+
+    Args:
+        path: database file (created if missing)
+        worker_id: owner recorded on sessions this process touches; only the
+            owner reaps them, since only it holds their in-process resources
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, ttl_sec, path, worker_id=None):
+        super().__init__(ttl_sec)
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "sid TEXT PRIMARY KEY, worker TEXT, last_seen REAL, deadline REAL, meta TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS sessions_deadline ON sessions (worker, deadline)")
+
+    def touch(self, sid, **meta):
+        now = time.time()
+        with self._lock:
+            if meta:
+                row = self._db.execute("SELECT meta FROM sessions WHERE sid = ?", (sid,)).fetchone()
+                merged = dict(json.loads(row[0]) if row else {}, **meta)
+                self._db.execute(
+                    "INSERT INTO sessions (sid, worker, last_seen, deadline, meta) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(sid) DO UPDATE SET worker = excluded.worker, last_seen = excluded.last_seen, "
+                    "deadline = excluded.deadline, meta = excluded.meta",
+                    (sid, self.worker_id, now, now + self.ttl_sec, json.dumps(merged)),
+                )
+            else:
+                self._db.execute(
+                    "INSERT INTO sessions (sid, worker, last_seen, deadline, meta) VALUES (?, ?, ?, ?, '{}') "
+                    "ON CONFLICT(sid) DO UPDATE SET worker = excluded.worker, last_seen = excluded.last_seen, "
+                    "deadline = excluded.deadline",
+                    (sid, self.worker_id, now, now + self.ttl_sec),
+                )
+
+    def get(self, sid):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT worker, last_seen, meta FROM sessions WHERE sid = ? AND deadline > ?", (sid, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row[2]), worker=row[0], last_seen=row[1])
+
+    def remove(self, sid):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def pop_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT sid FROM sessions WHERE worker = ? AND deadline <= ?", (self.worker_id, now)
+                ).fetchall()
+                self._db.execute("DELETE FROM sessions WHERE worker = ? AND deadline <= ?", (self.worker_id, now))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def next_expiry(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(deadline) FROM sessions WHERE worker = ?", (self.worker_id,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM sessions WHERE worker = ?", (self.worker_id,)
+            ).fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT worker, COUNT(*) FROM sessions WHERE deadline > ? GROUP BY worker", (time.time(),)
+            ).fetchall()
+        stats.update({"path": self.path, "worker_id": self.worker_id, "workers": dict(rows)})
+        return stats
+
+
+def create_session_store(backend, ttl_sec, path=None):
+    """Build the store named by SESSION_STORE ('memory' or 'sqlite')"""
+    if backend == "memory":
+        return InProcessSessionStore(ttl_sec)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("SESSION_STORE=sqlite needs SESSION_STORE_PATH")
+        return SqliteSessionStore(ttl_sec, path)
+    raise ValueError(f"Unknown SESSION_STORE '{backend}'. Available: memory, sqlite")
@@ -0,0 +1,113 @@
+"""
+Background startup for heavy components (ASR model, spaCy).
+
+Each registered component is loaded and warmed up on its own thread so the
+server can bind immediately and components load in parallel. The registry
+keeps per-component state and timings for the /healthz and /readyz endpoints;
+request handlers call wait_ready() so nothing runs against a cold component.
+"""
+import threading
+import time
+
+
+class ComponentNotReady(Exception):
+    """Raised when a component is still loading after the caller's timeout"""
+
+    def __init__(self, name, state):
+        super().__init__(f"{name} is not ready yet (state: {state})")
+        self.name = name
+        self.state = state
+
+
+class _Component:
+    def __init__(self, name, load_fn, warmup_fn, required):
+        self.name = name
+        self.load_fn = load_fn
+        self.warmup_fn = warmup_fn
+        self.required = required
+        self.state = "pending"
+        self.error = None
+        self.exception = None
+        self.load_sec = None
+        self.warmup_sec = None
+        self.ready_event = threading.Event()
+
+
+class ComponentRegistry:
+    def __init__(self):
+        self._components = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.created_at = time.time()
+
+    def register(self, name, load_fn, warmup_fn=None, required=True):
+        """Register a component; required components gate /readyz"""
+        self._components[name] = _Component(name, load_fn, warmup_fn, required)
+
+    def start(self):
+        """Load every component in parallel on background threads (idempotent)"""
+        with self._lock:
+            if self._started:
+                return False
+            self._started = True
+        for component in self._components.values():
+            threading.Thread(target=self._load, args=(component,),
+                             name=f"startup-{component.name}", daemon=True).start()
+        return True
+
+    def _load(self, component):
+        component.state = "loading"
+        try:
+            start = time.perf_counter()
+            component.load_fn()
+            component.load_sec = round(time.perf_counter() - start, 3)
+
+            if component.warmup_fn is not None:
+                component.state = "warming"
+                start = time.perf_counter()
+                component.warmup_fn()
+                component.warmup_sec = round(time.perf_counter() - start, 3)
+
+            component.state = "ready"
+            print(f"✅ {component.name} ready (load {component.load_sec}s, warm-up {component.warmup_sec or 0}s)")
+        except Exception as e:
+            component.state = "failed"
+            component.error = f"{type(e).__name__}: {e}"
+            component.exception = e
+            print(f"❌ {component.name} failed to load: {component.error}")
+        finally:
+            component.ready_event.set()
+
+    def is_ready(self, name=None):
+        if name is not None:
+            return self._components[name].state == "ready"
+        return all(c.state == "ready" for c in self._components.values() if c.required)
+
+    def wait_ready(self, name, timeout=None):
+        """
+        Block until a component is ready.
+
+        Raises ComponentNotReady on timeout, or re-raises the component's
+        load error if it failed.
+        """
+        component = self._components[name]
+        if not component.ready_event.wait(timeout):
+            raise ComponentNotReady(name, component.state)
+        if component.state == "failed":
+            raise component.exception
+
+    def snapshot(self):
+        return {
+            "ready": self.is_ready(),
+            "uptime_sec": round(time.time() - self.created_at, 1),
+            "components": {
+                c.name: {
+                    "state": c.state,
+                    "required": c.required,
+                    "load_sec": c.load_sec,
+                    "warmup_sec": c.warmup_sec,
+                    "error": c.error,
+                }
+                for c in self._components.values()
+            },
+        }
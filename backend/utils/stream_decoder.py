@@ -0,0 +1,123 @@
+"""
+Long-lived streaming decoder for compressed socket audio (WebM/Opus, Ogg, ...).
+
+One ffmpeg process per session: container bytes from consecutive
+audio_chunk events are written to its stdin as they arrive, and a reader
+thread collects the continuous 16kHz mono s16le output. Mid-stream
+fragments are never decoded on their own, and there is no process spawn
+per flush.
+"""
+import os
+import subprocess
+import threading
+import time
+
+from utils.audio_io import TARGET_SAMPLE_RATE, pcm_to_float32
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class StreamingDecoder:
+    """
+    Args:
+        sample_rate: output sample rate
+        input_format: ffmpeg demuxer name (None = probe from the first bytes)
+    """
+
+    def __init__(self, sample_rate=TARGET_SAMPLE_RATE, input_format=None):
+        cmd = ["ffmpeg", "-nostdin", "-loglevel", "error",
+               # Start decoding after the container header instead of buffering seconds of input
+               "-probesize", "4096", "-analyzeduration", "0", "-fflags", "+nobuffer"]
+        if input_format:
+            cmd += ["-f", input_format]
+        cmd += ["-i", "pipe:0", "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le",
+                "-ar", str(sample_rate), "-flush_packets", "1", "pipe:1"]
+        try:
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg not found. Install ffmpeg and ensure it is on PATH.")
+        self.sample_rate = sample_rate
+        self.created_at = time.time()
+        self.fed_bytes = 0
+        self.fed_since_flush = 0
+        self.decoded_bytes = 0
+        self._pcm = bytearray()
+        self._stderr = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        fd = self.proc.stdout.fileno()
+        while True:
+            data = os.read(fd, READ_CHUNK_BYTES)
+            if not data:
+                return
+            with self._lock:
+                self._pcm.extend(data)
+                self.decoded_bytes += len(data)
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            self._stderr.extend(line)
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def _error(self):
+        message = self._stderr.decode(errors="replace").strip()
+        return RuntimeError(f"Streaming decoder exited (code {self.proc.returncode}): {message or 'no output'}")
+
+    def feed(self, chunk):
+        """Write the next container bytes; raises RuntimeError if ffmpeg has died"""
+        try:
+            self.proc.stdin.write(chunk)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            self.proc.wait()
+            raise self._error()
+        self.fed_bytes += len(chunk)
+        self.fed_since_flush += len(chunk)
+
+    def take_pcm(self):
+        """Return (and remove) everything decoded so far as a float32 array"""
+        self.fed_since_flush = 0
+        with self._lock:
+            usable = len(self._pcm) - len(self._pcm) % 2
+            raw = self._pcm[:usable]
+            del self._pcm[:usable]
+        return pcm_to_float32(raw, bits=16)
+
+    def close(self, timeout=5.0):
+        """End of stream: let ffmpeg flush, then return the remaining PCM"""
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self._reader.join(timeout=1.0)
+        if self.proc.returncode not in (0, None) and not self._pcm:
+            raise self._error()
+        return self.take_pcm()
+
+    def terminate(self):
+        """Tear down without collecting output (disconnect / stale session)"""
+        if self.alive:
+            self.proc.kill()
+            self.proc.wait()
+
+    def stats(self):
+        return {
+            "pid": self.proc.pid,
+            "alive": self.alive,
+            "age_sec": round(time.time() - self.created_at, 1),
+            "fed_bytes": self.fed_bytes,
+            "decoded_sec": round(self.decoded_bytes / 2 / self.sample_rate, 2),
+            "pending_pcm_bytes": len(self._pcm),
+        }
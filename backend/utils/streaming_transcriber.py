@@ -0,0 +1,147 @@
+"""
+Incremental (streaming) transcription for a single socket session.
+
+Audio is appended as chunks arrive and the uncommitted tail is re-decoded
+as a sliding window. Words that two consecutive hypotheses agree on are
+"stable"; the rest is "unstable" and may still change. Once a segment is
+stable and followed by another one it is committed: its text is emitted
+once as a delta, its audio is dropped (keeping a short overlap) and the
+committed text is fed back to the decoder as the prompt.
+"""
+import re
+import threading
+
+import numpy as np
+
+_NORMALIZE_RE = re.compile(r"[^\w']+")
+
+
+def _norm(word):
+    return _NORMALIZE_RE.sub("", word.lower())
+
+
+class StreamingTranscriber:
+    """
+    Sliding-window decoder with local-agreement stabilization.
+
+    Args:
+        decode_fn: callable(audio_np, prompt) -> list of (start_sec, end_sec, text)
+        sample_rate: sample rate of the fed audio
+        min_step_ms: decode again only after this much new audio
+        window_sec: force a commit when the uncommitted window grows past this
+        overlap_ms: audio kept before a commit point so cut words are re-heard
+        prompt_chars: how much committed text is fed back as the prompt
+    """
+
+    def __init__(self, decode_fn, sample_rate=16000, min_step_ms=500, window_sec=15,
+                 overlap_ms=200, prompt_chars=200):
+        self.decode_fn = decode_fn
+        self.sample_rate = sample_rate
+        self.min_step_samples = int(sample_rate * min_step_ms / 1000)
+        self.window_samples = int(sample_rate * window_sec)
+        self.overlap_samples = int(sample_rate * overlap_ms / 1000)
+        self.prompt_chars = prompt_chars
+
+        self.audio = np.zeros(0, dtype=np.float32)
+        self.committed = []  # words already sent to the client
+        self.prev_hypothesis = []  # words of the last decode (after the committed ones)
+        self.pending_samples = 0
+        self.lock = threading.Lock()
+
+    @property
+    def prompt(self):
+        return " ".join(self.committed)[-self.prompt_chars:]
+
+    def insert_audio(self, audio):
+        with self.lock:
+            self.audio = np.concatenate([self.audio, audio])
+            self.pending_samples += len(audio)
+
+    def ready(self):
+        """Enough new audio since the last decode to be worth another pass"""
+        return self.pending_samples >= self.min_step_samples
+
+    def discard_audio(self):
+        """Drop the uncommitted audio (e.g. it is all silence)"""
+        with self.lock:
+            self.audio = self.audio[-self.overlap_samples:] if self.overlap_samples else self.audio[:0]
+            self.prev_hypothesis = []
+            self.pending_samples = 0
+
+    def _hypothesis(self):
+        """Decode the window; returns [(word, segment_index)] and the segment list"""
+        segments = self.decode_fn(self.audio, self.prompt)
+        words = [(word, i) for i, (_, _, text) in enumerate(segments) for word in text.split()]
+
+        # The overlap re-hears the end of the committed text; drop the repeat
+        for k in range(min(5, len(self.committed), len(words)), 0, -1):
+            if [_norm(w) for w in self.committed[-k:]] == [_norm(w) for w, _ in words[:k]]:
+                words = words[k:]
+                break
+        return words, segments
+
+    def _commit(self, words, cut_sample):
+        self.committed.extend(words)
+        start = max(0, cut_sample - self.overlap_samples)
+        self.audio = self.audio[start:]
+
+    def process(self):
+        """
+        Decode the current window.
+
+        Returns:
+            dict with 'stable' and 'unstable' text of the live hypothesis and
+            'finalized', the text committed by this call ('' if none)
+        """
+        with self.lock:
+            self.pending_samples = 0
+            words, segments = self._hypothesis()
+            texts = [w for w, _ in words]
+
+            stable_n = 0
+            for (word, _), prev in zip(words, self.prev_hypothesis):
+                if _norm(word) != _norm(prev):
+                    break
+                stable_n += 1
+
+            finalized = []
+            if len(segments) > 1:
+                # Commit every complete segment that lies inside the agreed prefix
+                last_complete = -1
+                for i in range(len(segments) - 1):
+                    seg_words = [n for n, (_, s) in enumerate(words) if s == i]
+                    if seg_words and seg_words[-1] >= stable_n:
+                        break
+                    last_complete = i
+                if last_complete >= 0:
+                    n = sum(1 for _, s in words if s <= last_complete)
+                    finalized = texts[:n]
+                    self._commit(finalized, int(segments[last_complete][1] * self.sample_rate))
+                    texts = texts[n:]
+                    stable_n -= n
+
+            if not finalized and len(self.audio) > self.window_samples:
+                # Window full without a segment boundary: commit everything heard so far
+                finalized = texts
+                self._commit(finalized, len(self.audio))
+                texts, stable_n = [], 0
+
+            self.prev_hypothesis = texts
+            return {
+                "stable": " ".join(texts[:stable_n]),
+                "unstable": " ".join(texts[stable_n:]),
+                "finalized": " ".join(finalized),
+            }
+
+    def finish(self):
+        """Decode whatever is left, commit it and reset; returns the final delta"""
+        with self.lock:
+            delta = []
+            if len(self.audio):
+                words, _ = self._hypothesis()
+                delta = [w for w, _ in words]
+                self.committed.extend(delta)
+            self.audio = self.audio[:0]
+            self.prev_hypothesis = []
+            self.pending_samples = 0
+            return " ".join(delta)
@@ -0,0 +1,121 @@
+"""
+Content-addressed transcript cache.
+
+Keys are a BLAKE2b hash of the decoded audio (normalized to 16-bit PCM so
+the same clip hashes the same whichever decode path produced it) plus the
+language and ASR profile. Entries live in an in-memory LRU bounded by a byte
+budget; an optional SQLite file keeps them across restarts.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+ENTRY_OVERHEAD_BYTES = 200  # dict/OrderedDict bookkeeping per entry, roughly
+
+
+def audio_fingerprint(audio_np, *parts):
+    """Hash normalized PCM plus any extra key parts (language, profile, ...)"""
+    pcm = np.clip(np.rint(audio_np * 32767.0), -32768, 32767).astype("<i2")
+    h = hashlib.blake2b(pcm.tobytes(), digest_size=16)
+    for part in parts:
+        h.update(b"\x00" + str(part).encode())
+    return h.hexdigest()
+
+
+def _entry_size(key, value):
+    return len(key) + len(json.dumps(value)) + ENTRY_OVERHEAD_BYTES
+
+
+class TranscriptCache:
+    """
+    Byte-budgeted LRU of transcription results.
+
+    Args:
+        max_bytes: memory budget for cached entries
+        persist_path: optional SQLite file for on-disk persistence
+        per_request_fields: keys describing one request (e.g. timings) rather
+            than the audio; they are dropped before a result is stored
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, persist_path=None, per_request_fields=()):
+        self.max_bytes = max_bytes
+        self.per_request_fields = frozenset(per_request_fields)
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._db = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, value TEXT, created REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM transcripts WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._insert(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        value = {k: v for k, v in value.items() if k not in self.per_request_fields}
+        with self._lock:
+            self._insert(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO transcripts (key, value, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), time.time()),
+                )
+                self._db.commit()
+
+    def _insert(self, key, value):
+        size = _entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
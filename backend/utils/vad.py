@@ -0,0 +1,97 @@
+"""
+Server-side voice activity detection (vectorized NumPy).
+
+Same idea as the frontend vad-processor.js worklet, applied per frame to a
+whole buffer at once: frame energy decides voiced speech, zero-crossing rate
+rescues quieter unvoiced sounds (s, f, th), and a hangover keeps short pauses
+inside a segment. Segments without any voiced core (hiss, clicks) are dropped.
+"""
+import numpy as np
+
+
+def frame_features(audio, sample_rate=16000, frame_ms=30):
+    """
+    Per-frame RMS (16-bit scale) and zero-crossing rate.
+
+    Returns:
+        (rms, zcr, frame_len) - rms/zcr are arrays with one value per full frame
+    """
+    frame_len = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(audio) // frame_len
+    if n_frames == 0:
+        return np.zeros(0), np.zeros(0), frame_len
+
+    # Reshape is a view over the contiguous buffer, no copy
+    frames = np.asarray(audio[:n_frames * frame_len], dtype=np.float32).reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1)) * 32768
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+    return rms, zcr, frame_len
+
+
+def _extend(mask, before, after):
+    """Dilate a boolean frame mask by `before` frames backwards and `after` frames forwards"""
+    if not mask.any():
+        return mask
+    kernel = np.ones(before + after + 1)
+    hits = np.convolve(mask.astype(np.float64), kernel, mode="full")
+    # Index i in `full` covers mask[i - before - after .. i]; shift so frame j covers j - after .. j + before
+    return hits[before:before + len(mask)] > 0.5
+
+
+def _runs(mask):
+    """(start, end) frame index pairs for each run of True"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_speech_segments(audio, sample_rate=16000, frame_ms=30, energy_threshold=300,
+                           zcr_voiced_max=0.4, unvoiced_ratio=0.5, zcr_unvoiced_min=0.25, hangover_ms=300,
+                           padding_ms=150, min_voiced_ms=120):
+    """
+    Find speech in a 16kHz float32 buffer.
+
+    Args:
+        energy_threshold: frame RMS (16-bit scale) at or above which a frame is voiced
+        zcr_voiced_max: loud frames crossing zero more often than this are noise, not voice
+        unvoiced_ratio / zcr_unvoiced_min: quieter frames still count as speech
+            when their zero-crossing rate looks like a fricative
+        hangover_ms: silence tolerated inside a segment before it ends
+        padding_ms: pre-roll added before each segment start
+        min_voiced_ms: segments with less voiced audio than this are dropped
+
+    Returns:
+        list of (start_sample, end_sample) tuples, in order
+    """
+    rms, zcr, frame_len = frame_features(audio, sample_rate, frame_ms)
+    if len(rms) == 0:
+        return []
+
+    voiced = (rms >= energy_threshold) & (zcr < zcr_voiced_max)
+    unvoiced = (rms >= energy_threshold * unvoiced_ratio) & (zcr >= zcr_unvoiced_min)
+    speech = _extend(voiced | unvoiced,
+                     before=int(padding_ms // frame_ms),
+                     after=int(hangover_ms // frame_ms))
+
+    min_voiced_frames = max(1, int(min_voiced_ms // frame_ms))
+    voiced_count = np.concatenate(([0], np.cumsum(voiced)))
+    segments = []
+    for start, end in _runs(speech):
+        if voiced_count[end] - voiced_count[start] >= min_voiced_frames:
+            segments.append((int(start * frame_len), int(min(end * frame_len, len(audio)))))
+    return segments
+
+
+def extract_speech(audio, segments):
+    """Concatenate the speech segments, dropping the silence around and between them"""
+    if not segments:
+        return audio[:0]
+    if len(segments) == 1:
+        start, end = segments[0]
+        return audio[start:end]
+    return np.concatenate([audio[start:end] for start, end in segments])
+
+
+def segments_to_ms(segments, sample_rate=16000):
+    """Convert sample-index segments to [start_ms, end_ms] pairs for JSON responses"""
+    return [[int(start * 1000 / sample_rate), int(end * 1000 / sample_rate)] for start, end in segments]
@@ -2,7 +2,12 @@ import React, { useEffect, useRef, useState } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
 import { useVoiceAssistant } from "../contexts/VoiceAssistantContext";
 import { formatFieldValue, normalizeFieldName } from "../utils/fieldFormatter";
-import { convertBlobToWAV, calculateRMS } from "../utils/audioEncoder";
+import {
+  convertBlobToWAV,
+  calculateRMS,
+  encodeChunk,
+  pickCodec,
+} from "../utils/audioEncoder";
 import AudioWorklet from "./AudioWorklet";
 import { io } from "socket.io-client";
 
@@ -47,6 +52,8 @@ export default function VoiceAssistant() {
   const wakeRunningRef = useRef(false);
   const webSpeechRecRef = useRef(null);
   const socketRef = useRef(null);
+  const audioCodecRef = useRef("wav"); // negotiated from the backend's "connected" event
+  const speculativeActionsRef = useRef(new Set()); // speculation ids executed before their final transcript
   const isWaitingForWakeWordRef = useRef(true);
   const listeningRef = useRef(false);
   const keyPressedRef = useRef(false);
@@ -312,24 +319,44 @@ export default function VoiceAssistant() {
     }, hangoverMs);
   };
 
+  // Reverse a speculative action (only reversible commands are sent speculatively)
+  const undoSpeculativeAction = (result) => {
+    switch (result?.action) {
+      case "navigate":
+        navigate(-1);
+        break;
+      case "scroll_up":
+        window.scrollBy({ top: 300, behavior: "smooth" });
+        break;
+      case "scroll_down":
+        window.scrollBy({ top: -300, behavior: "smooth" });
+        break;
+      default:
+        break;
+    }
+  };
+
   // Action handler - processes voice commands
-  const handleAction = async (transcript) => {
+  const handleAction = async (transcript, routed = null) => {
     try {
       console.log("🎯 Processing command:", transcript);
 
-      // Send to backend NLP
-      const res = await fetch(`${getBackendBaseUrl()}/parse`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text: transcript }),
-      });
+      // Already routed by the backend ("action" event), or send to backend NLP
+      let data = routed;
+      if (!data) {
+        const res = await fetch(`${getBackendBaseUrl()}/parse`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ text: transcript }),
+        });
 
-      if (!res.ok) {
-        console.error("❌ Parse request failed:", res.status);
-        return;
-      }
+        if (!res.ok) {
+          console.error("❌ Parse request failed:", res.status);
+          return;
+        }
 
-      const data = await res.json();
+        data = await res.json();
+      }
 
       if (data.status === "error") {
         console.warn("⚠️ Unknown command:", transcript);
@@ -1088,6 +1115,18 @@ export default function VoiceAssistant() {
     }
   }, [listening, privacyAccepted]);
 
+  // Field dictation is free text: stop server-side routing until it is applied
+  useEffect(() => {
+    const socket = socketRef.current;
+    if (!socket || !socket.connected) return;
+    const routeOnServer = !pendingFieldForDictation;
+    socket.emit(
+      "configure_session",
+      { actions: routeOnServer, speculative: routeOnServer },
+      (settings) => console.log("⚙️ Session modes:", settings)
+    );
+  }, [pendingFieldForDictation]);
+
   // Visual feedback: highlight field being filled
   useEffect(() => {
     if (highlightedField) {
@@ -1135,6 +1174,16 @@ export default function VoiceAssistant() {
 
     socket.on("connected", (data) => {
       console.log("🎉 WebSocket ready:", data);
+      audioCodecRef.current = pickCodec(data.codecs);
+      console.log(`🗜️ Audio codec: ${audioCodecRef.current}`);
+      // Have final transcripts routed server-side and sent back as "action" events
+      // (not while a field waits for dictation: that transcript is free text)
+      const routeOnServer = !pendingFieldForDictationRef.current;
+      socket.emit(
+        "configure_session",
+        { actions: routeOnServer, speculative: routeOnServer },
+        (settings) => console.log("⚙️ Session modes:", settings)
+      );
     });
 
     // Action queue for serial command execution (prevents race conditions)
@@ -1146,9 +1195,9 @@ export default function VoiceAssistant() {
 
       isProcessingQueue = true;
       while (actionQueue.length > 0) {
-        const text = actionQueue.shift();
+        const { text, routed } = actionQueue.shift();
         try {
-          await handleAction(text);
+          await handleAction(text, routed);
         } catch (error) {
           console.error("❌ Error processing action:", error);
         }
@@ -1156,7 +1205,8 @@ export default function VoiceAssistant() {
       isProcessingQueue = false;
     };
 
-    socket.on("transcript", async (data) => {
+    // "routed" is the route_command payload when the backend already parsed the text
+    const onTranscript = (data, routed = null) => {
       const text = (data.text || data.transcript || "").trim();
       // backend may include a final flag (is_final / final)
       const finalFlag =
@@ -1273,17 +1323,67 @@ export default function VoiceAssistant() {
         } catch (e) {}
 
         // Add to queue instead of direct call (prevents race conditions)
-        actionQueue.push(text);
+        actionQueue.push({ text, routed });
         processActionQueue();
       } else if (isNoise || text.length === 0) {
         console.log("⏭️ Skipping noise/hallucination:", text);
       }
+    };
+
+    socket.on("transcript", (data) => onTranscript(data));
+
+    // Final transcript plus the backend's routed command, in one event.
+    // Speculative actions come from streaming partials; the final one confirms them.
+    socket.on("action", (data) => {
+      console.log("⏱️ Action timings:", data.timings);
+      const executed = speculativeActionsRef.current;
+      if (data.confirmed && executed.delete(data.speculation_id)) {
+        console.log(`✅ Speculative action #${data.speculation_id} confirmed`);
+        return;
+      }
+      if (data.speculative) {
+        // Dictation and number picking need the final text
+        if (pendingFieldForDictationRef.current || isWaitingForNumberRef.current) return;
+        executed.add(data.speculation_id);
+      }
+      // The backend only runs its rules on pushed transcripts; let /parse try the LLM fallback
+      const routed = data.intent === "unknown" ? null : data.result;
+      onTranscript({ text: data.transcript, final: !data.speculative }, routed);
+    });
+
+    // The final transcript disagreed with a speculative action: undo it, then run the real one
+    socket.on("action_correction", (data) => {
+      console.log(
+        `↩️ Speculative action #${data.speculation_id} corrected:`,
+        data.speculated,
+        "->",
+        data.result
+      );
+      if (speculativeActionsRef.current.delete(data.speculation_id)) {
+        undoSpeculativeAction(data.speculated);
+      }
+      if (data.result) {
+        onTranscript(
+          { text: data.transcript, final: true },
+          data.intent === "unknown" ? null : data.result
+        );
+      }
     });
 
     socket.on("error", (error) => {
       console.error("❌ WebSocket error:", error);
     });
 
+    // Backend ASR saturated: this chunk was not transcribed
+    socket.on("busy", (data) => {
+      console.warn(
+        `🚦 Backend busy (${data.reason}), chunk #${data.seq} dropped; retry after ${data.retry_after_sec}s`
+      );
+      try {
+        setIsSending(false);
+      } catch (e) {}
+    });
+
     socketRef.current = socket;
 
     return () => {
@@ -1585,11 +1685,15 @@ export default function VoiceAssistant() {
                 )}`
               );
 
-              // Send WAV audio chunk (include selected language)
+              // Send the audio chunk as a binary attachment, in the negotiated codec
+              const codec = audioCodecRef.current;
+              const payload = encodeChunk(wavBuffer, codec);
+              console.log(`🗜️ ${codec}: ${payload.byteLength} bytes`);
               socketRef.current.emit("audio_chunk", {
-                audio: Array.from(new Uint8Array(wavBuffer)),
+                audio: payload,
+                codec,
                 final: true,
-                format: "wav", // Tell backend it's already WAV
+                format: "wav", // Tell backend it's already WAV (servers without codec support)
               });
               // mark sending complete (we consider it sent)
               setIsSending(false);
@@ -142,3 +142,128 @@ export async function convertBlobToWAV(blob, audioContext) {
   // Encode as WAV
   return encodeWAV(resampled, 16000, 1);
 }
+
+/**
+ * Compact socket codecs, most compact first. The backend lists the ones it
+ * accepts in its "connected" event; "wav" is always understood.
+ */
+const CLIENT_CODECS = ["ima_adpcm", "mulaw", "wav"];
+
+/**
+ * Pick the most compact codec both sides support
+ * @param {string[]} serverCodecs - codecs from the "connected" event
+ * @returns {string} codec name for the audio_chunk "codec" field
+ */
+export function pickCodec(serverCodecs) {
+  return CLIENT_CODECS.find((c) => c === "wav" || (serverCodecs || []).includes(c));
+}
+
+/**
+ * Encode a 16-bit mono WAV (as produced by encodeWAV) for the given codec
+ * @param {ArrayBuffer} wavBuffer - WAV file data with a 44-byte header
+ * @param {string} codec - "wav", "mulaw" or "ima_adpcm"
+ * @returns {Uint8Array} audio_chunk payload
+ */
+export function encodeChunk(wavBuffer, codec) {
+  if (codec === "wav") return new Uint8Array(wavBuffer);
+  const samples = new Int16Array(wavBuffer.slice(44));
+  if (codec === "mulaw") return encodeMuLaw(samples);
+  if (codec === "ima_adpcm") return encodeImaAdpcm(samples);
+  throw new Error(`Unsupported codec: ${codec}`);
+}
+
+const MULAW_SEGMENT_ENDS = [0x3f, 0x7f, 0xff, 0x1ff, 0x3ff, 0x7ff, 0xfff, 0x1fff];
+
+/**
+ * G.711 mu-law: 8 bits per sample (half the size of 16-bit PCM)
+ * @param {Int16Array} samples - 16-bit PCM
+ * @returns {Uint8Array} mu-law bytes
+ */
+export function encodeMuLaw(samples) {
+  const out = new Uint8Array(samples.length);
+  for (let i = 0; i < samples.length; i++) {
+    let value = samples[i] >> 2;
+    let mask = 0xff;
+    if (value < 0) {
+      value = -value;
+      mask = 0x7f;
+    }
+    value = Math.min(value, 8159) + 0x21;
+    let segment = 0;
+    while (segment < 8 && value > MULAW_SEGMENT_ENDS[segment]) segment++;
+    const code = segment < 8 ? (segment << 4) | ((value >> (segment + 1)) & 0x0f) : 0x7f;
+    out[i] = code ^ mask;
+  }
+  return out;
+}
+
+const IMA_STEP_TABLE = [
+  7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+  50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+  253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+  1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+  3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487,
+  12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767,
+];
+const IMA_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8];
+
+/**
+ * IMA-ADPCM in WAV-style blocks: 4 bits per sample (a quarter of 16-bit PCM).
+ * Each block: int16 predictor, uint8 step index, reserved byte, then
+ * nibbles low-first. Matches backend/utils/audio_codecs.py.
+ * @param {Int16Array} samples - 16-bit PCM
+ * @param {number} blockAlign - block size in bytes (backend default 256)
+ * @returns {Uint8Array} ADPCM blocks
+ */
+export function encodeImaAdpcm(samples, blockAlign = 256) {
+  const perBlock = 1 + 2 * (blockAlign - 4);
+  const blocks = Math.ceil(samples.length / perBlock);
+  const out = new Uint8Array(blocks * blockAlign);
+  let length = 0;
+  let index = 0;
+
+  for (let start = 0; start < samples.length; start += perBlock) {
+    const end = Math.min(start + perBlock, samples.length);
+    let predictor = samples[start];
+    const header = length;
+    out[header] = predictor & 0xff;
+    out[header + 1] = (predictor >> 8) & 0xff;
+    out[header + 2] = index;
+    out[header + 3] = 0;
+    length += 4;
+
+    for (let i = start + 1; i < end; i++) {
+      const step = IMA_STEP_TABLE[index];
+      let diff = samples[i] - predictor;
+      let nibble = 0;
+      if (diff < 0) {
+        nibble = 8;
+        diff = -diff;
+      }
+      let delta = step >> 3;
+      if (diff >= step) {
+        nibble |= 4;
+        diff -= step;
+        delta += step;
+      }
+      if (diff >= step >> 1) {
+        nibble |= 2;
+        diff -= step >> 1;
+        delta += step >> 1;
+      }
+      if (diff >= step >> 2) {
+        nibble |= 1;
+        delta += step >> 2;
+      }
+      predictor += nibble & 8 ? -delta : delta;
+      predictor = Math.max(-32768, Math.min(32767, predictor));
+      index = Math.max(0, Math.min(88, index + IMA_INDEX_TABLE[nibble & 7]));
+
+      const position = i - start - 1;
+      if (position % 2 === 0) out[length] = nibble;
+      else out[length++] |= nibble << 4;
+    }
+    if ((end - start - 1) % 2 === 1) length++;
+  }
+  return out.subarray(0, length);
+}